@@ -1,23 +1,61 @@
 import argparse
 import sys
+from typing import Optional
 
+from circuits.passes import PassManager
+from circuits.transpile import GATE_SETS
 from interpreter import Interpreter
 from lexer import Lexer
 from lang_parser import Parser
 from repl import Repl, GOODBYE
 
 
-def interpret_script(script_path: str):
+def interpret_script(script_path: str, opt_level: int = 0, verify: bool = False,
+                     debug: bool = False, resources: bool = False,
+                     target: Optional[str] = None, output: Optional[str] = None):
     with open(script_path, 'r') as f:
         script = f.read()
     tokens = Lexer(script).lex()
     statements = Parser(tokens).parse()
-    Interpreter().interpret(statements)
+    if resources:
+        # Count the gates without building the circuit
+        interpreter = Interpreter(materialize=False)
+        interpreter.interpret(statements)
+        print(interpreter.circuit.estimate_resources())
+        return
+    interpreter = Interpreter()
+    interpreter.interpret(statements)
+    if output is None and not (debug or verify):
+        # Nothing would see the compiled circuit
+        return
+    passes = PassManager.for_level(opt_level, verify=verify,
+                                   target=GATE_SETS[target] if target else None)
+    circuit = passes.run(interpreter.circuit)
+    if debug and passes.metrics:
+        print(passes.report())
+    if output is None:
+        return
+    if output.endswith('.qasm'):
+        with open(output, 'w') as f:
+            circuit.to_qasm(f)
+    else:
+        circuit.save(output)
 
 
 def init_argparse() -> argparse.ArgumentParser:
     argparser = argparse.ArgumentParser()
     argparser.add_argument('--debug', action='store_true')
+    argparser.add_argument('-O', dest='opt_level', type=int, choices=range(4),
+                           default=0, help='circuit optimization level')
+    argparser.add_argument('--verify', action='store_true',
+                           help='check each optimization pass by simulation')
+    argparser.add_argument('--resources', action='store_true',
+                           help='print a resource estimate instead of compiling')
+    argparser.add_argument('--target', choices=sorted(GATE_SETS),
+                           help='transpile to a native gate set')
+    argparser.add_argument('-o', '--output', metavar='PATH',
+                           help='write the compiled circuit as OpenQASM, if PATH '
+                           'ends in .qasm, or else in the binary .cvyc format')
     argparser.add_argument('script', nargs='?')
     return argparser
 
@@ -31,7 +69,9 @@ if __name__ == '__main__':
 
     if args_ns.script:
         try:
-            interpret_script(args_ns.script)
+            interpret_script(args_ns.script, args_ns.opt_level,
+                             args_ns.verify, args_ns.debug, args_ns.resources,
+                             args_ns.target, args_ns.output)
         except FileNotFoundError:
             print(f"Error: no file {args_ns.script} found")
         exit(0)
@@ -0,0 +1,62 @@
+"""Benchmark gate allocation in control-heavy programs. Run from the project
+root as `python -m benchmarks.gates`.
+"""
+
+import gc
+import time
+import tracemalloc
+
+from interpreter import Interpreter
+from lang_parser import Parser
+from lexer import Lexer
+
+
+def control_heavy_program(depth: int, reps: int) -> str:
+    """Nested quantum conditionals, so that every gate in the innermost block is
+    expanded through `with_control` at each level. Only `~` can be controlled
+    twice, as the Hadamard and T gates have no controlled form yet."""
+    declarations = ' '.join(f"c{i} <- split(?false);" for i in range(depth))
+    body = "r <- ~r;"
+    conditionals = ''.join(f"if c{i} {{ " for i in range(depth)) + body + '}' * depth
+    return f"""
+    {declarations}
+    r <- ?false;
+    for i in 0..{reps} {{
+        {conditionals}
+    }}
+    """
+
+
+def run(code: str) -> Interpreter:
+    interpreter = Interpreter()
+    interpreter.interpret(Parser(Lexer(code).lex()).parse())
+    # Walk the emitted gates, as a backend would
+    for gate in interpreter.circuit.gates:
+        gate.conjugate()
+    return interpreter
+
+
+def main(depth: int = 2, reps: int = 2000) -> None:
+    code = control_heavy_program(depth, reps)
+    run(code)  # warm up
+
+    gc.collect()
+    collections = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+    interpreter = run(code)
+    elapsed = time.perf_counter() - start
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections
+
+    tracemalloc.start()
+    run(code)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"gates emitted: {len(interpreter.circuit.gates)}")
+    print(f"time:          {elapsed:.3f}s")
+    print(f"gc runs:       {collections}")
+    print(f"peak traced:   {peak / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Resource budgets for compilation. A mistake in a loop bound can make a
+program emit billions of gates or allocate millions of qubits; a budget stops
+the interpreter cleanly, reporting what was used, before the process runs out
+of memory.
+"""
+
+from dataclasses import dataclass, replace
+import os
+import time
+from typing import Optional
+
+from errors import CavyRuntimeError
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+@dataclass
+class Budget:
+    """Limits on the resources a compilation may use. `None` means unlimited."""
+    max_gates: Optional[int] = None
+    max_qubits: Optional[int] = None
+    max_seconds: Optional[float] = None
+    max_depth: Optional[int] = None    # depth of nested function calls
+    max_memory: Optional[int] = None   # resident memory of the process, in bytes
+    # Wall time and memory are only checked once per this many steps
+    check_interval: int = 1024
+
+
+@dataclass
+class Usage:
+    gates: int = 0
+    qubits: int = 0
+    seconds: float = 0.0
+    depth: int = 0
+    memory: Optional[int] = None
+
+    def __str__(self) -> str:
+        memory = 'unknown' if self.memory is None else f'{self.memory / 2**20:.1f} MiB'
+        return (f"{self.gates} gates, {self.qubits} qubits, "
+                f"{self.seconds:.2f}s, call depth {self.depth}, memory {memory}")
+
+
+class BudgetExceededError(CavyRuntimeError):
+    """Raised when a compilation exceeds one of its resource budgets."""
+
+    def __init__(self, resource: str, limit, usage: Usage):
+        super().__init__(resource, limit, usage)
+        self.resource = resource
+        self.limit = limit
+        self.usage = usage
+
+    def __str__(self) -> str:
+        return (f"Budget error: exceeded the {self.resource} budget of {self.limit}. "
+                f"Usage so far: {self.usage}.")
+
+
+def current_memory() -> Optional[int]:
+    """The resident memory of this process in bytes, if it can be found"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Only the peak is available here; it's in kilobytes on Linux but
+        # bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    return None
+
+
+class BudgetMeter:
+    """Tracks usage against a `Budget`. Counting gates, qubits and calls is a
+    single comparison; the clock and memory are only read every
+    `check_interval` calls to `tick`.
+    """
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self.usage = Usage()
+        self.start = time.monotonic()
+        self.countdown = budget.check_interval
+
+    def exceeded(self, resource: str, limit) -> BudgetExceededError:
+        usage = replace(self.usage,
+                        seconds=time.monotonic() - self.start,
+                        memory=current_memory())
+        return BudgetExceededError(resource, limit, usage)
+
+    def count_gates(self, gates: int) -> None:
+        self.usage.gates = gates
+        limit = self.budget.max_gates
+        if limit is not None and gates > limit:
+            raise self.exceeded('gate', limit)
+
+    def count_qubits(self, qubits: int) -> None:
+        self.usage.qubits = qubits
+        limit = self.budget.max_qubits
+        if limit is not None and qubits > limit:
+            raise self.exceeded('qubit', limit)
+
+    def enter_call(self) -> None:
+        self.usage.depth += 1
+        limit = self.budget.max_depth
+        if limit is not None and self.usage.depth > limit:
+            error = self.exceeded('call depth', limit)
+            self.usage.depth -= 1
+            raise error
+
+    def exit_call(self) -> None:
+        self.usage.depth -= 1
+
+    def tick(self) -> None:
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = self.budget.check_interval
+            self.check_clock()
+
+    def check_clock(self) -> None:
+        """Check the budgets that are expensive to measure"""
+        budget = self.budget
+        if budget.max_seconds is not None:
+            if time.monotonic() - self.start > budget.max_seconds:
+                raise self.exceeded('time', f'{budget.max_seconds}s')
+        if budget.max_memory is not None:
+            memory = current_memory()
+            if memory is not None and memory > budget.max_memory:
+                raise self.exceeded('memory', f'{budget.max_memory} bytes')
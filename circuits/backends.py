@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict
 
 import dependencies as deps
+from circuits.lowering import measurement_key
 from circuits.sample import Sample
 
 
@@ -22,12 +23,12 @@ class CirqBackend(Backend):
         pass
 
     def sample_circuit(self, circuit, reps: int) -> Sample:
-        def meas_index(measurements, i: int):
-            return measurements.get(str((i, 0))).transpose()[0]
-        results = deps.cirq.sample(circuit.to_cirq(),
-                                   dtype=bool,
-                                   repetitions=reps)
-        samples = {label: meas_index(results.measurements, index)
+        def meas_index(records, i: int):
+            # A qubit may be measured more than once; its last measurement
+            # is its output.
+            return records[measurement_key(i)][:, -1, 0].astype(bool)
+        results = deps.cirq.sample(circuit.to_cirq(), repetitions=reps)
+        samples = {label: meas_index(results.records, index)
                     for (label, index) in circuit.qubit_labels.items()}
 
         return Sample(samples)
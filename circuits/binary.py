@@ -0,0 +1,282 @@
+"""The `.cvyc` binary circuit format. A file is a fixed header followed by the
+gate columns, exactly as they're laid out in memory, each starting on an 8-byte
+boundary; then a table of qubit labels. Loading a file maps it into memory and
+uses the columns in place, so that even a huge circuit opens at once, and its
+pages are only read as they're used.
+
+Header, little-endian:
+
+    magic       4s  b'CVYC'
+    version     H
+    flags       H   bit 0: the file has a source map
+    gate_types  H   the number of gate types known to the writer
+    (reserved)  H
+    (reserved)  I
+    gates       Q   the number of gates
+    offsets     6Q  of the opcode, operand 0, operand 1, conjugation, source
+                    map and label sections; 0 for an absent section
+
+Labels are a u32 count, then for each a u32 qubit, a u16 length and the label
+in UTF-8.
+"""
+
+from array import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from errors import CavyRuntimeError
+from .columns import GateColumns
+from .gates import Gate, GATE_TYPES
+
+MAGIC = b'CVYC'
+FORMAT_VERSION = 1
+EXTENSION = '.cvyc'
+HEADER = struct.Struct('<4sHHHHIQ6Q')
+FLAG_LOCATIONS = 1
+ALIGNMENT = 8
+# The suffix of a circuit file still being written
+TEMP_SUFFIX = '.tmp'
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class CircuitFormatError(CavyRuntimeError):
+    """Raised when a file isn't a circuit this version can read."""
+    def __str__(self):
+        return f"Format error: {self.args[0]}"
+
+
+class MappedColumns(GateColumns):
+    """Gate columns backed by a memory-mapped file, or by a block of shared
+    memory. They're read in place; the first append copies them into memory,
+    leaving the file untouched."""
+
+    def __init__(self, buffer, opcodes: memoryview, operands0: memoryview,
+                 operands1: memoryview, conj: memoryview, locations: Optional[memoryview]):
+        self.buffer = buffer
+        self.opcodes = opcodes
+        self.operands0 = operands0
+        self.operands1 = operands1
+        self.conj = conj
+        self.locations = locations
+        self.mapped = True
+
+    @classmethod
+    def prefix(cls, columns: GateColumns, length: int) -> 'MappedColumns':
+        """The first `length` gates of some in-memory columns, read in place.
+        While this is alive, the columns can't grow: appending to them raises
+        a `BufferError`."""
+        def view(column):
+            return None if column is None else memoryview(column)[:length]
+
+        return cls(columns, view(columns.opcodes), view(columns.operands0),
+                   view(columns.operands1), memoryview(columns.conj)[:(length + 7) >> 3],
+                   view(columns.locations))
+
+    def materialize(self) -> None:
+        """Copy the columns into ordinary, growable arrays"""
+        if not self.mapped:
+            return
+        self.opcodes = _to_array('B', self.opcodes)
+        self.operands0 = _to_array('i', self.operands0)
+        self.operands1 = _to_array('i', self.operands1)
+        n = len(self.opcodes)
+        self.conj = bytearray(self.conj)
+        if n & 7:
+            # Clear flags belonging to gates past the end, as a prefix of
+            # longer columns may have them
+            self.conj[-1] &= (1 << (n & 7)) - 1
+        if self.locations is not None:
+            self.locations = _to_array('i', self.locations)
+        self.mapped = False
+        # Other columns may still share the mapping; it's closed when the last
+        # reference to it goes.
+        self.buffer = None
+
+    def append(self, gate: Gate, location: int = -1) -> None:
+        self.materialize()
+        super().append(gate, location)
+
+    def copy(self, length: Optional[int] = None) -> GateColumns:
+        if length is None:
+            length = len(self)
+        new = GateColumns(locations=self.has_locations)
+        new.opcodes = _to_array('B', self.opcodes[:length])
+        new.operands0 = _to_array('i', self.operands0[:length])
+        new.operands1 = _to_array('i', self.operands1[:length])
+        new.conj = bytearray(self.conj[:(length + 7) >> 3])
+        if length & 7:
+            new.conj[-1] &= (1 << (length & 7)) - 1
+        if self.locations is not None:
+            new.locations = _to_array('i', self.locations[:length])
+        return new
+
+
+def _to_array(typecode: str, view) -> array:
+    arr = array(typecode)
+    arr.frombytes(memoryview(view).cast('B'))
+    return arr
+
+
+def _column_bytes(column, typecode: str) -> memoryview:
+    """The bytes of a column, little-endian"""
+    if _LITTLE_ENDIAN or typecode == 'B':
+        return memoryview(column).cast('B')
+    swapped = _to_array(typecode, column)
+    swapped.byteswap()
+    return memoryview(swapped).cast('B')
+
+
+def _encode_labels(qubit_labels: Dict[str, int]) -> bytes:
+    parts = [struct.pack('<I', len(qubit_labels))]
+    for label, qubit in qubit_labels.items():
+        encoded = label.encode('utf-8')
+        parts.append(struct.pack('<IH', qubit, len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+
+def _decode_labels(data: memoryview) -> Dict[str, int]:
+    (count,) = struct.unpack_from('<I', data, 0)
+    offset = 4
+    labels = {}
+    for _ in range(count):
+        qubit, length = struct.unpack_from('<IH', data, offset)
+        offset += 6
+        labels[bytes(data[offset:offset + length]).decode('utf-8')] = qubit
+        offset += length
+    return labels
+
+
+def _layout(columns: GateColumns, labels: bytes) -> Tuple[List, List[int], int]:
+    """The sections of a circuit file, as functions streaming their pieces and
+    their sizes; the offset of each; and the size of the file"""
+    n = len(columns)
+
+    def column(name: str, typecode: str):
+        return lambda: (_column_bytes(getattr(chunk, name), typecode)
+                        for chunk in columns.chunks())
+
+    def conj():
+        for chunk in columns.chunks():
+            yield memoryview(bytes(chunk.conj[:(len(chunk) + 7) >> 3]))
+
+    # Each section, as a function streaming its pieces, and its size
+    sections = [
+        (column('opcodes', 'B'), n),
+        (column('operands0', 'i'), 4 * n),
+        (column('operands1', 'i'), 4 * n),
+        (conj, (n + 7) >> 3),
+        (column('locations', 'i'), 4 * n) if columns.has_locations else None,
+        (lambda: [memoryview(labels)], len(labels)),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        if section is None:
+            offsets.append(0)
+            continue
+        position += -position % ALIGNMENT
+        offsets.append(position)
+        position += section[1]
+    return sections, offsets, position
+
+
+def circuit_nbytes(columns: GateColumns, qubit_labels: Dict[str, int]) -> int:
+    """The size of the file `write_circuit` writes"""
+    return _layout(columns, _encode_labels(qubit_labels))[2]
+
+
+def write_circuit(out: BinaryIO, columns: GateColumns, qubit_labels: Dict[str, int]) -> None:
+    """Write columns as a circuit file. The columns are streamed one chunk at a
+    time, once for each section; every chunk but the last must hold a multiple
+    of 8 gates, so that their conjugation bitmasks can be concatenated."""
+    n = len(columns)
+    sections, offsets, _ = _layout(columns, _encode_labels(qubit_labels))
+    flags = FLAG_LOCATIONS if columns.has_locations else 0
+    out.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(GATE_TYPES), 0, 0, n, *offsets))
+    position = HEADER.size
+    for section, offset in zip(sections, offsets):
+        if section is None:
+            continue
+        out.write(bytes(offset - position))
+        pieces, size = section
+        for piece in pieces():
+            out.write(piece)
+        position = offset + size
+
+
+def save_circuit(path: str, columns: GateColumns, qubit_labels: Dict[str, int]) -> None:
+    """Write columns as a circuit file at `path`. The file is written beside it
+    and renamed into place, so that readers see a whole circuit or none, and
+    so that a circuit mapped from `path` itself can be saved back to it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_circuit(f, columns, qubit_labels)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+
+
+def read_header(buffer) -> Tuple[int, int, int, Tuple[int, ...]]:
+    if len(buffer) < HEADER.size:
+        raise CircuitFormatError("file is too short to be a circuit")
+    magic, version, flags, gate_types, _, _, n, *offsets = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise CircuitFormatError("not a circuit file")
+    if version != FORMAT_VERSION:
+        raise CircuitFormatError(f"unsupported format version {version}")
+    if gate_types > len(GATE_TYPES):
+        raise CircuitFormatError("file uses gate types unknown to this version")
+    return flags, n, gate_types, tuple(offsets)
+
+
+def map_circuit(path: str) -> Tuple[MappedColumns, Dict[str, int]]:
+    """Memory-map a circuit file, returning its columns and labels"""
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            raise CircuitFormatError("empty file")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_circuit(buffer, buffer)
+
+
+def read_circuit(buffer, owner) -> Tuple[MappedColumns, Dict[str, int]]:
+    """The columns and labels of a circuit laid out in `buffer` as in a file,
+    used in place. The columns keep a reference to `owner`, which keeps the
+    buffer alive."""
+    flags, n, _, offsets = read_header(buffer)
+    view = memoryview(buffer)
+
+    def section(index: int, itemsize: int, typecode: str) -> memoryview:
+        start = offsets[index]
+        end = start + n * itemsize
+        if end > len(buffer):
+            raise CircuitFormatError("file is truncated")
+        column = view[start:end]
+        if not _LITTLE_ENDIAN and typecode != 'B':
+            # Big-endian machines must pay for a copy
+            swapped = _to_array(typecode, column)
+            swapped.byteswap()
+            return memoryview(swapped)
+        return column.cast(typecode)
+
+    columns = MappedColumns(
+        owner,
+        section(0, 1, 'B'),
+        section(1, 4, 'i'),
+        section(2, 4, 'i'),
+        view[offsets[3]:offsets[3] + ((n + 7) >> 3)],
+        section(4, 4, 'i') if flags & FLAG_LOCATIONS else None,
+    )
+    labels = _decode_labels(view[offsets[5]:])
+    return columns, labels
@@ -0,0 +1,140 @@
+"""A content-addressed cache of compiled circuits, kept on disk in the `.cvyc`
+format. A circuit is filed under a hash of its program's source, the language
+version and the compilation settings, so an unchanged program need never be
+interpreted twice.
+
+The cache is shared between processes. Entries are written to a temporary
+file and renamed into place, so that a reader sees a whole circuit or none;
+a reader that loses a race with eviction just misses. Each hit touches its
+entry, and when the cache grows beyond its size bound the least recently
+used entries are evicted first.
+"""
+
+import hashlib
+import os
+import time
+from typing import List, Optional, Tuple
+
+import config
+from .binary import (EXTENSION, FORMAT_VERSION, TEMP_SUFFIX, CircuitFormatError,
+                     save_circuit)
+from .circuit import Circuit
+from .gates import GATE_TYPES
+
+DEFAULT_DIRECTORY = os.path.join(config.DOTFILE, 'circuits')
+DEFAULT_MAX_BYTES = 256 * 2**20
+# Temporary files older than this were left by a process that died mid-write
+STALE_SECONDS = 3600
+
+
+def cache_key(source: str, **settings) -> str:
+    """The key of a program compiled with some settings"""
+    digest = hashlib.sha256()
+    parts = [config.LANG_SEMVER, str(FORMAT_VERSION), str(len(GATE_TYPES))]
+    parts.extend(f'{name}={value}' for name, value in sorted(settings.items()))
+    parts.append(source)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CircuitCache:
+    """A directory of compiled circuits, holding at most about `max_bytes`.
+    `hits` and `misses` count lookups by this object, not by other processes
+    sharing the directory."""
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + EXTENSION)
+
+    def get(self, key: str) -> Optional[Circuit]:
+        """The circuit filed under `key`, or None. The circuit is mapped from
+        the file, which can then be evicted without harm."""
+        path = self.path(key)
+        try:
+            circuit = Circuit.load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except CircuitFormatError:
+            # Written by an incompatible version, or damaged
+            _remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return circuit
+
+    def put(self, key: str, circuit: Circuit) -> None:
+        save_circuit(self.path(key), circuit.columns, circuit.qubit_labels)
+        self.evict()
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """The last use, size and path of each entry, least recent first"""
+        entries = []
+        now = time.time()
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(EXTENSION):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                elif (entry.name.endswith(TEMP_SUFFIX)
+                      and now - stat.st_mtime > STALE_SECONDS):
+                    _remove(entry.path)
+        entries.sort()
+        return entries
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if _remove(path):
+                self.evictions += 1
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, path in self.entries():
+            _remove(path)
+
+
+def _remove(path: str) -> bool:
+    """Remove a file, if another process hasn't already"""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+_default_cache: Optional[CircuitCache] = None
+
+
+def default_cache() -> CircuitCache:
+    """The cache in the Cavy dotfile, shared by every compilation in this
+    process that asks for one"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CircuitCache()
+    return _default_cache
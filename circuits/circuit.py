@@ -1,13 +1,114 @@
-from typing import Set, List, Optional, Dict, Any
+from dataclasses import dataclass
+import itertools
+from typing import Set, List, Optional, Dict, Any, Iterable, TextIO, Tuple, Union
 
+from budget import Budget, BudgetMeter
+from errors import CavyRuntimeError
 import dependencies as deps
+from .binary import MappedColumns, map_circuit, save_circuit
+from .columns import GateColumns, GateView
+from .dag import CircuitDag, cancel_commuting
 from .gates import Gate
+from .lightcone import prune
+from .lowering import CirqLowering
+from .linear import resynthesize
+from .peephole import peephole as peephole_gates
+from .phasefold import phase_fold
+from .qasm import QasmBody, write_qasm
+from .resources import ResourceCounter, ResourceEstimate
+from .routing import DEFAULT_ITERATIONS, CouplingGraph, Layout, Routing, route
+from .schedule import Policy, Schedule, schedule
+from .spill import DEFAULT_CHUNK_SIZE, SpillingColumns
+from .stats import CircuitStats, RunningStats
+from .transpile import NativeGateSet, transpile
 from lang_types import Qubit
 
+# Generations of gates, numbered uniquely across circuits. Circuits, and
+# snapshots of them, of the same generation agree on the gates they share.
+_GENERATIONS = itertools.count()
+
+
+@dataclass(frozen=True)
+class CircuitSnapshot:
+    """The state of a circuit at some moment. Because gates are only ever
+    appended, a snapshot needs only a reference to the gate columns and their
+    length at the time; the columns themselves are shared. The running
+    statistics are copied, which takes time proportional to the width."""
+    columns: GateColumns
+    length: int
+    qubit_labels: Dict[str, int]
+    generation: int
+    running: Optional[RunningStats]
+
+
 class Circuit:
-    def __init__(self):
-        self.gates = []
+    """A quantum circuit. Gates are stored column-wise, in a `GateColumns`;
+    the `gates` attribute is a view of them as `Gate` objects. Statistics are
+    kept as gates are added, and are available from `stats`.
+
+    If `spill` is given, gates beyond the first `chunk_size` are spilled to a
+    log on disk: at the path given, or in a temporary file if `spill` is True.
+    """
+
+    def __init__(self, budget: Optional[Budget] = None, locations: bool = False,
+                 spill: Union[bool, str] = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if spill:
+            path = None if spill is True else spill
+            self.columns = SpillingColumns(path, chunk_size, locations=locations)
+        else:
+            self.columns = GateColumns(locations=locations)
+        # Running statistics of `columns`, or None if they have been replaced
+        # wholesale and the statistics haven't been asked for since.
+        self.running: Optional[RunningStats] = RunningStats()
         self.qubit_labels = {}
+        # True if `qubit_labels` is shared with a snapshot
+        self.labels_shared = False
+        self.meter = BudgetMeter(budget) if budget is not None else None
+        # The source line responsible for the gates being added, if the
+        # circuit keeps a source map
+        self.location = -1
+        # Changed whenever `columns` are replaced, rather than appended to
+        self.generation = next(_GENERATIONS)
+        # True from a restore until the next gates are added, which begin a
+        # generation of their own
+        self.restored = False
+        # Conversions of the first gates to Cirq and OpenQASM, which can be
+        # extended with the gates added since, by generation
+        self.lowered: Dict[Any, Any] = {}
+
+    @classmethod
+    def from_gates(cls, gates: Iterable[Gate],
+                   qubit_labels: Optional[Dict[str, int]] = None) -> 'Circuit':
+        circuit = cls()
+        circuit.columns.extend(gates)
+        circuit.running = None
+        circuit.qubit_labels = dict(qubit_labels or {})
+        return circuit
+
+    def save(self, path: str) -> None:
+        """Write this circuit to a file in the binary `.cvyc` format. The file is
+        replaced whole, so a circuit loaded from `path` can be saved back to it."""
+        save_circuit(path, self.columns, self.qubit_labels)
+
+    @classmethod
+    def load(cls, path: str) -> 'Circuit':
+        """Open a circuit saved with `save`. The file is memory-mapped, not read:
+        gates are read from it as they're used, until the circuit is first
+        added to, when they're copied into memory."""
+        circuit = cls()
+        circuit.columns, circuit.qubit_labels = map_circuit(path)
+        circuit.running = None
+        return circuit
+
+    @property
+    def gates(self) -> GateView:
+        return GateView(self.columns)
+
+    @gates.setter
+    def gates(self, gates: Iterable[Gate]) -> None:
+        columns = GateColumns(locations=self.columns.has_locations)
+        columns.extend(gates)
+        self.replace_columns(columns)
 
     # def add_gate(self, gate: Gate, control: Optional[Qubit] = None):
     #     if control:
@@ -16,14 +117,180 @@ class Circuit:
     #         self.gates.append(gate)
 
     def add_gates(self, gates: List[Gate]):
-        self.gates += gates
+        if self.restored:
+            self._diverge()
+        try:
+            self.columns.extend(gates, self.location)
+        except BufferError:
+            # Another circuit, restored from a snapshot, is reading these
+            # columns in place; nothing has been appended yet.
+            self.columns = self.columns.copy()
+            self._diverge()
+            self.columns.extend(gates, self.location)
+        if self.running is not None:
+            self.running.extend(gates)
+        if self.meter is not None:
+            self.meter.count_gates(len(self.columns))
+
+    def label_qubit(self, label: str, index: int) -> None:
+        """Associate a name in the program with a measured qubit"""
+        if self.labels_shared:
+            self.qubit_labels = dict(self.qubit_labels)
+            self.labels_shared = False
+        self.qubit_labels[label] = index
+
+    def snapshot(self) -> CircuitSnapshot:
+        self.labels_shared = True
+        running = None if self.running is None else self.running.copy()
+        return CircuitSnapshot(self.columns, len(self.columns), self.qubit_labels,
+                               self.generation, running)
+
+    def restore(self, snapshot: CircuitSnapshot) -> None:
+        """Return to a snapshot, in time proportional to the width. The gates
+        are read in place from the snapshot's columns, which other snapshots
+        may share, and are only copied when gates are next added."""
+        columns, length = snapshot.columns, snapshot.length
+        if isinstance(columns, GateColumns):
+            columns = MappedColumns.prefix(columns, length)
+        elif len(columns) > length:
+            # Spilled gates can't be read in place
+            columns = columns.copy(length)
+        self.columns = columns
+        self.running = None if snapshot.running is None else snapshot.running.copy()
+        # Conversions of no more than the snapshot's gates, of its generation,
+        # are still good
+        self.lowered = {key: (generation, lowered)
+                        for key, (generation, lowered) in self.lowered.items()
+                        if generation == snapshot.generation and lowered.length <= length}
+        self.generation = snapshot.generation
+        self.restored = True
+        self.qubit_labels = snapshot.qubit_labels
+        self.labels_shared = True
+
+    def _diverge(self) -> None:
+        """Begin a new generation, keeping the conversions made so far. The
+        gates about to be added may differ from those added after the same
+        snapshot elsewhere."""
+        generation = next(_GENERATIONS)
+        self.lowered = {key: (generation, lowered)
+                        for key, (old, lowered) in self.lowered.items()
+                        if old == self.generation}
+        self.generation = generation
+        self.restored = False
+
+    def replace_columns(self, columns: GateColumns) -> None:
+        """Replace all the gates, invalidating what was derived from them"""
+        self.columns = columns
+        self.running = None
+        self.generation = next(_GENERATIONS)
+        self.restored = False
+        self.lowered = {}
+
+    def _lowered(self, key, make):
+        """The cached conversion under `key`, or a new one from `make`"""
+        cached = self.lowered.get(key)
+        if cached is None or cached[0] != self.generation:
+            cached = self.lowered[key] = (self.generation, make())
+        return cached[1]
+
+    def running_stats(self) -> RunningStats:
+        if self.running is None:
+            self.running = RunningStats.from_columns(self.columns)
+        return self.running
+
+    def stats(self) -> CircuitStats:
+        """Statistics of the circuit as it stands. This takes time proportional
+        to the circuit's width, not its length, unless the gates have been
+        replaced since the last call."""
+        return self.running_stats().freeze()
+
+    @property
+    def width(self) -> int:
+        return self.running_stats().width
+
+    @property
+    def depth(self) -> int:
+        return self.running_stats().depth
+
+    def estimate_resources(self) -> ResourceEstimate:
+        """Width, depth, T-count, T-depth and other figures of merit, in a
+        single pass over the gates"""
+        return ResourceCounter.from_columns(self.columns).estimate()
+
+    def schedule(self, policy: Policy = Policy.ASAP) -> Schedule:
+        """Assign the gates to moments, under a scheduling policy"""
+        return schedule(self.columns, policy)
+
+    def moments(self, policy: Policy = Policy.ASAP) -> List[List[Gate]]:
+        """The gates, grouped into moments of gates on disjoint qubits"""
+        columns = self.columns
+        return [[columns.gate(i) for i in layer]
+                for layer in self.schedule(policy).layers()]
+
+    def peephole(self) -> 'Circuit':
+        """A copy of this circuit with adjacent inverse gates cancelled, and T
+        and S gates merged"""
+        return Circuit.from_gates(peephole_gates(self.gates), self.qubit_labels)
+
+    def dag(self) -> CircuitDag:
+        return CircuitDag(self.gates)
+
+    def cancel_commuting(self) -> 'Circuit':
+        """A copy of this circuit with inverse gates cancelled, and T and S gates
+        merged, even when separated by gates they commute with"""
+        dag = self.dag()
+        cancel_commuting(dag)
+        return Circuit.from_gates(dag.gates(), self.qubit_labels)
+
+    def phase_fold(self) -> 'Circuit':
+        """A copy of this circuit with the phase gates on each parity folded
+        together, up to a global phase"""
+        return Circuit.from_gates(phase_fold(self.gates), self.qubit_labels)
+
+    def resynthesize_linear(self) -> 'Circuit':
+        """A copy of this circuit with each block of CNOT and X gates rebuilt,
+        where that makes it smaller"""
+        return Circuit.from_gates(resynthesize(self.gates), self.qubit_labels)
+
+    def light_cone(self) -> 'Circuit':
+        """A copy of this circuit without the gates and qubits that can't affect
+        the labelled qubits. The remaining qubits are renumbered from zero."""
+        circuit = Circuit(locations=self.columns.has_locations)
+        circuit.columns, renumbering = prune(self.columns, self.qubit_labels)
+        circuit.running = None
+        circuit.qubit_labels = {label: renumbering[index]
+                                for label, index in self.qubit_labels.items()}
+        return circuit
+
+    def route(self, graph: CouplingGraph, layout: Optional[Layout] = None,
+              iterations: int = DEFAULT_ITERATIONS) -> Tuple['Circuit', Routing]:
+        """A copy of this circuit on the physical qubits of a device, with SWAPs
+        inserted so that every two-qubit gate acts on coupled qubits; and what
+        routing cost. Unless a `layout` is given, one is chosen to need few
+        SWAPs. Labels follow their qubits to where they were measured."""
+        routing = route(self.columns, graph, layout, iterations)
+        circuit = Circuit(locations=self.columns.has_locations)
+        circuit.columns = routing.columns
+        circuit.running = None
+        circuit.qubit_labels = {
+            label: routing.measured.get(index, routing.final_layout.get(index, index))
+            for label, index in self.qubit_labels.items()
+        }
+        return circuit, routing
+
+    def transpile(self, gate_set: NativeGateSet) -> 'Circuit':
+        """A copy of this circuit built from the native gates of a device, up to
+        a global phase, with each run of single-qubit gates made as few pulses
+        as it can be. See `circuits.transpile`."""
+        circuit = Circuit(locations=self.columns.has_locations)
+        circuit.columns = transpile(self.columns, gate_set)
+        circuit.running = None
+        circuit.qubit_labels = dict(self.qubit_labels)
+        return circuit
 
     def all_qubits(self) -> Set[int]:
         """All the qubits used in any gate"""
-        qubits = []
-        for gate in self.gates:
-            qubits += gate.qubits
-        return set(qubits)
+        return set(self.running_stats().qubits())
 
     def to_backend(self, backend: Optional[str]):
        if backend == None:
@@ -39,31 +306,40 @@ class Circuit:
            raise ValueError('Invalid backend: {}', backend)
 
     def sample(self, backend, reps: int = 1) -> Dict[str, Any]:
-        """Sample the circuit on all-zero input using a given backend"""
+        """Sample the circuit on all-zero input using a given backend. Only the
+        labelled qubits are sampled, so only their light cone is simulated."""
         assert reps >= 1
-        return backend.sample_circuit(self, reps)
+        return backend.sample_circuit(self.light_cone(), reps)
 
-    @deps.require('cirq')
     def to_cirq(self):
-        qubits = [deps.cirq.GridQubit(i, 0) for i in self.all_qubits()]
-        cirq_gates = [gate.to_cirq(qubits) for gate in self.gates]
-        return deps.cirq.Circuit(*cirq_gates)
+        """This circuit as a Cirq circuit, with the moments of its as-soon-as-
+        possible schedule. Qubit `i` becomes `GridQubit(i, 0)`. Only the gates
+        added since the last call are lowered."""
+        lowering = self._lowered('cirq', CirqLowering)
+        lowering.extend(self.columns)
+        return lowering.circuit()
 
-    def to_qasm(self):
-        """Transform this circuit to a QASM string representation. For the time being,
-        we'll rely on Cirq as an intermediate representation. In a future
-        version, I'd ideally prefer not to.
+    def to_qasm(self, out: Optional[TextIO] = None, version: int = 2) -> Optional[str]:
+        """Write this circuit as OpenQASM 2 or 3 to a file-like object, or
+        return it as a string if none is given. Qubits are declared as a
+        single register `q`, indexed by qubit number.
 
-        """
-        circuit = self.to_cirq()
-        return deps.cirq.qasm(circuit)
-
-    @deps.require('__unsatisfiable__')
-    def __to_qasm_native(self):
-        """Transform this circuit to a QASM string representation
-        TODO implement this!
-        """
-        raise NotImplementedError
+        A string is built from the lines kept from the last call, extended with
+        the gates added since; writing to a file streams them all afresh."""
+        width = len(self.running_stats().qubit_counts)
+        if self.qubit_labels:
+            width = max(width, max(self.qubit_labels.values()) + 1)
+        if out is None:
+            key = ('qasm', version)
+            body = self._lowered(key, lambda: QasmBody(self.qubit_labels, version))
+            if body.qubit_labels != self.qubit_labels:
+                # Measurements are written into the labelled qubits' registers
+                body = QasmBody(self.qubit_labels, version)
+                self.lowered[key] = (self.generation, body)
+            body.extend(self.columns)
+            return body.program(width)
+        write_qasm(self.columns, self.qubit_labels, width, out, version)
+        return None
 
     @deps.require('labber')
     def to_labber(self):
@@ -80,3 +356,29 @@ class Circuit:
         to_latex = deps.cirq.contrib.qcircuit.circuit_to_latex_using_qcircuit
         circuit = self.to_cirq()
         return to_latex(circuit, circuit.all_qubits())
+
+
+class CountingCircuit(Circuit):
+    """A circuit that counts the resources of the gates added to it, but
+    doesn't keep them, so that a program too large to build can still be
+    estimated. Its statistics are those of the gates added, though it has no
+    gates to show; and it can't be restored from a snapshot."""
+
+    def __init__(self, budget: Optional[Budget] = None):
+        super().__init__(budget)
+        self.counter = ResourceCounter()
+        self.running = self.counter
+
+    def add_gates(self, gates: List[Gate]):
+        self.counter.extend(gates)
+        if self.meter is not None:
+            self.meter.count_gates(self.counter.gates)
+
+    def running_stats(self) -> RunningStats:
+        return self.counter
+
+    def estimate_resources(self) -> ResourceEstimate:
+        return self.counter.estimate()
+
+    def restore(self, snapshot: CircuitSnapshot) -> None:
+        raise CavyRuntimeError("a counting circuit can't be restored")
@@ -0,0 +1,141 @@
+"""Columnar storage for circuits. Rather than a list of `Gate` objects, each
+costing hundreds of bytes, a circuit's gates are kept as parallel arrays: an
+opcode column, two operand columns, a bitmask of conjugation flags, and an
+optional column of source lines. That's nine bytes per gate, plus four for the
+source map.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import dependencies as deps
+from .gates import Gate, GATE_TYPES
+
+# Stands in for the second operand of a single-qubit gate
+NO_QUBIT = -1
+
+
+class GateColumns:
+    """An append-only store of gates, column by column. Appends are amortized
+    constant time, as each column grows geometrically."""
+
+    def __init__(self, locations: bool = False):
+        self.opcodes = array('B')
+        self.operands0 = array('i')
+        self.operands1 = array('i')
+        self.conj = bytearray()
+        self.locations = array('i') if locations else None
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    @property
+    def has_locations(self) -> bool:
+        return self.locations is not None
+
+    def chunks(self) -> Iterator['GateColumns']:
+        """The gates in consecutive pieces, each held in memory. Code that
+        streams over gates should use this, as not every store keeps all its
+        gates in memory at once."""
+        yield self
+
+    def in_memory(self) -> 'GateColumns':
+        """These columns, with all their gates in memory"""
+        return self
+
+    def append(self, gate: Gate, location: int = -1) -> None:
+        n = len(self.opcodes)
+        qubits = gate.qubits
+        self.opcodes.append(gate.opcode)
+        self.operands0.append(qubits[0])
+        self.operands1.append(qubits[1] if len(qubits) > 1 else NO_QUBIT)
+        if n & 7 == 0:
+            self.conj.append(0)
+        if gate.conj:
+            self.conj[n >> 3] |= 1 << (n & 7)
+        if self.locations is not None:
+            self.locations.append(location)
+
+    def extend(self, gates: Iterable[Gate], location: int = -1) -> None:
+        for gate in gates:
+            self.append(gate, location)
+
+    def is_conj(self, i: int) -> bool:
+        return bool(self.conj[i >> 3] >> (i & 7) & 1)
+
+    def gate(self, i: int) -> Gate:
+        """Reconstruct the gate at a position"""
+        gate_type = GATE_TYPES[self.opcodes[i]]
+        q1 = self.operands1[i]
+        if q1 == NO_QUBIT:
+            return gate_type(self.operands0[i], conj=self.is_conj(i))
+        return gate_type(self.operands0[i], q1, conj=self.is_conj(i))
+
+    def __iter__(self) -> Iterator[Gate]:
+        for i in range(len(self.opcodes)):
+            yield self.gate(i)
+
+    def copy(self, length: Optional[int] = None) -> 'GateColumns':
+        """Copy the first `length` gates (by default, all of them)"""
+        if length is None:
+            length = len(self)
+        new = GateColumns.__new__(GateColumns)
+        new.opcodes = self.opcodes[:length]
+        new.operands0 = self.operands0[:length]
+        new.operands1 = self.operands1[:length]
+        new.conj = self.conj[:(length + 7) >> 3]
+        if length & 7:
+            # Clear flags belonging to gates past the end
+            new.conj[-1] &= (1 << (length & 7)) - 1
+        new.locations = None if self.locations is None else self.locations[:length]
+        return new
+
+    @property
+    def nbytes(self) -> int:
+        """The memory used by the columns themselves"""
+        total = sum(col.itemsize * len(col)
+                    for col in (self.opcodes, self.operands0, self.operands1))
+        total += len(self.conj)
+        if self.locations is not None:
+            total += self.locations.itemsize * len(self.locations)
+        return total
+
+    @deps.require('numpy')
+    def to_numpy(self) -> Dict[str, 'numpy.ndarray']:
+        """The columns as NumPy arrays, for vectorized passes. The opcode and
+        operand arrays are views, not copies: the columns can't be appended to
+        while any of them is alive."""
+        np = deps.numpy
+        n = len(self)
+        columns = {
+            'opcodes': np.frombuffer(self.opcodes, dtype=np.uint8),
+            'operands0': np.frombuffer(self.operands0, dtype=np.int32),
+            'operands1': np.frombuffer(self.operands1, dtype=np.int32),
+            'conj': np.unpackbits(np.frombuffer(bytes(self.conj), dtype=np.uint8),
+                                  count=n, bitorder='little').astype(bool),
+        }
+        if self.locations is not None:
+            columns['locations'] = np.frombuffer(self.locations, dtype=np.int32)
+        return columns
+
+
+class GateView(Sequence):
+    """A read-only sequence of `Gate` objects over a `GateColumns`, for code that
+    works gate-by-gate. Gates are reconstructed on access."""
+
+    def __init__(self, columns: GateColumns):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Gate, List[Gate]]:
+        if isinstance(index, slice):
+            return [self.columns.gate(i) for i in range(*index.indices(len(self)))]
+        return self.columns.gate(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[Gate]:
+        return iter(self.columns)
+
+    def __repr__(self) -> str:
+        return f"<GateView of {len(self)} gates>"
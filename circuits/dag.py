@@ -0,0 +1,251 @@
+"""A circuit as a directed acyclic graph. Each gate is a node, threaded onto a
+doubly linked list for each of its qubits, so that a gate's neighbours on any
+wire are found, and gates removed or swapped, in constant time. Passes that
+need more than adjacency in the gate list build one of these.
+"""
+
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .gates import (Gate, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+from .peephole import merge
+
+# How each gate acts on each of its qubits, for the purposes of commutation: 'z'
+# if it's diagonal in the computational basis on that qubit, 'x' if it's
+# diagonal in the Hadamard basis, and None if neither. Two gates commute if, on
+# every qubit they share, they act in the same basis.
+WIRE_BASES = {
+    NotGate: ('x',),
+    ZGate: ('z',),
+    TGate: ('z',),
+    SGate: ('z',),
+    CnotGate: ('z', 'x'),
+    HadamardGate: (None,),
+    SwapGate: (None, None),
+    CzGate: ('z', 'z'),
+    SqrtXGate: ('x',),
+    # Measurements are left in place, so the bits they produce stay in order.
+    StrongMeasurementGate: (None,),
+}
+
+
+def commutes(a: Gate, b: Gate) -> bool:
+    """True if `a` and `b` can be exchanged, according to `WIRE_BASES`. Gates on
+    disjoint qubits always commute."""
+    bases_a = WIRE_BASES.get(type(a), (None,) * a.arity)
+    bases_b = WIRE_BASES.get(type(b), (None,) * b.arity)
+    for qa, basis in zip(a.qubits, bases_a):
+        for qb, basis_b in zip(b.qubits, bases_b):
+            if qa == qb and (basis is None or basis != basis_b):
+                return False
+    return True
+
+
+class DagNode:
+    """A gate in a `CircuitDag`. `prev[i]` and `next[i]` are its neighbours on
+    the wire of `gate.qubits[i]`."""
+
+    __slots__ = ('gate', 'index', 'prev', 'next', 'alive')
+
+    def __init__(self, gate: Gate, index: int):
+        self.gate = gate
+        self.index = index  # its position in the original gate list
+        self.prev: List[Optional['DagNode']] = [None] * len(gate.qubits)
+        self.next: List[Optional['DagNode']] = [None] * len(gate.qubits)
+        self.alive = True
+
+    def __repr__(self) -> str:
+        return f"DagNode({self.gate!r}, {self.index})"
+
+
+class CircuitDag:
+
+    def __init__(self, gates: Iterable[Gate] = ()):
+        self.nodes: List[DagNode] = []
+        self.first: Dict[int, DagNode] = {}  # the first gate on each wire
+        self.last: Dict[int, DagNode] = {}   # the last gate on each wire
+        for gate in gates:
+            self.append(gate)
+
+    def __len__(self) -> int:
+        return sum(node.alive for node in self.nodes)
+
+    def append(self, gate: Gate) -> DagNode:
+        node = DagNode(gate, len(self.nodes))
+        self.nodes.append(node)
+        for i, qubit in enumerate(gate.qubits):
+            tail = self.last.get(qubit)
+            if tail is None:
+                self.first[qubit] = node
+            else:
+                tail.next[tail.gate.qubits.index(qubit)] = node
+                node.prev[i] = tail
+            self.last[qubit] = node
+        return node
+
+    def predecessor(self, node: DagNode, qubit: int) -> Optional[DagNode]:
+        """The gate before `node` on a wire"""
+        return node.prev[node.gate.qubits.index(qubit)]
+
+    def successor(self, node: DagNode, qubit: int) -> Optional[DagNode]:
+        """The gate after `node` on a wire"""
+        return node.next[node.gate.qubits.index(qubit)]
+
+    def wire(self, qubit: int) -> Iterator[DagNode]:
+        """The gates on a wire, in order"""
+        node = self.first.get(qubit)
+        while node is not None:
+            yield node
+            node = self.successor(node, qubit)
+
+    def _link(self, before: Optional[DagNode], after: Optional[DagNode],
+              qubit: int) -> None:
+        if before is None:
+            if after is None:
+                del self.first[qubit]
+            else:
+                self.first[qubit] = after
+        else:
+            before.next[before.gate.qubits.index(qubit)] = after
+        if after is None:
+            if before is None:
+                del self.last[qubit]
+            else:
+                self.last[qubit] = before
+        else:
+            after.prev[after.gate.qubits.index(qubit)] = before
+
+    def remove(self, node: DagNode) -> None:
+        """Splice a gate out of every wire it's on"""
+        for i, qubit in enumerate(node.gate.qubits):
+            self._link(node.prev[i], node.next[i], qubit)
+            node.prev[i] = node.next[i] = None
+        node.alive = False
+
+    def replace(self, node: DagNode, gate: Gate) -> None:
+        """Replace the gate at a node with one on the same qubits"""
+        assert gate.qubits == node.gate.qubits
+        node.gate = gate
+
+    def adjacent(self, node: DagNode, other: DagNode) -> bool:
+        """True if `other` directly follows `node` on every wire they share,
+        and they share at least one"""
+        shared = False
+        for i, qubit in enumerate(node.gate.qubits):
+            if qubit in other.gate.qubits:
+                if node.next[i] is not other:
+                    return False
+                shared = True
+        return shared
+
+    def reaches(self, node: DagNode, other: DagNode, limit: int = 32) -> Optional[bool]:
+        """True if there is a path from `node` to `other`, found by searching
+        back from `other`; None if that takes more than `limit` steps."""
+        stack, seen = [other], set()
+        while stack:
+            current = stack.pop()
+            if current is node:
+                return True
+            if current in seen:
+                continue
+            seen.add(current)
+            if len(seen) > limit:
+                return None
+            stack.extend(prev for prev in current.prev if prev is not None)
+        return False
+
+    def swappable(self, node: DagNode, other: DagNode) -> bool:
+        """True if `other` directly follows `node` on the wires they share, and
+        the only paths between them are those wires. Otherwise exchanging them
+        would make a cycle."""
+        if not self.adjacent(node, other):
+            return False
+        qubits, other_qubits = set(node.gate.qubits), set(other.gate.qubits)
+        if qubits <= other_qubits or other_qubits <= qubits:
+            return True
+        # Each has a wire the other doesn't: look for a path along those.
+        for i, qubit in enumerate(other.gate.qubits):
+            prev = other.prev[i]
+            if qubit not in qubits and prev is not None:
+                if self.reaches(node, prev) is not False:
+                    return False
+        return True
+
+    def swap(self, node: DagNode, other: DagNode) -> None:
+        """Exchange two adjacent gates, so that `node` follows `other`. The
+        gates must commute for the circuit to be unchanged."""
+        assert self.swappable(node, other)
+        for i, qubit in enumerate(node.gate.qubits):
+            if qubit not in other.gate.qubits:
+                continue
+            j = other.gate.qubits.index(qubit)
+            before, after = node.prev[i], other.next[j]
+            self._link(before, other, qubit)
+            other.next[j] = node
+            node.prev[i] = other
+            self._link(node, after, qubit)
+
+    def gates(self) -> List[Gate]:
+        """The gates in a topological order, as close to the original order as
+        the dependencies allow"""
+        waiting = {}
+        ready = []
+        for node in self.nodes:
+            if node.alive:
+                waiting[node] = sum(prev is not None for prev in node.prev)
+                if waiting[node] == 0:
+                    ready.append((node.index, node))
+        heapq.heapify(ready)
+        gates = []
+        while ready:
+            _, node = heapq.heappop(ready)
+            gates.append(node.gate)
+            for next_ in node.next:
+                if next_ is not None:
+                    waiting[next_] -= 1
+                    if waiting[next_] == 0:
+                        heapq.heappush(ready, (next_.index, next_))
+        return gates
+
+
+def cancel_commuting(dag: CircuitDag, window: int = 64) -> int:
+    """Cancel inverse pairs, and merge T and S gates, that are separated only by
+    gates they commute with. Each gate is moved forward past at most `window`
+    commuting gates looking for a partner. Returns the number of gates
+    removed."""
+    removed = 0
+    # Gates still to be looked at, the next on top. When a pair is removed,
+    # the gates before it are looked at again, as they may now meet partners.
+    pending = list(reversed(dag.nodes))
+    while pending:
+        node = pending.pop()
+        moves = 0
+        while node.alive and moves <= window:
+            # Candidates are the gates directly after this one on its wires
+            followers = [next_ for next_ in node.next if next_ is not None]
+            moved = False
+            for other in dict.fromkeys(followers):
+                if not dag.swappable(node, other):
+                    continue
+                if other.gate.qubits == node.gate.qubits:
+                    merged = merge(node.gate, other.gate)
+                    if merged is not None and len(merged) <= 1:
+                        exposed = [prev for prev in node.prev if prev is not None]
+                        dag.remove(node)
+                        if merged:
+                            dag.replace(other, merged[0])
+                            exposed.append(other)
+                        else:
+                            dag.remove(other)
+                        pending.extend(exposed)
+                        removed += 2 - len(merged)
+                        break
+                if commutes(node.gate, other.gate):
+                    dag.swap(node, other)
+                    moved = True
+                    break
+            if not moved:
+                break
+            moves += 1
+    return removed
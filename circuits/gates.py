@@ -1,26 +1,113 @@
-from abc import ABC, abstractmethod
-from copy import copy
-from typing import List
+from abc import abstractmethod
+from typing import Dict, List, Tuple
+import weakref
 
 import dependencies as deps
 
+GateKey = Tuple[type, Tuple[int, ...], bool]
+
+# Every gate in existence, keyed by its type, qubits and conjugation. Gates are
+# immutable, so there need only ever be one of each. The table holds them
+# weakly, so that the gates of a discarded circuit are collected.
+_GATES: 'weakref.WeakValueDictionary[GateKey, Gate]' = weakref.WeakValueDictionary()
+# The gates made most recently, held strongly so that gates decoded from
+# columns one at a time aren't made afresh each time. Emptied when full.
+_RECENT: Dict[GateKey, 'Gate'] = {}
+RECENT_GATES = 1 << 14
+# The most controlled expansions cached for a gate, one per control qubit
+CONTROLLED_EXPANSIONS = 16
+
+
+def clear_gate_cache() -> None:
+    """Let go of all gates, and their expansions, that nothing else refers to"""
+    _RECENT.clear()
+
+
+def _make_gate(cls: type, qubits: Tuple[int, ...], conj: bool) -> 'Gate':
+    """Unpickle a gate, as the interned instance"""
+    return cls(*qubits, conj=conj)
+
 
 class Gate:
+    """A gate acting on some qubits. Gates are hash-consed: constructing a gate
+    that has been seen before returns the existing instance, so gates can be
+    compared by identity, and their conjugates and controlled expansions are
+    computed once and cached."""
+
+    __slots__ = ('qubits', 'conj', '_conjugate', '_controlled', '__weakref__')
+
     arity = -1
+    opcode = -1  # Assigned below, from GATE_TYPES
+    # True if this gate is its own inverse
+    self_inverse = False
+
+    def __new__(cls, *qubits: int, conj: bool = False):
+        conj = bool(conj) and not cls.self_inverse
+        key = (cls, qubits, conj)
+        try:
+            return _RECENT[key]
+        except KeyError:
+            pass
+        gate = _GATES.get(key)
+        if gate is None:
+            assert len(qubits) == cls.arity
+            gate = object.__new__(cls)
+            setattr_ = object.__setattr__
+            setattr_(gate, 'qubits', qubits)  # The qubits on which this gate acts
+            setattr_(gate, 'conj', conj)  # True if this gate is conjugated
+            setattr_(gate, '_conjugate', None)
+            setattr_(gate, '_controlled', None)
+            gate = _GATES.setdefault(key, gate)
+        if len(_RECENT) >= RECENT_GATES:
+            _RECENT.clear()
+        _RECENT[key] = gate
+        return gate
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (_make_gate, (type(self), self.qubits, self.conj))
+
+    def __copy__(self) -> 'Gate':
+        return self
 
-    def __init__(self, *qubits: List[int], conj=False):
-        assert len(qubits) == self.arity
-        self.qubits = qubits  # The qubits on which this gate acts
-        self.conj = conj      # True if this gate is conjugated
+    def __deepcopy__(self, memo) -> 'Gate':
+        return self
+
+    def __repr__(self) -> str:
+        qubits = ', '.join(map(str, self.qubits))
+        conj = ', conj=True' if self.conj else ''
+        return f"{type(self).__name__}({qubits}{conj})"
 
     @abstractmethod
     def with_control(self, control: int) -> List['Gate']:
         return [Gate([])]
 
+    def controlled(self, control: int) -> Tuple['Gate', ...]:
+        """The gates implementing this one with an added control. Expansions
+        are cached per control qubit, for a few control qubits at a time."""
+        cache = self._controlled
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, '_controlled', cache)
+        try:
+            return cache[control]
+        except KeyError:
+            pass
+        if len(cache) >= CONTROLLED_EXPANSIONS:
+            cache.clear()
+        gates = cache[control] = tuple(self.with_control(control))
+        return gates
+
     def conjugate(self) -> 'Gate':
-        new_gate = copy(self)
-        new_gate.conj = not self.conj
-        return new_gate
+        if self.self_inverse:
+            return self
+        conj = self._conjugate
+        if conj is None:
+            conj = type(self)(*self.qubits, conj=not self.conj)
+            object.__setattr__(self, '_conjugate', conj)
+        return conj
 
 
 class StrongMeasurementGate(Gate):
@@ -28,6 +115,7 @@ class StrongMeasurementGate(Gate):
     diagrams.
     """
 
+    __slots__ = ()
     arity = 1
 
     @deps.require('cirq')
@@ -43,7 +131,9 @@ class StrongMeasurementGate(Gate):
 
 
 class NotGate(Gate):
+    __slots__ = ()
     arity = 1
+    self_inverse = True
 
     @deps.require('cirq')
     def to_cirq(self, qubits):
@@ -52,12 +142,11 @@ class NotGate(Gate):
     def with_control(self, control: int) -> List[Gate]:
         return [CnotGate(control, self.qubits[0])]
 
-    def conjugate(self) -> Gate:
-        return self
-
 
 class ZGate(Gate):
+    __slots__ = ()
     arity = 1
+    self_inverse = True
 
     @deps.require('cirq')
     def to_cirq(self, qubits):
@@ -70,7 +159,9 @@ class ZGate(Gate):
             HadamardGate(self.qubits[0])
         ]
 
+
 class TGate(Gate):
+    __slots__ = ()
     arity = 1
 
     @deps.require('cirq')
@@ -86,8 +177,35 @@ class TGate(Gate):
         return []
 
 
+class SGate(Gate):
+    """The phase gate, equal to two T gates"""
+    __slots__ = ()
+    arity = 1
+
+    @deps.require('cirq')
+    def to_cirq(self, qubits):
+        if self.conj:
+            cirq_gate = deps.cirq.inverse(deps.cirq.S)
+        else:
+            cirq_gate = deps.cirq.S
+        return cirq_gate(qubits[self.qubits[0]])
+
+    def with_control(self, control: int) -> List[Gate]:
+        # A quarter turn of phase on c·t = (c + t - c⊕t) / 2
+        target = self.qubits[0]
+        return [
+            TGate(control, conj=self.conj),
+            TGate(target, conj=self.conj),
+            CnotGate(control, target),
+            TGate(target, conj=not self.conj),
+            CnotGate(control, target),
+        ]
+
+
 class HadamardGate(Gate):
+    __slots__ = ()
     arity = 1
+    self_inverse = True
 
     @deps.require('cirq')
     def to_cirq(self, qubits):
@@ -102,7 +220,9 @@ class CnotGate(Gate):
     """A controlled-NOT gate acting on two qubits. qubit 0 is the controller; qubit
     1 the controllee.
     """
+    __slots__ = ()
     arity = 2
+    self_inverse = True
 
     @deps.require('cirq')
     def to_cirq(self, qubits):
@@ -126,3 +246,86 @@ class CnotGate(Gate):
             TGate(self.qubits[0], conj=True),
             CnotGate(control, self.qubits[0]),
         ]
+
+
+class SwapGate(Gate):
+    """Exchanges the states of two qubits. Routing inserts these to bring the
+    qubits of a two-qubit gate together on hardware with limited connectivity.
+    """
+    __slots__ = ()
+    arity = 2
+    self_inverse = True
+
+    @deps.require('cirq')
+    def to_cirq(self, qubits):
+        return deps.cirq.SWAP(qubits[self.qubits[0]], qubits[self.qubits[1]])
+
+    def with_control(self, control: int) -> List[Gate]:
+        # A Fredkin gate: a Toffoli conjugated by CNOTs
+        a, b = self.qubits
+        return [
+            CnotGate(b, a),
+            *CnotGate(a, b).with_control(control),
+            CnotGate(b, a),
+        ]
+
+
+class CzGate(Gate):
+    """A controlled-Z gate. It's symmetric in its two qubits, and native to many
+    devices, on which a CNOT is built from it and Hadamards.
+    """
+    __slots__ = ()
+    arity = 2
+    self_inverse = True
+
+    @deps.require('cirq')
+    def to_cirq(self, qubits):
+        return deps.cirq.CZ(qubits[self.qubits[0]], qubits[self.qubits[1]])
+
+    def with_control(self, control: int) -> List[Gate]:
+        a, b = self.qubits
+        return [
+            HadamardGate(b),
+            *CnotGate(a, b).with_control(control),
+            HadamardGate(b),
+        ]
+
+
+class SqrtXGate(Gate):
+    """The square root of X, a quarter turn about the X axis, up to a global
+    phase. Devices with a native CZ usually pair it with this.
+    """
+    __slots__ = ()
+    arity = 1
+
+    @deps.require('cirq')
+    def to_cirq(self, qubits):
+        cirq_gate = deps.cirq.X**-0.5 if self.conj else deps.cirq.X**0.5
+        return cirq_gate(qubits[self.qubits[0]])
+
+    def with_control(self, control: int) -> List[Gate]:
+        # √X is exactly H·S·H
+        target = self.qubits[0]
+        return [
+            HadamardGate(target),
+            *SGate(target, conj=self.conj).with_control(control),
+            HadamardGate(target),
+        ]
+
+
+# Every gate type, indexed by its opcode in columnar circuit storage. New gate
+# types must be appended, so that stored opcodes keep their meaning.
+GATE_TYPES = [
+    StrongMeasurementGate,
+    NotGate,
+    ZGate,
+    TGate,
+    HadamardGate,
+    CnotGate,
+    SGate,
+    SwapGate,
+    CzGate,
+    SqrtXGate,
+]
+for _opcode, _gate_type in enumerate(GATE_TYPES):
+    _gate_type.opcode = _opcode
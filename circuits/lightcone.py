@@ -0,0 +1,61 @@
+"""Light-cone pruning. Only the labelled qubits of a circuit are ever reported,
+so any gate outside the causal past of their measurements can be dropped, along
+with any qubit left idle.
+"""
+
+from typing import Dict, List, Tuple
+
+from .columns import GateColumns, NO_QUBIT
+from .gates import GATE_TYPES, StrongMeasurementGate
+
+
+def light_cone(columns: GateColumns, outputs: Dict[str, int]) -> List[int]:
+    """The indices of the gates that can affect the measurements of the output
+    qubits, in one backward pass. A gate is kept if it touches a qubit already
+    in the cone, and then all of its qubits join the cone."""
+    columns = columns.in_memory()
+    measure = StrongMeasurementGate.opcode
+    opcodes, operands0, operands1 = columns.opcodes, columns.operands0, columns.operands1
+    outputs = set(outputs.values())
+    # An output is in the cone from its last measurement back; one that is never
+    # measured, from the end of the circuit.
+    measured = {operands0[i] for i in range(len(columns)) if opcodes[i] == measure}
+    live = outputs - measured
+    kept = []
+    for i in range(len(columns) - 1, -1, -1):
+        q0, q1 = operands0[i], operands1[i]
+        if q0 in live or q1 in live:
+            live.add(q0)
+            if q1 != NO_QUBIT:
+                live.add(q1)
+        elif opcodes[i] == measure and q0 in outputs:
+            live.add(q0)
+        else:
+            continue
+        kept.append(i)
+    kept.reverse()
+    return kept
+
+
+def prune(columns: GateColumns, outputs: Dict[str, int]) -> Tuple[GateColumns, Dict[int, int]]:
+    """The gates in the light cone of the output qubits, with the qubits that
+    remain numbered from zero in their original order. Also returns the new
+    number of each remaining qubit."""
+    columns = columns.in_memory()
+    kept = light_cone(columns, outputs)
+    operands0, operands1 = columns.operands0, columns.operands1
+    qubits = {operands0[i] for i in kept}
+    qubits.update(operands1[i] for i in kept)
+    qubits.discard(NO_QUBIT)
+    qubits.update(outputs.values())
+    renumbering = {old: new for new, old in enumerate(sorted(qubits))}
+
+    pruned = GateColumns(locations=columns.has_locations)
+    for i in kept:
+        gate_type = GATE_TYPES[columns.opcodes[i]]
+        operands = [renumbering[operands0[i]]]
+        if operands1[i] != NO_QUBIT:
+            operands.append(renumbering[operands1[i]])
+        location = -1 if columns.locations is None else columns.locations[i]
+        pruned.append(gate_type(*operands, conj=columns.is_conj(i)), location)
+    return pruned, renumbering
@@ -0,0 +1,143 @@
+"""Resynthesis of linear reversible blocks. A run of CNOT and X gates computes
+an affine map over GF(2), y = Ax + b, which is rebuilt with the Patel-Markov-Hayes
+algorithm and substituted if that takes fewer gates. Rows of A are Python ints
+used as bit vectors, so adding one row to another is a single XOR however many
+qubits the block spans.
+"""
+
+from math import log2
+from typing import Dict, Iterable, List, Tuple
+
+import dependencies as deps
+from .gates import Gate, CnotGate, NotGate
+
+
+class AffineMap:
+    """The map y = Ax + b computed by a block of CNOT and X gates on some qubits,
+    which are numbered locally from zero. Bit j of `rows[i]` is A[i][j]."""
+
+    def __init__(self, width: int):
+        self.rows = [1 << i for i in range(width)]
+        self.constant = 0  # b, as a bitmask
+
+    @property
+    def width(self) -> int:
+        return len(self.rows)
+
+    def cnot(self, control: int, target: int) -> None:
+        self.rows[target] ^= self.rows[control]
+        self.constant ^= ((self.constant >> control) & 1) << target
+
+    def x(self, qubit: int) -> None:
+        self.constant ^= 1 << qubit
+
+    @deps.require('numpy')
+    def to_numpy(self) -> 'numpy.ndarray':
+        """The matrix A, with each row packed into bytes, little-endian"""
+        np = deps.numpy
+        nbytes = (self.width + 7) // 8
+        packed = b''.join(row.to_bytes(nbytes, 'little') for row in self.rows)
+        return np.frombuffer(packed, dtype=np.uint8).reshape(self.width, nbytes)
+
+
+def _lower_synth(rows: List[int], width: int, section: int) -> List[Tuple[int, int]]:
+    """Reduce `rows` to upper triangular form in place by row additions, in
+    sections of `section` columns. Returns the additions, as (source, target)
+    pairs, in the order they were made."""
+    ops = []
+    for start in range(0, width, section):
+        end = min(start + section, width)
+        mask = ((1 << (end - start)) - 1) << start
+        # Clear rows whose pattern in this section duplicates an earlier one
+        patterns: Dict[int, int] = {}
+        for row in range(start, width):
+            pattern = rows[row] & mask
+            if not pattern:
+                continue
+            if pattern in patterns:
+                rows[row] ^= rows[patterns[pattern]]
+                ops.append((patterns[pattern], row))
+            else:
+                patterns[pattern] = row
+        # Eliminate what remains in the section, column by column
+        for col in range(start, end):
+            bit = 1 << col
+            diagonal = bool(rows[col] & bit)
+            for row in range(col + 1, width):
+                if rows[row] & bit:
+                    if not diagonal:
+                        rows[col] ^= rows[row]
+                        ops.append((row, col))
+                        diagonal = True
+                    rows[row] ^= rows[col]
+                    ops.append((col, row))
+    return ops
+
+
+def _transpose(rows: List[int], width: int) -> List[int]:
+    return [sum(((rows[i] >> j) & 1) << i for i in range(width))
+            for j in range(width)]
+
+
+def synthesize(rows: List[int], section: int = 0) -> List[Tuple[int, int]]:
+    """CNOTs, as (control, target) pairs in circuit order, computing the
+    invertible linear map with the given rows, by the Patel-Markov-Hayes
+    algorithm. By default, sections are about half the log of the width."""
+    width = len(rows)
+    if not section:
+        section = max(1, round(log2(width) / 2)) if width > 1 else 1
+    rows = list(rows)
+    lower = _lower_synth(rows, width, section)   # L A = U
+    rows = _transpose(rows, width)
+    upper = _lower_synth(rows, width, section)   # L' U^T = I
+    # Then A = L^-1 U = L^-1 (L'^-1)^T. Each row addition is its own inverse,
+    # and transposing one exchanges its source and target.
+    return [(target, source) for source, target in upper] + lower[::-1]
+
+
+def _block_gates(affine: AffineMap, qubits: List[int], section: int = 0) -> List[Gate]:
+    gates = [CnotGate(qubits[c], qubits[t])
+             for c, t in synthesize(affine.rows, section)]
+    gates += [NotGate(qubits[i]) for i in range(affine.width)
+              if affine.constant >> i & 1]
+    return gates
+
+
+def _resynthesize_block(block: List[Gate]) -> List[Gate]:
+    qubits = sorted({qubit for gate in block for qubit in gate.qubits})
+    local = {qubit: i for i, qubit in enumerate(qubits)}
+    affine = AffineMap(len(qubits))
+    for gate in block:
+        if type(gate) is CnotGate:
+            affine.cnot(local[gate.qubits[0]], local[gate.qubits[1]])
+        else:
+            affine.x(local[gate.qubits[0]])
+    best = block
+    # The best section size isn't always the asymptotic one for small blocks
+    for section in range(1, min(len(qubits), 4) + 1):
+        candidate = _block_gates(affine, qubits, section)
+        if len(candidate) < len(best):
+            best = candidate
+    return best
+
+
+def resynthesize(gates: Iterable[Gate]) -> List[Gate]:
+    """Replace each maximal block of CNOT and X gates with a smaller equivalent,
+    where one can be found. A block is held back while other gates go by on
+    other qubits, and is emitted once a gate that isn't linear touches one of
+    its qubits."""
+    out: List[Gate] = []
+    block: List[Gate] = []
+    block_qubits = set()
+    for gate in gates:
+        if type(gate) in (CnotGate, NotGate):
+            block.append(gate)
+            block_qubits.update(gate.qubits)
+            continue
+        if block_qubits.intersection(gate.qubits):
+            out.extend(_resynthesize_block(block))
+            block, block_qubits = [], set()
+        out.append(gate)
+    if block:
+        out.extend(_resynthesize_block(block))
+    return out
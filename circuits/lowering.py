@@ -0,0 +1,140 @@
+"""Batched lowering of circuits to Cirq. Cirq's gates and qubits are looked up
+once, rather than once per gate; each distinct operation is built once; and the
+gates are read straight from the columns into moments of a native schedule, so
+that Cirq doesn't have to rediscover them.
+"""
+
+import inspect
+from typing import Dict, List, Optional, Tuple
+
+import dependencies as deps
+from .columns import GateColumns, NO_QUBIT
+from .gates import (GATE_TYPES, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+from .schedule import Policy, schedule
+
+
+def measurement_key(qubit: int) -> str:
+    """The Cirq measurement key of a qubit"""
+    return str((qubit, 0))
+
+
+class CirqLowering:
+    """The Cirq gate for each opcode, and its conjugate, and the `GridQubit` for
+    each qubit number, looked up once and reused.
+
+    A lowering can also be kept alongside a circuit and extended as gates are
+    added to it, so that each gate is only lowered once."""
+
+    @deps.require('cirq')
+    def __init__(self):
+        cirq = deps.cirq
+        self.cirq = cirq
+        gates = {
+            NotGate: (cirq.X, cirq.X),
+            ZGate: (cirq.Z, cirq.Z),
+            TGate: (cirq.T, cirq.T**-1),
+            SGate: (cirq.S, cirq.S**-1),
+            HadamardGate: (cirq.H, cirq.H),
+            CnotGate: (cirq.CNOT, cirq.CNOT),
+            SwapGate: (cirq.SWAP, cirq.SWAP),
+            CzGate: (cirq.CZ, cirq.CZ),
+            SqrtXGate: (cirq.X**0.5, cirq.X**-0.5),
+        }
+        self.gates: List[Optional[Tuple]] = [gates.get(gate_type) for gate_type in GATE_TYPES]
+        self.qubits: List = []
+        self.operations: Dict[Tuple[int, int, int, bool], object] = {}
+        # The state of an incremental lowering: the number of gates lowered,
+        # the next free moment on each qubit, and the moments so far
+        self.length = 0
+        self.frontier: Dict[int, int] = {}
+        self.moments: List = []
+        # The operations in a moment of the schedule are already flat, so
+        # Cirq needn't flatten them again, where it can be told not to.
+        self.moment_options = {}
+        if '_flatten_contents' in inspect.signature(cirq.Moment).parameters:
+            self.moment_options['_flatten_contents'] = False
+
+    def qubit(self, index: int):
+        qubits = self.qubits
+        while len(qubits) <= index:
+            qubits.append(self.cirq.GridQubit(len(qubits), 0))
+        return qubits[index]
+
+    def operation(self, opcode: int, q0: int, q1: int, conj: bool):
+        """The Cirq operation for a gate; each distinct one is built once"""
+        key = (opcode, q0, q1, conj)
+        operation = self.operations.get(key)
+        if operation is None:
+            qubit = self.qubit
+            if opcode == StrongMeasurementGate.opcode:
+                operation = self.cirq.measure(qubit(q0), key=measurement_key(q0))
+            elif q1 == NO_QUBIT:
+                operation = self.gates[opcode][conj].on(qubit(q0))
+            else:
+                operation = self.gates[opcode][conj].on(qubit(q0), qubit(q1))
+            self.operations[key] = operation
+        return operation
+
+    def extend(self, columns: GateColumns) -> None:
+        """Lower the gates after the ones already lowered, placing each in the
+        earliest moment free on its qubits, as in an ASAP schedule. Moments
+        that gain operations are replaced; the rest are reused as they are."""
+        cirq, operation, frontier = self.cirq, self.operation, self.frontier
+        # The new operations in each moment
+        added: Dict[int, list] = {}
+        offset = 0
+        for chunk in columns.chunks():
+            n = len(chunk)
+            if offset + n <= self.length:
+                offset += n
+                continue
+            opcodes, operands0, operands1 = chunk.opcodes, chunk.operands0, chunk.operands1
+            for i in range(max(self.length - offset, 0), n):
+                q0, q1 = operands0[i], operands1[i]
+                moment = frontier.get(q0, 0)
+                if q1 != NO_QUBIT:
+                    moment = max(moment, frontier.get(q1, 0))
+                    frontier[q1] = moment + 1
+                frontier[q0] = moment + 1
+                ops = added.get(moment)
+                if ops is None:
+                    ops = added[moment] = []
+                ops.append(operation(opcodes[i], q0, q1, chunk.is_conj(i)))
+            offset += n
+        self.length = len(columns)
+
+        moments, options = self.moments, self.moment_options
+        for moment in sorted(added):
+            ops = added[moment]
+            if moment < len(moments):
+                moments[moment] = moments[moment].with_operations(*ops)
+            else:
+                moments.append(cirq.Moment(*ops, **options))
+
+    def circuit(self):
+        return self.cirq.Circuit.from_moments(*self.moments)
+
+    def lower(self, columns: GateColumns, policy: Policy = Policy.ASAP):
+        """A Cirq circuit with a moment for each moment of the schedule"""
+        if Policy(policy) is Policy.ASAP:
+            self.extend(columns)
+            return self.circuit()
+        cirq, operation = self.cirq, self.operation
+        columns = columns.in_memory()
+        moments = schedule(columns, policy)
+        layers = [[] for _ in range(moments.depth)]
+        opcodes, operands0, operands1 = columns.opcodes, columns.operands0, columns.operands1
+        for i, moment in enumerate(moments.moments):
+            layers[moment].append(operation(opcodes[i], operands0[i], operands1[i],
+                                            columns.is_conj(i)))
+        options = self.moment_options
+        return cirq.Circuit.from_moments(*(cirq.Moment(*layer, **options)
+                                           for layer in layers))
+
+
+def to_cirq(columns: GateColumns, policy: Policy = Policy.ASAP):
+    """Lower some gate columns to a Cirq circuit. Qubit `i` becomes
+    `GridQubit(i, 0)`, and its measurements have the key `measurement_key(i)`."""
+    return CirqLowering().lower(columns, policy)
+
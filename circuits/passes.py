@@ -0,0 +1,145 @@
+"""Optimization pipelines over circuits. A `PassManager` runs a sequence of
+passes, each a function from a `Circuit` to an equivalent `Circuit`, and records
+what each one did. Sequences of passes can be repeated to a fixpoint.
+"""
+
+from dataclasses import dataclass
+import time
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from .circuit import Circuit
+from .simulator import equivalent
+from .transpile import NativeGateSet
+
+
+@dataclass
+class PassMetrics:
+    """What one run of a pass did to a circuit"""
+    name: str
+    seconds: float
+    gates: int   # the number of gates afterwards
+    depth: int
+    width: int
+    gate_delta: int
+    depth_delta: int
+    width_delta: int
+
+    def __str__(self) -> str:
+        return (f"{self.name:<20} {self.seconds * 1000:8.2f}ms  "
+                f"gates {self.gates} ({self.gate_delta:+d})  "
+                f"depth {self.depth} ({self.depth_delta:+d})  "
+                f"width {self.width} ({self.width_delta:+d})")
+
+
+class PassVerificationError(Exception):
+    """Raised in verification mode when a pass changes what a circuit does.
+    This is always a bug in the pass."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = name
+
+    def __str__(self) -> str:
+        return f"Verification error: the '{self.name}' pass changed the circuit's action."
+
+
+class Pass:
+    """A named transformation of circuits"""
+
+    def __init__(self, name: str, transform: Callable[[Circuit], Circuit]):
+        self.name = name
+        self.transform = transform
+
+    def run(self, circuit: Circuit, manager: 'PassManager') -> Circuit:
+        return manager.measure(self.name, self.transform, circuit)
+
+
+class Fixpoint:
+    """A sequence of passes, repeated until it stops removing gates"""
+
+    def __init__(self, passes: Sequence[Pass], max_iterations: int = 8):
+        self.passes = passes
+        self.max_iterations = max_iterations
+
+    def run(self, circuit: Circuit, manager: 'PassManager') -> Circuit:
+        for _ in range(self.max_iterations):
+            before = len(circuit.columns)
+            for pass_ in self.passes:
+                circuit = pass_.run(circuit, manager)
+            if len(circuit.columns) >= before:
+                break
+        return circuit
+
+
+PEEPHOLE = Pass('peephole', Circuit.peephole)
+CANCEL_COMMUTING = Pass('cancel_commuting', Circuit.cancel_commuting)
+PHASE_FOLD = Pass('phase_fold', Circuit.phase_fold)
+RESYNTHESIZE_LINEAR = Pass('resynthesize_linear', Circuit.resynthesize_linear)
+
+
+def transpile_pass(gate_set: NativeGateSet) -> Pass:
+    return Pass(f'transpile:{gate_set.name}', lambda circuit: circuit.transpile(gate_set))
+
+
+# The pipeline run at each optimization level
+OPT_LEVELS = {
+    0: [],
+    1: [PEEPHOLE],
+    2: [Fixpoint([PEEPHOLE, CANCEL_COMMUTING, RESYNTHESIZE_LINEAR])],
+    3: [Fixpoint([PEEPHOLE, CANCEL_COMMUTING, PHASE_FOLD, RESYNTHESIZE_LINEAR])],
+}
+
+
+class PassManager:
+    """Runs a pipeline of passes. In verification mode, each pass's output is
+    checked against its input by simulation, on circuits no wider than
+    `verify_width`; wider circuits aren't checked."""
+
+    def __init__(self, pipeline: Iterable, verify: bool = False, verify_width: int = 10):
+        self.pipeline = list(pipeline)
+        self.verify = verify
+        self.verify_width = verify_width
+        self.metrics: List[PassMetrics] = []
+
+    @classmethod
+    def for_level(cls, level: int, verify: bool = False,
+                  target: Optional[NativeGateSet] = None) -> 'PassManager':
+        """The pipeline for an optimization level, followed by transpilation to
+        the `target` gate set if there is one"""
+        if level not in OPT_LEVELS:
+            raise ValueError(f"Invalid optimization level: {level}")
+        pipeline = list(OPT_LEVELS[level])
+        if target is not None:
+            pipeline.append(transpile_pass(target))
+        return cls(pipeline, verify=verify)
+
+    def run(self, circuit: Circuit) -> Circuit:
+        for pass_ in self.pipeline:
+            circuit = pass_.run(circuit, self)
+        return circuit
+
+    def measure(self, name: str, transform: Callable[[Circuit], Circuit],
+                circuit: Circuit) -> Circuit:
+        before = circuit.stats()
+        start = time.perf_counter()
+        result = transform(circuit)
+        seconds = time.perf_counter() - start
+        after = result.stats()
+        self.metrics.append(PassMetrics(
+            name, seconds, after.gates, after.depth, after.width,
+            after.gates - before.gates,
+            after.depth - before.depth,
+            after.width - before.width,
+        ))
+        if self.verify and max(before.width, after.width) <= self.verify_width:
+            if not equivalent(circuit.gates, result.gates):
+                raise PassVerificationError(name)
+        return result
+
+    def report(self) -> str:
+        return '\n'.join(map(str, self.metrics))
+
+
+def optimize(circuit: Circuit, level: int, verify: bool = False) -> Circuit:
+    """Optimize a circuit at one of the levels in `OPT_LEVELS`"""
+    return PassManager.for_level(level, verify=verify).run(circuit)
@@ -0,0 +1,78 @@
+"""A peephole optimizer. Gates are streamed through once; each qubit keeps a
+stack of the surviving gates that act on it, so that a new gate need only be
+compared with the gates on top of its qubits' stacks. Cancelling a pair exposes
+the gates beneath it, so that cascades like H·CNOT·CNOT·H vanish entirely.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from .gates import Gate, SGate, StrongMeasurementGate, TGate, ZGate
+
+
+def merge(first: Gate, second: Gate) -> Optional[List[Gate]]:
+    """The gates equivalent to `first` followed by `second`, if they can be
+    simplified; the gates act on the same qubits. Otherwise None."""
+    if type(first) is StrongMeasurementGate:
+        return None
+    if first.conjugate() is second:
+        return []
+    if first is second:
+        if type(first) is TGate:
+            return [SGate(*first.qubits, conj=first.conj)]
+        if type(first) is SGate:
+            return [ZGate(*first.qubits)]
+    return None
+
+
+class Peephole:
+    """The state of a streaming peephole pass"""
+
+    def __init__(self):
+        # Surviving gates, with None in place of those removed
+        self.out: List[Optional[Gate]] = []
+        # For each qubit, the indices in `out` of the surviving gates on it
+        self.stacks: Dict[int, List[int]] = {}
+        self.removed = 0
+
+    def top(self, qubit: int) -> int:
+        stack = self.stacks.get(qubit)
+        return stack[-1] if stack else -1
+
+    def pop(self, index: int) -> Gate:
+        gate = self.out[index]
+        self.out[index] = None
+        for qubit in gate.qubits:
+            self.stacks[qubit].pop()
+        return gate
+
+    def push(self, gate: Gate) -> None:
+        qubits = gate.qubits
+        index = self.top(qubits[0])
+        # The gate before this one can only be simplified with it if it's on top
+        # of the stack of every qubit this gate touches, and touches no others.
+        if index != -1 and all(self.top(q) == index for q in qubits[1:]):
+            previous = self.out[index]
+            if previous.qubits == qubits:
+                merged = merge(previous, gate)
+                if merged is not None:
+                    self.pop(index)
+                    self.removed += 2 - len(merged)
+                    for gate_ in merged:
+                        self.push(gate_)
+                    return
+        index = len(self.out)
+        self.out.append(gate)
+        for qubit in qubits:
+            self.stacks.setdefault(qubit, []).append(index)
+
+    def gates(self) -> List[Gate]:
+        return [gate for gate in self.out if gate is not None]
+
+
+def peephole(gates: Iterable[Gate]) -> List[Gate]:
+    """Cancel adjacent inverse gates, and merge adjacent T and S gates, in time
+    linear in the number of gates."""
+    state = Peephole()
+    for gate in gates:
+        state.push(gate)
+    return state.gates()
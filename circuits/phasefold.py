@@ -0,0 +1,108 @@
+"""Phase folding, to reduce the number of T gates. Through CNOT and X gates,
+every qubit holds an affine parity of some variables: initially one variable per
+qubit, and a fresh one whenever a Hadamard gate acts on it. A Z, S or T gate
+multiplies the state by a phase depending only on the parity of the qubit it
+acts on, so all the phase gates acting on the same parity, anywhere in the
+circuit, can be folded into one, placed where the parity first appears. Any
+other gate, like a Hadamard, leaves the qubits it acts on holding fresh
+variables.
+
+Phases are tracked as multiples of π/4, modulo 8. Global phases are dropped.
+"""
+
+from typing import Dict, Iterable, List, Union
+
+from .gates import (Gate, CnotGate, CzGate, NotGate, SGate, StrongMeasurementGate,
+                    SwapGate, TGate, ZGate)
+
+# The phase of each phase gate, in multiples of π/4
+PHASES = {TGate: 1, SGate: 2, ZGate: 4}
+
+
+def phase_gates(phase: int, qubit: int) -> List[Gate]:
+    """The fewest gates, with at most one T gate, applying a phase of `phase`
+    multiples of π/4"""
+    return {
+        0: [],
+        1: [TGate(qubit)],
+        2: [SGate(qubit)],
+        3: [SGate(qubit), TGate(qubit)],
+        4: [ZGate(qubit)],
+        5: [ZGate(qubit), TGate(qubit)],
+        6: [SGate(qubit, conj=True)],
+        7: [TGate(qubit, conj=True)],
+    }[phase % 8]
+
+
+class _Term:
+    """The phase folded onto one parity, and where it's to be placed"""
+    __slots__ = ('phase', 'qubit', 'negated')
+
+    def __init__(self, qubit: int, negated: bool):
+        self.phase = 0
+        self.qubit = qubit      # a qubit holding the parity, at the placement
+        self.negated = negated  # True if the qubit holds its complement there
+
+
+def phase_fold(gates: Iterable[Gate]) -> List[Gate]:
+    """Fold together the phase gates acting on each parity, in a single pass"""
+    parities: Dict[int, int] = {}   # the variables each qubit's parity is of, as a bitmask
+    constants: Dict[int, int] = {}  # 1 if a qubit holds the complement of its parity
+    variables = 0
+    terms: Dict[int, _Term] = {}
+    out: List[Union[Gate, _Term]] = []
+
+    def fresh(qubit: int) -> int:
+        nonlocal variables
+        parities[qubit] = 1 << variables
+        constants[qubit] = 0
+        variables += 1
+        return parities[qubit]
+
+    def parity(qubit: int) -> int:
+        if qubit not in parities:
+            return fresh(qubit)
+        return parities[qubit]
+
+    for gate in gates:
+        gate_type = type(gate)
+        if gate_type in PHASES:
+            qubit = gate.qubits[0]
+            mask = parity(qubit)
+            phase = -PHASES[gate_type] if gate.conj else PHASES[gate_type]
+            # On the complement of a parity, a phase is its inverse, up to a
+            # global phase.
+            if constants[qubit]:
+                phase = -phase
+            term = terms.get(mask)
+            if term is None:
+                term = terms[mask] = _Term(qubit, bool(constants[qubit]))
+                out.append(term)
+            term.phase += phase
+            continue
+        if gate_type is NotGate:
+            qubit = gate.qubits[0]
+            parity(qubit)
+            constants[qubit] ^= 1
+        elif gate_type is CnotGate:
+            control, target = gate.qubits
+            parities[target] = parity(target) ^ parity(control)
+            constants[target] ^= constants[control]
+        elif gate_type is SwapGate:
+            a, b = gate.qubits
+            parities[a], parities[b] = parity(b), parity(a)
+            constants[a], constants[b] = constants[b], constants[a]
+        elif gate_type is not StrongMeasurementGate and gate_type is not CzGate:
+            # Measurements and CZs are diagonal, and leave the parities alone.
+            for qubit in gate.qubits:
+                fresh(qubit)
+        out.append(gate)
+
+    folded = []
+    for item in out:
+        if isinstance(item, _Term):
+            phase = -item.phase if item.negated else item.phase
+            folded.extend(phase_gates(phase, item.qubit))
+        else:
+            folded.append(item)
+    return folded
@@ -0,0 +1,186 @@
+"""Native OpenQASM output. Gates are read straight from a circuit's columns and
+written out in batches, so memory use doesn't grow with the size of the
+circuit, and Cirq isn't needed.
+"""
+
+import io
+import re
+from typing import Dict, Iterator, List, TextIO
+
+from .columns import GateColumns, NO_QUBIT
+from .gates import (GATE_TYPES, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+
+QASM_VERSIONS = (2, 3)
+
+# The name of each gate type in the standard gate library, and of its conjugate
+QASM_NAMES = {
+    NotGate: ('x', 'x'),
+    ZGate: ('z', 'z'),
+    TGate: ('t', 'tdg'),
+    SGate: ('s', 'sdg'),
+    HadamardGate: ('h', 'h'),
+    CnotGate: ('cx', 'cx'),
+    SwapGate: ('swap', 'swap'),
+    CzGate: ('cz', 'cz'),
+    SqrtXGate: ('sx', 'sxdg'),
+}
+
+# Names that differ in OpenQASM 3, whose standard library has no `sxdg`
+QASM3_NAMES = {
+    SqrtXGate: ('sx', 'inv @ sx'),
+}
+
+# Lines written to the output at a time
+BATCH_SIZE = 4096
+
+# The classical register of measurements of unlabelled qubits
+UNLABELLED_REGISTER = 'm'
+
+
+def register_name(label: str) -> str:
+    """The classical register for a labelled qubit's measurements"""
+    return 'c_' + re.sub(r'\W', '_', label)
+
+
+class QasmWriter:
+
+    def __init__(self, out: TextIO, version: int = 2):
+        if version not in QASM_VERSIONS:
+            raise ValueError(f"Unsupported OpenQASM version: {version}")
+        self.out = out
+        self.version = version
+        self.lines: List[str] = []
+
+    def line(self, text: str) -> None:
+        self.lines.append(text)
+        if len(self.lines) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.lines:
+            self.lines.append('')
+            self.out.write('\n'.join(self.lines))
+            self.lines = []
+
+    def header(self, width: int, registers: List[str], unlabelled: bool) -> None:
+        if self.version == 2:
+            self.line('OPENQASM 2.0;')
+            self.line('include "qelib1.inc";')
+            self.line(f'qreg q[{width}];')
+            for register in registers:
+                self.line(f'creg {register}[1];')
+            if unlabelled:
+                self.line(f'creg {UNLABELLED_REGISTER}[{width}];')
+        else:
+            self.line('OPENQASM 3.0;')
+            self.line('include "stdgates.inc";')
+            self.line(f'qubit[{width}] q;')
+            for register in registers:
+                self.line(f'bit[1] {register};')
+            if unlabelled:
+                self.line(f'bit[{width}] {UNLABELLED_REGISTER};')
+
+    def measure(self, qubit: int, bit: str) -> None:
+        self.line(measure_line(self.version, qubit, bit))
+
+
+def measure_line(version: int, qubit: int, bit: str) -> str:
+    if version == 2:
+        return f'measure q[{qubit}] -> {bit};'
+    return f'{bit} = measure q[{qubit}];'
+
+
+def measurement_registers(qubit_labels: Dict[str, int]) -> Dict[int, str]:
+    """The bit each labelled qubit is measured into, by index"""
+    return {index: register_name(label) + '[0]' for label, index in qubit_labels.items()}
+
+
+def gate_lines(columns: GateColumns, registers: Dict[int, str], version: int = 2,
+               start: int = 0) -> Iterator[str]:
+    """The line of the program for each gate from index `start` on"""
+    measure = StrongMeasurementGate.opcode
+    overrides = QASM3_NAMES if version == 3 else {}
+    names = [overrides.get(gate_type, QASM_NAMES.get(gate_type)) for gate_type in GATE_TYPES]
+    offset = 0
+    for chunk in columns.chunks():
+        n = len(chunk)
+        if offset + n <= start:
+            offset += n
+            continue
+        opcodes, operands0, operands1 = chunk.opcodes, chunk.operands0, chunk.operands1
+        for i in range(max(start - offset, 0), n):
+            opcode, q0, q1 = opcodes[i], operands0[i], operands1[i]
+            if opcode == measure:
+                yield measure_line(version, q0,
+                                   registers.get(q0, f'{UNLABELLED_REGISTER}[{q0}]'))
+                continue
+            name = names[opcode][1 if chunk.is_conj(i) else 0]
+            if q1 == NO_QUBIT:
+                yield f'{name} q[{q0}];'
+            else:
+                yield f'{name} q[{q0}], q[{q1}];'
+        offset += n
+
+
+def has_unlabelled_measurements(columns: GateColumns, registers: Dict[int, str],
+                                start: int = 0) -> bool:
+    measure = StrongMeasurementGate.opcode
+    offset = 0
+    for chunk in columns.chunks():
+        n = len(chunk)
+        if offset + n > start:
+            opcodes, operands0 = chunk.opcodes, chunk.operands0
+            for i in range(max(start - offset, 0), n):
+                if opcodes[i] == measure and operands0[i] not in registers:
+                    return True
+        offset += n
+    return False
+
+
+def write_qasm(columns: GateColumns, qubit_labels: Dict[str, int], width: int,
+               out: TextIO, version: int = 2) -> None:
+    """Write gates as an OpenQASM program on `width` qubits. Each labelled qubit
+    is measured into a register of its own; other qubits into a shared one."""
+    writer = QasmWriter(out, version)
+    registers = measurement_registers(qubit_labels)
+    writer.header(width, sorted({register_name(label) for label in qubit_labels}),
+                  has_unlabelled_measurements(columns, registers))
+    for line in gate_lines(columns, registers, version):
+        writer.line(line)
+    writer.flush()
+
+
+class QasmBody:
+    """The gate lines of a program, kept so that they can be extended as gates
+    are added to a circuit, rather than written out again. They depend on the
+    qubit labels, so are only good for the labels they were made with."""
+
+    def __init__(self, qubit_labels: Dict[str, int], version: int = 2):
+        self.qubit_labels = dict(qubit_labels)
+        self.registers = measurement_registers(qubit_labels)
+        self.version = version
+        self.lines: List[str] = []
+        self.unlabelled = False
+        # The number of gates already written
+        self.length = 0
+
+    def extend(self, columns: GateColumns) -> None:
+        """Add the lines for the gates after the ones already written"""
+        if len(columns) == self.length:
+            return
+        if not self.unlabelled:
+            self.unlabelled = has_unlabelled_measurements(columns, self.registers, self.length)
+        self.lines.extend(gate_lines(columns, self.registers, self.version, self.length))
+        self.length = len(columns)
+
+    def program(self, width: int) -> str:
+        out = io.StringIO()
+        writer = QasmWriter(out, self.version)
+        writer.header(width, sorted({register_name(label) for label in self.qubit_labels}),
+                      self.unlabelled)
+        writer.flush()
+        if self.lines:
+            out.write('\n'.join(self.lines))
+            out.write('\n')
+        return out.getvalue()
@@ -0,0 +1,95 @@
+"""Resource estimation. The figures used to decide whether a program is worth
+simulating — width, depth, T-count, T-depth and the like — are computed in a
+single pass over the gates, without Cirq.
+
+They can also be counted as a program is interpreted, by a `CountingCircuit`
+(see `circuits.circuit`), which keeps the running figures but not the gates
+themselves: memory then grows with the number of qubits, not with the length
+of the circuit.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List
+
+from .columns import NO_QUBIT
+from .gates import (GATE_TYPES, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+from .stats import RunningStats
+
+CLIFFORD_GATES = (NotGate, ZGate, SGate, HadamardGate, CnotGate, SwapGate, CzGate,
+                  SqrtXGate)
+T_GATES = (TGate,)
+
+
+@dataclass(frozen=True)
+class ResourceEstimate:
+    """The resources a circuit needs"""
+    gates: int               # the total number of gates, measurements included
+    width: int               # the number of qubits acted on
+    depth: int               # the number of moments in an ASAP schedule
+    t_count: int             # the number of T and T-dagger gates
+    t_depth: int             # the most T gates on any path through the circuit
+    cnot_count: int
+    clifford_count: int      # the number of Clifford gates, CNOTs included
+    measurements: int
+    counts: Dict[str, int]   # gate counts, by gate type name
+
+    def __str__(self) -> str:
+        return '\n'.join([
+            f"gates:        {self.gates}",
+            f"width:        {self.width}",
+            f"depth:        {self.depth}",
+            f"T-count:      {self.t_count}",
+            f"T-depth:      {self.t_depth}",
+            f"CNOT count:   {self.cnot_count}",
+            f"Clifford:     {self.clifford_count}",
+            f"measurements: {self.measurements}",
+        ])
+
+
+class ResourceCounter(RunningStats):
+    """Running statistics, with the T-depth besides. The T-depth of a qubit is
+    the most T gates on any path to it; two-qubit gates carry it from one qubit
+    to the other, as they do the depth."""
+
+    def __init__(self):
+        super().__init__()
+        self.t_depth = 0
+        self.t_depths: List[int] = []
+
+    def copy(self) -> 'ResourceCounter':
+        new = super().copy()
+        new.t_depths = list(self.t_depths)
+        return new
+
+    def add(self, opcode: int, q0: int, q1: int = NO_QUBIT) -> None:
+        super().add(opcode, q0, q1)
+        t_depths = self.t_depths
+        if len(t_depths) < len(self.qubit_depths):
+            t_depths.extend([0] * (len(self.qubit_depths) - len(t_depths)))
+        if q1 != NO_QUBIT:
+            t_depths[q0] = t_depths[q1] = max(t_depths[q0], t_depths[q1])
+        elif opcode == TGate.opcode:
+            depth = t_depths[q0] + 1
+            t_depths[q0] = depth
+            if depth > self.t_depth:
+                self.t_depth = depth
+
+    def estimate(self) -> ResourceEstimate:
+        counts = self.opcode_counts
+
+        def count(gate_types) -> int:
+            return sum(counts[gate_type.opcode] for gate_type in gate_types)
+
+        return ResourceEstimate(
+            gates=self.gates,
+            width=self.width,
+            depth=self.depth,
+            t_count=count(T_GATES),
+            t_depth=self.t_depth,
+            cnot_count=counts[CnotGate.opcode],
+            clifford_count=count(CLIFFORD_GATES),
+            measurements=counts[StrongMeasurementGate.opcode],
+            counts={GATE_TYPES[opcode].__name__: n
+                    for opcode, n in enumerate(counts) if n},
+        )
@@ -0,0 +1,389 @@
+"""Placement and routing onto hardware with limited connectivity. A device's
+qubits are the nodes of a coupling graph, and a two-qubit gate can only act on
+neighbours, so the logical qubits of a circuit are first placed on physical
+ones, and then SWAPs are inserted to bring the qubits of each gate together.
+
+The router follows SABRE (Li, Ding and Xie, 2019). It keeps a front layer of
+the gates whose predecessors are done, applies all of them it can, and when it
+is stuck, makes the SWAP that most reduces the distance between the qubits of
+the front layer and of the next few gates after it. Placement repeatedly
+routes the circuit forwards and backwards, starting each pass from the layout
+the last one ended in, so that qubits settle where they're needed.
+"""
+
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from errors import CavyRuntimeError
+from .columns import GateColumns, NO_QUBIT
+from .gates import GATE_TYPES, StrongMeasurementGate, SwapGate
+from .stats import RunningStats
+
+# The number of upcoming two-qubit gates the router looks ahead to, and their
+# weight relative to the front layer
+EXTENDED_SET_SIZE = 20
+EXTENDED_SET_WEIGHT = 0.5
+# How much each SWAP on a qubit counts against swapping it again, so that the
+# router prefers SWAPs that can run in parallel
+DECAY_INCREMENT = 0.001
+# Forward and backward passes made by placement
+DEFAULT_ITERATIONS = 3
+
+Layout = Dict[int, int]  # the physical qubit of each logical qubit
+
+
+class RoutingError(CavyRuntimeError):
+    """Raised when a circuit can't be routed onto a device."""
+    def __str__(self):
+        return f"Routing error: {self.args[0]}"
+
+
+class CouplingGraph:
+    """The qubits of a device, numbered from zero, and the pairs of them that
+    two-qubit gates can act on. The graph must be connected."""
+
+    def __init__(self, size: int, edges: Iterable[Tuple[int, int]]):
+        self.size = size
+        self.neighbours: List[List[int]] = [[] for _ in range(size)]
+        for a, b in edges:
+            if a == b or not (0 <= a < size and 0 <= b < size):
+                raise RoutingError(f"invalid coupling {a}-{b}")
+            if b not in self.neighbours[a]:
+                self.neighbours[a].append(b)
+                self.neighbours[b].append(a)
+        for neighbours in self.neighbours:
+            neighbours.sort()
+        self.distances = [self._distances_from(p) for p in range(size)]
+        if size and any(d < 0 for d in self.distances[0]):
+            raise RoutingError("coupling graph is not connected")
+
+    @classmethod
+    def line(cls, size: int) -> 'CouplingGraph':
+        return cls(size, ((p, p + 1) for p in range(size - 1)))
+
+    @classmethod
+    def ring(cls, size: int) -> 'CouplingGraph':
+        return cls(size, ((p, (p + 1) % size) for p in range(size)))
+
+    @classmethod
+    def grid(cls, rows: int, columns: int) -> 'CouplingGraph':
+        """A grid, with the qubit in row r and column c numbered r * columns + c"""
+        edges = []
+        for r in range(rows):
+            for c in range(columns):
+                p = r * columns + c
+                if c + 1 < columns:
+                    edges.append((p, p + 1))
+                if r + 1 < rows:
+                    edges.append((p, p + columns))
+        return cls(rows * columns, edges)
+
+    def _distances_from(self, source: int) -> List[int]:
+        distances = [-1] * self.size
+        distances[source] = 0
+        queue = deque([source])
+        while queue:
+            p = queue.popleft()
+            for q in self.neighbours[p]:
+                if distances[q] < 0:
+                    distances[q] = distances[p] + 1
+                    queue.append(q)
+        return distances
+
+    def path(self, a: int, b: int) -> List[int]:
+        """A shortest path from `a` to `b`, inclusive"""
+        path = [a]
+        to_b = self.distances[b]
+        while path[-1] != b:
+            path.append(min(self.neighbours[path[-1]], key=to_b.__getitem__))
+        return path
+
+
+@dataclass
+class Routing:
+    """A circuit routed onto a device, with what it cost"""
+    columns: GateColumns   # the routed gates, on physical qubits
+    initial_layout: Layout
+    final_layout: Layout
+    measured: Layout       # where each logical qubit was last measured
+    swaps: int
+    depth_before: int
+    depth_after: int       # counting each SWAP as a single gate
+
+    @property
+    def added_depth(self) -> int:
+        return self.depth_after - self.depth_before
+
+    def report(self) -> str:
+        return (f"{self.swaps} SWAPs; depth {self.depth_before} -> "
+                f"{self.depth_after} (+{self.added_depth})")
+
+
+def _reversed(columns: GateColumns) -> GateColumns:
+    """The gates in reverse order. Only their qubits matter to placement."""
+    backwards = GateColumns()
+    backwards.opcodes = array('B', reversed(columns.opcodes))
+    backwards.operands0 = array('i', reversed(columns.operands0))
+    backwards.operands1 = array('i', reversed(columns.operands1))
+    backwards.conj = bytearray((len(columns) + 7) >> 3)
+    return backwards
+
+
+def _logical_qubits(columns: GateColumns) -> List[int]:
+    qubits = set(columns.operands0)
+    qubits.update(columns.operands1)
+    qubits.discard(NO_QUBIT)
+    return sorted(qubits)
+
+
+class _Router:
+    """One pass of routing, from a layout. Unless `emit`, only the SWAPs and
+    the final layout are worked out, not the routed gates."""
+
+    def __init__(self, columns: GateColumns, graph: CouplingGraph, layout: Layout,
+                 emit: bool = True):
+        self.columns = columns
+        self.graph = graph
+        self.layout = dict(layout)
+        self.occupant = [-1] * graph.size  # the logical qubit on each physical one
+        for q, p in self.layout.items():
+            self.occupant[p] = q
+        self.out = GateColumns(locations=columns.has_locations) if emit else None
+        self.measured: Layout = {}
+        self.swaps = 0
+        self.decay = [1.0] * graph.size
+        # The gates waiting on each logical qubit, in order
+        self.queues: Dict[int, deque] = {}
+        operands1 = columns.operands1
+        for i, q0 in enumerate(columns.operands0):
+            self.queues.setdefault(q0, deque()).append(i)
+            if operands1[i] != NO_QUBIT:
+                self.queues.setdefault(operands1[i], deque()).append(i)
+
+    def ready(self, i: int) -> bool:
+        q1 = self.columns.operands1[i]
+        return (self.queues[self.columns.operands0[i]][0] == i
+                and (q1 == NO_QUBIT or self.queues[q1][0] == i))
+
+    def executable(self, i: int) -> bool:
+        q1 = self.columns.operands1[i]
+        if q1 == NO_QUBIT:
+            return True
+        layout = self.layout
+        return self.graph.distances[layout[self.columns.operands0[i]]][layout[q1]] == 1
+
+    def execute(self, i: int, front: Set[int]) -> None:
+        columns, layout = self.columns, self.layout
+        q0, q1 = columns.operands0[i], columns.operands1[i]
+        if self.out is not None:
+            operands = [layout[q0]] if q1 == NO_QUBIT else [layout[q0], layout[q1]]
+            gate = GATE_TYPES[columns.opcodes[i]](*operands, conj=columns.is_conj(i))
+            location = -1 if columns.locations is None else columns.locations[i]
+            self.out.append(gate, location)
+        if columns.opcodes[i] == StrongMeasurementGate.opcode:
+            self.measured[q0] = layout[q0]
+        for q in (q0, q1):
+            if q == NO_QUBIT:
+                continue
+            queue = self.queues[q]
+            queue.popleft()
+            if queue and self.ready(queue[0]):
+                front.add(queue[0])
+
+    def swap(self, a: int, b: int) -> None:
+        occupant, layout = self.occupant, self.layout
+        qa, qb = occupant[a], occupant[b]
+        occupant[a], occupant[b] = qb, qa
+        if qa >= 0:
+            layout[qa] = b
+        if qb >= 0:
+            layout[qb] = a
+        if self.out is not None:
+            self.out.append(SwapGate(a, b))
+        self.decay[a] += DECAY_INCREMENT
+        self.decay[b] += DECAY_INCREMENT
+        self.swaps += 1
+
+    def extended_set(self, front: List[int]) -> List[Tuple[int, int]]:
+        """The qubits of some of the two-qubit gates soon after the front"""
+        operands0, operands1 = self.columns.operands0, self.columns.operands1
+        extended = []
+        seen = set(front)
+        for i in front:
+            for q in (operands0[i], operands1[i]):
+                for j in self.queues[q]:
+                    if len(extended) >= EXTENDED_SET_SIZE:
+                        return extended
+                    if j not in seen and operands1[j] != NO_QUBIT:
+                        seen.add(j)
+                        extended.append((operands0[j], operands1[j]))
+        return extended
+
+    def best_swap(self, front: List[int]) -> Tuple[int, int]:
+        operands0, operands1 = self.columns.operands0, self.columns.operands1
+        layout, distances, decay = self.layout, self.graph.distances, self.decay
+        front_pairs = [(layout[operands0[i]], layout[operands1[i]]) for i in front]
+        extended_pairs = [(layout[q0], layout[q1]) for q0, q1 in self.extended_set(front)]
+        candidates = set()
+        for pair in front_pairs:
+            for p in pair:
+                for neighbour in self.graph.neighbours[p]:
+                    candidates.add((min(p, neighbour), max(p, neighbour)))
+
+        def on_qubits(pairs) -> Dict[int, list]:
+            """The pairs involving each physical qubit"""
+            touching: Dict[int, list] = {}
+            for pair in pairs:
+                touching.setdefault(pair[0], []).append(pair)
+                touching.setdefault(pair[1], []).append(pair)
+            return touching
+
+        front_total = sum(distances[p0][p1] for p0, p1 in front_pairs)
+        extended_total = sum(distances[p0][p1] for p0, p1 in extended_pairs)
+        front_touching, extended_touching = on_qubits(front_pairs), on_qubits(extended_pairs)
+
+        def change(touching, a, b) -> int:
+            """The change in total distance made by swapping `a` and `b`. Only
+            the pairs on `a` or `b` move; a pair on both keeps its distance,
+            however often it's counted."""
+            total = 0
+            for p0, p1 in touching.get(a, []) + touching.get(b, []):
+                n0 = b if p0 == a else a if p0 == b else p0
+                n1 = b if p1 == a else a if p1 == b else p1
+                total += distances[n0][n1] - distances[p0][p1]
+            return total
+
+        def score(swap) -> float:
+            a, b = swap
+            total = (front_total + change(front_touching, a, b)) / len(front_pairs)
+            if extended_pairs:
+                total += EXTENDED_SET_WEIGHT * (
+                    (extended_total + change(extended_touching, a, b)) / len(extended_pairs))
+            return max(decay[a], decay[b]) * total
+
+        return min(sorted(candidates), key=score)
+
+    def run(self) -> None:
+        columns = self.columns
+        front = {queue[0] for queue in self.queues.values() if self.ready(queue[0])}
+        # SWAPs made since a gate was last executed. The heuristic can, rarely,
+        # go round in circles; past a limit, the first gate of the front is
+        # routed along a shortest path instead.
+        stalled = 0
+        limit = 10 * self.graph.size
+        while front:
+            executable = sorted(i for i in front if self.executable(i))
+            if executable:
+                for i in executable:
+                    front.discard(i)
+                    self.execute(i, front)
+                self.decay = [1.0] * self.graph.size
+                stalled = 0
+                continue
+            blocked = sorted(front)
+            if stalled < limit:
+                self.swap(*self.best_swap(blocked))
+                stalled += 1
+            else:
+                i = blocked[0]
+                path = self.graph.path(self.layout[columns.operands0[i]],
+                                       self.layout[columns.operands1[i]])
+                for a, b in zip(path, path[1:-1]):
+                    self.swap(a, b)
+
+
+def _check_fits(qubits: List[int], graph: CouplingGraph) -> None:
+    if len(qubits) > graph.size:
+        raise RoutingError(f"the circuit uses {len(qubits)} qubits, but the "
+                           f"device has only {graph.size}")
+
+
+def greedy_layout(columns: GateColumns, graph: CouplingGraph) -> Layout:
+    """Grow a layout outwards from the qubit that interacts most. Next to be
+    placed is always the qubit with the most interactions with those already
+    placed, and it goes on the free physical qubit nearest to them, weighted
+    by interactions; ties go to the qubit with fewest free neighbours, so that
+    chains of interactions keep to the edges, leaving room in the middle.
+    Qubits that interact with none placed start again from an edge."""
+    qubits = _logical_qubits(columns)
+    _check_fits(qubits, graph)
+    weights: Dict[int, Dict[int, int]] = {q: {} for q in qubits}
+    for q0, q1 in zip(columns.operands0, columns.operands1):
+        if q1 != NO_QUBIT:
+            weights[q0][q1] = weights[q0].get(q1, 0) + 1
+            weights[q1][q0] = weights[q1].get(q0, 0) + 1
+    totals = {q: sum(weights[q].values()) for q in qubits}
+    # The interactions of each unplaced qubit with the placed ones
+    attraction = {q: 0 for q in qubits}
+    distances, neighbours = graph.distances, graph.neighbours
+    free = set(range(graph.size))
+    layout: Layout = {}
+    while attraction:
+        q = max(sorted(attraction), key=lambda q: (attraction[q], totals[q]))
+        del attraction[q]
+        placed = [(layout[other], weight) for other, weight in weights[q].items()
+                  if other in layout]
+        if placed:
+            def cost(p: int):
+                return (sum(weight * distances[p][other] for other, weight in placed),
+                        sum(n in free for n in neighbours[p]))
+        else:
+            def cost(p: int):
+                return len(neighbours[p])
+        p = min(sorted(free), key=cost)
+        layout[q] = p
+        free.remove(p)
+        for other, weight in weights[q].items():
+            if other in attraction:
+                attraction[other] += weight
+    return layout
+
+
+def place(columns: GateColumns, graph: CouplingGraph,
+          iterations: int = DEFAULT_ITERATIONS) -> Layout:
+    """Choose an initial layout, refining a greedy one by routing the circuit
+    back and forth. The layout needing the fewest SWAPs is kept."""
+    columns = columns.in_memory()
+    layout = greedy_layout(columns, graph)
+    backwards = _reversed(columns)
+    best, best_swaps = layout, None
+    for _ in range(iterations + 1):
+        forward = _Router(columns, graph, layout, emit=False)
+        forward.run()
+        if best_swaps is None or forward.swaps < best_swaps:
+            best, best_swaps = layout, forward.swaps
+        backward = _Router(backwards, graph, forward.layout, emit=False)
+        backward.run()
+        layout = backward.layout
+    return best
+
+
+def route(columns: GateColumns, graph: CouplingGraph, layout: Optional[Layout] = None,
+          iterations: int = DEFAULT_ITERATIONS) -> Routing:
+    """Route gates onto a device, from a layout, or from one chosen by `place`"""
+    columns = columns.in_memory()
+    if layout is None:
+        layout = place(columns, graph, iterations)
+    else:
+        qubits = _logical_qubits(columns)
+        _check_fits(qubits, graph)
+        missing = [q for q in qubits if q not in layout]
+        if missing:
+            raise RoutingError(f"qubits {missing} have no place in the layout")
+        if len(set(layout.values())) != len(layout):
+            raise RoutingError("the layout places two qubits together")
+        if any(not 0 <= p < graph.size for p in layout.values()):
+            raise RoutingError("the layout uses qubits the device doesn't have")
+    router = _Router(columns, graph, layout)
+    router.run()
+    return Routing(
+        columns=router.out,
+        initial_layout=dict(layout),
+        final_layout=router.layout,
+        measured=router.measured,
+        swaps=router.swaps,
+        depth_before=RunningStats.from_columns(columns).depth,
+        depth_after=RunningStats.from_columns(router.out).depth,
+    )
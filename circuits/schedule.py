@@ -0,0 +1,91 @@
+"""Scheduling of gates into moments: layers of gates acting on disjoint qubits,
+which can be applied in parallel. Each gate is placed in a single pass, by
+keeping a frontier of the next free moment on each qubit.
+"""
+
+from array import array
+from dataclasses import dataclass
+from enum import Enum
+from typing import List
+
+from .columns import GateColumns, NO_QUBIT
+
+
+class Policy(Enum):
+    ASAP = 'asap'  # every gate as early as possible
+    ALAP = 'alap'  # every gate as late as possible
+
+
+@dataclass
+class Schedule:
+    """An assignment of the gates of a circuit to moments"""
+    policy: Policy
+    moments: array        # the moment of each gate, by gate index
+    depth: int            # the number of moments
+    critical_path: List[int]  # the indices of the gates on a longest path
+
+    def layers(self) -> List[List[int]]:
+        """The indices of the gates in each moment, in circuit order"""
+        layers = [[] for _ in range(self.depth)]
+        for i, moment in enumerate(self.moments):
+            layers[moment].append(i)
+        return layers
+
+
+def _asap(columns: GateColumns, reverse: bool = False):
+    """Place each gate in the earliest moment after all the gates before it on
+    its qubits; or, if `reverse`, treat the circuit back to front. Also returns,
+    for each gate, the index of a gate it must follow that lies on a longest path
+    to it, or -1."""
+    columns = columns.in_memory()
+    n = len(columns)
+    operands0, operands1 = columns.operands0, columns.operands1
+    moments = array('i', bytes(4 * n))
+    preds = array('i', bytes(4 * n))
+    frontier = {}  # the next free moment on each qubit
+    last = {}      # the last gate placed on each qubit
+    depth = 0
+    for i in (range(n - 1, -1, -1) if reverse else range(n)):
+        q0, q1 = operands0[i], operands1[i]
+        moment = frontier.get(q0, 0)
+        pred = last.get(q0, -1)
+        if q1 != NO_QUBIT:
+            moment1 = frontier.get(q1, 0)
+            if moment1 > moment:
+                moment, pred = moment1, last[q1]
+            frontier[q1] = moment + 1
+            last[q1] = i
+        frontier[q0] = moment + 1
+        last[q0] = i
+        moments[i] = moment
+        preds[i] = pred
+        if moment >= depth:
+            depth = moment + 1
+    return moments, preds, depth
+
+
+def _longest_path(moments: array, preds: array, depth: int) -> List[int]:
+    if depth == 0:
+        return []
+    i = max(range(len(moments)), key=moments.__getitem__)
+    path = []
+    while i != -1:
+        path.append(i)
+        i = preds[i]
+    return path
+
+
+def schedule(columns: GateColumns, policy: Policy = Policy.ASAP) -> Schedule:
+    """Schedule the gates in some columns, in time linear in their number"""
+    policy = Policy(policy)
+    if policy is Policy.ASAP:
+        moments, preds, depth = _asap(columns)
+        critical_path = _longest_path(moments, preds, depth)
+        critical_path.reverse()
+    else:
+        # As late as possible is as soon as possible, backwards.
+        moments, preds, depth = _asap(columns, reverse=True)
+        critical_path = _longest_path(moments, preds, depth)
+        for i, moment in enumerate(moments):
+            moments[i] = depth - 1 - moment
+    return Schedule(policy, moments, depth, critical_path)
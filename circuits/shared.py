@@ -0,0 +1,252 @@
+"""Shared-memory transport of circuits and state vectors between processes. A
+circuit is published once, in the `.cvyc` layout, into a named block of shared
+memory; workers attach to the block by name and use its columns in place, as
+they would a memory-mapped file. State vectors are NumPy arrays over blocks of
+their own. Only the small handles, `SharedCircuit` and `SharedArray`, are
+pickled and sent between processes.
+
+Each process counts its references to each block it has attached, and maps a
+block only once however often it's attached. A block belongs to one process,
+its owner: normally the one that published it. When the owner's count falls
+to zero, the block is unlinked; other processes only ever close their mappings.
+A worker can hand a block it published to the process it reports to, which
+`adopt`s it.
+
+Views of a block, like an attached circuit or array, must be dropped before the
+reference they came from is released. A mapping that still has views when it's
+released is closed once they're gone.
+"""
+
+from dataclasses import dataclass
+import inspect
+from multiprocessing import shared_memory
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from errors import CavyRuntimeError
+import dependencies as deps
+from .binary import circuit_nbytes, read_circuit, write_circuit
+from .circuit import Circuit
+
+if os.name == 'posix':
+    from multiprocessing import resource_tracker
+else:
+    resource_tracker = None
+
+# Before Python 3.13, every process that opens a block registers it with the
+# resource tracker, which unlinks it when that process exits.
+_HAS_TRACK_OPTION = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+_TRACKED_TYPE = 'shared_memory'
+
+
+class SharedMemoryError(CavyRuntimeError):
+    """Raised when a block of shared memory can't be found, or is released more
+    often than it was attached."""
+    def __str__(self):
+        return f"Shared memory error: {self.args[0]}"
+
+
+class _Block:
+    """A block of shared memory mapped into this process, and the number of
+    references to it here"""
+    __slots__ = ('memory', 'owner', 'refs')
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+        self.refs = 0
+
+
+_BLOCKS: Dict[str, _Block] = {}
+# Released mappings that still had views, to be closed once they're gone
+_LINGERING: List[shared_memory.SharedMemory] = []
+_LOCK = threading.Lock()
+
+
+def _after_fork() -> None:
+    # A forked child shares its parent's mappings, but not its ownership of them
+    global _LOCK
+    _LOCK = threading.Lock()
+    for block in _BLOCKS.values():
+        block.owner = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _untrack(memory: shared_memory.SharedMemory) -> None:
+    """Stop the resource tracker from unlinking a block when this process exits"""
+    if resource_tracker is not None:
+        resource_tracker.unregister(memory._name, _TRACKED_TYPE)
+
+
+def _open(name: str, owner: bool) -> shared_memory.SharedMemory:
+    try:
+        if _HAS_TRACK_OPTION:
+            return shared_memory.SharedMemory(name, track=owner)
+        memory = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        raise SharedMemoryError(f"no block named '{name}'") from None
+    if not owner:
+        _untrack(memory)
+    return memory
+
+
+def _create(nbytes: int) -> _Block:
+    memory = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    block = _Block(memory, owner=True)
+    block.refs = 1
+    with _LOCK:
+        _BLOCKS[memory.name] = block
+    return block
+
+
+def _attach(name: str, owner: bool = False) -> _Block:
+    with _LOCK:
+        block = _BLOCKS.get(name)
+        if block is None:
+            block = _BLOCKS[name] = _Block(_open(name, owner), owner)
+        elif owner and not block.owner:
+            raise SharedMemoryError(f"'{name}' is already attached without ownership")
+        block.refs += 1
+        return block
+
+
+def _close(memory: shared_memory.SharedMemory) -> bool:
+    try:
+        memory.close()
+        return True
+    except BufferError:
+        return False
+
+
+def _release(name: str) -> None:
+    with _LOCK:
+        block = _BLOCKS.get(name)
+        if block is None:
+            raise SharedMemoryError(f"'{name}' isn't attached in this process")
+        block.refs -= 1
+        if block.refs > 0:
+            return
+        del _BLOCKS[name]
+        if block.owner:
+            if resource_tracker is not None:
+                # Attaching processes that share our resource tracker may have
+                # unregistered the block; register it again so that unlinking
+                # leaves the tracker's books balanced.
+                resource_tracker.register(block.memory._name, _TRACKED_TYPE)
+            block.memory.unlink()
+        _LINGERING.append(block.memory)
+        _LINGERING[:] = [memory for memory in _LINGERING if not _close(memory)]
+
+
+def references() -> Dict[str, int]:
+    """The number of references to each block attached in this process"""
+    with _LOCK:
+        return {name: block.refs for name, block in _BLOCKS.items()}
+
+
+class _BufferWriter:
+    """A file-like object writing into a buffer"""
+
+    def __init__(self, buffer: memoryview):
+        self.buffer = buffer
+        self.position = 0
+
+    def write(self, data) -> None:
+        data = memoryview(data).cast('B')
+        end = self.position + len(data)
+        self.buffer[self.position:end] = data
+        self.position = end
+
+
+@dataclass(frozen=True)
+class SharedCircuit:
+    """A circuit published in shared memory, by the name of its block"""
+    name: str
+    nbytes: int
+
+    def attach(self) -> Circuit:
+        """The circuit, reading its gates from shared memory. The first gate
+        added to it copies them into this process's memory."""
+        block = _attach(self.name)
+        circuit = Circuit()
+        circuit.columns, circuit.qubit_labels = read_circuit(block.memory.buf, block)
+        circuit.running = None
+        return circuit
+
+    def release(self) -> None:
+        _release(self.name)
+
+
+def publish_circuit(circuit: Circuit) -> SharedCircuit:
+    """Copy a circuit into a new block of shared memory, owned by this process
+    and holding one reference, to be released when workers are done with it"""
+    nbytes = circuit_nbytes(circuit.columns, circuit.qubit_labels)
+    block = _create(nbytes)
+    write_circuit(_BufferWriter(block.memory.buf), circuit.columns, circuit.qubit_labels)
+    return SharedCircuit(block.memory.name, nbytes)
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """A NumPy array in shared memory, by the name of its block"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @deps.require('numpy')
+    def attach(self) -> 'numpy.ndarray':
+        """The array, as a view of shared memory. Writes to it are seen by
+        every process attached to it."""
+        return self._view(_attach(self.name))
+
+    @deps.require('numpy')
+    def adopt(self) -> 'numpy.ndarray':
+        """Attach to an array handed over with `publish_array(transfer=True)`,
+        taking ownership of its block"""
+        return self._view(_attach(self.name, owner=True))
+
+    def _view(self, block: _Block) -> 'numpy.ndarray':
+        # Unlike an array made with `buffer=`, one from `frombuffer` holds on to
+        # the mapping, so that it can't be closed from under the array.
+        np = deps.numpy
+        count = int(np.prod(self.shape, dtype=np.int64))
+        return np.frombuffer(block.memory.buf, self.dtype, count).reshape(self.shape)
+
+    def release(self) -> None:
+        _release(self.name)
+
+
+@deps.require('numpy')
+def shared_array(shape: Tuple[int, ...], dtype: str = 'complex128'
+                 ) -> Tuple[SharedArray, 'numpy.ndarray']:
+    """A new array of zeros in shared memory, owned by this process, and a view
+    of it. Workers can attach to it and write their results there directly."""
+    np = deps.numpy
+    shape = tuple(shape)
+    dtype = np.dtype(dtype).str
+    nbytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+    block = _create(nbytes)
+    handle = SharedArray(block.memory.name, shape, dtype)
+    view = handle._view(block)
+    view.fill(0)
+    return handle, view
+
+
+@deps.require('numpy')
+def publish_array(array: 'numpy.ndarray', transfer: bool = False) -> SharedArray:
+    """Copy an array, like a state vector, into a new block of shared memory.
+    The block is owned by this process and holds one reference; or, with
+    `transfer`, it's left for the process the handle is sent to to `adopt`."""
+    handle, view = shared_array(array.shape, array.dtype)
+    view[...] = array
+    if transfer:
+        del view
+        with _LOCK:
+            block = _BLOCKS.pop(handle.name)
+        _untrack(block.memory)
+        block.memory.close()
+    return handle
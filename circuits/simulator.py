@@ -0,0 +1,124 @@
+"""A small state-vector simulator in pure Python, for checking that circuit
+transformations preserve meaning. It's exponential in the number of qubits, so
+it's only for small circuits. Measurements are skipped: the simulator computes
+the unitary part of a circuit.
+"""
+
+import cmath
+import math
+import random
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from .gates import (Gate, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+
+State = List[complex]
+
+_SQRT_HALF = math.sqrt(0.5)
+
+
+def _apply_single(state: State, bit: int, matrix) -> None:
+    (a, b), (c, d) = matrix
+    mask = 1 << bit
+    for i in range(len(state)):
+        if not i & mask:
+            x, y = state[i], state[i | mask]
+            state[i] = a * x + b * y
+            state[i | mask] = c * x + d * y
+
+
+def _apply_phase(state: State, bit: int, phase: complex) -> None:
+    mask = 1 << bit
+    for i in range(len(state)):
+        if i & mask:
+            state[i] *= phase
+
+
+def _apply_cnot(state: State, control: int, target: int) -> None:
+    cmask, tmask = 1 << control, 1 << target
+    for i in range(len(state)):
+        if i & cmask and not i & tmask:
+            state[i], state[i | tmask] = state[i | tmask], state[i]
+
+
+def _apply_swap(state: State, a: int, b: int) -> None:
+    amask, bmask = 1 << a, 1 << b
+    for i in range(len(state)):
+        if i & amask and not i & bmask:
+            j = i ^ amask ^ bmask
+            state[i], state[j] = state[j], state[i]
+
+
+def _apply_cz(state: State, a: int, b: int) -> None:
+    mask = 1 << a | 1 << b
+    for i in range(len(state)):
+        if i & mask == mask:
+            state[i] = -state[i]
+
+
+def _sqrt_x(gate: Gate):
+    p, m = (1 + 1j) / 2, (1 - 1j) / 2
+    if gate.conj:
+        p, m = m, p
+    return ((p, m), (m, p))
+
+
+def _phase(fraction: float) -> Callable[[Gate], complex]:
+    """A phase of `fraction` of a turn, inverted on conjugated gates"""
+    def phase(gate: Gate) -> complex:
+        sign = -1 if gate.conj else 1
+        return cmath.exp(2j * math.pi * fraction * sign)
+    return phase
+
+
+# How to apply each gate type to a state, given the bit of each of its qubits
+APPLY: Dict[type, Callable[[State, Gate, Sequence[int]], None]] = {
+    NotGate: lambda state, gate, bits: _apply_single(state, bits[0], ((0, 1), (1, 0))),
+    HadamardGate: lambda state, gate, bits: _apply_single(
+        state, bits[0], ((_SQRT_HALF, _SQRT_HALF), (_SQRT_HALF, -_SQRT_HALF))),
+    ZGate: lambda state, gate, bits: _apply_phase(state, bits[0], -1),
+    SGate: lambda state, gate, bits: _apply_phase(state, bits[0], _phase(1 / 4)(gate)),
+    TGate: lambda state, gate, bits: _apply_phase(state, bits[0], _phase(1 / 8)(gate)),
+    CnotGate: lambda state, gate, bits: _apply_cnot(state, bits[0], bits[1]),
+    SwapGate: lambda state, gate, bits: _apply_swap(state, bits[0], bits[1]),
+    CzGate: lambda state, gate, bits: _apply_cz(state, bits[0], bits[1]),
+    SqrtXGate: lambda state, gate, bits: _apply_single(state, bits[0], _sqrt_x(gate)),
+    StrongMeasurementGate: lambda state, gate, bits: None,
+}
+
+
+def simulate(gates: Iterable[Gate], qubits: Dict[int, int], state: State) -> State:
+    """Apply gates to a state, in place. `qubits` gives the bit of the state
+    index that stands for each qubit."""
+    for gate in gates:
+        APPLY[type(gate)](state, gate, [qubits[q] for q in gate.qubits])
+    return state
+
+
+def random_state(width: int, rng: random.Random) -> State:
+    state = [complex(rng.gauss(0, 1), rng.gauss(0, 1)) for _ in range(1 << width)]
+    norm = math.sqrt(sum(abs(x) ** 2 for x in state))
+    return [x / norm for x in state]
+
+
+def equivalent(first: Sequence[Gate], second: Sequence[Gate], trials: int = 3,
+               tolerance: float = 1e-7, seed: Optional[int] = 0) -> bool:
+    """True if two gate sequences act the same on a few random states, up to a
+    global phase. Qubits used by only one of them are included in both."""
+    qubits = sorted({q for gate in first for q in gate.qubits} |
+                    {q for gate in second for q in gate.qubits})
+    bits = {q: i for i, q in enumerate(qubits)}
+    rng = random.Random(seed)
+    global_phase = None
+    for _ in range(trials):
+        state = random_state(len(qubits), rng)
+        out1 = simulate(first, bits, list(state))
+        out2 = simulate(second, bits, list(state))
+        if global_phase is None:
+            overlap = sum(a.conjugate() * b for a, b in zip(out1, out2))
+            if abs(overlap) < tolerance:
+                return False
+            global_phase = overlap / abs(overlap)
+        if any(abs(a * global_phase - b) > tolerance for a, b in zip(out1, out2)):
+            return False
+    return True
@@ -0,0 +1,206 @@
+"""Gate columns that spill to disk. Gates are buffered in memory, and each full
+buffer is appended to a log file as one block, so that a circuit can grow far
+beyond the memory available. The log is read back block by block.
+
+A block is a header of a magic number, the number of gates and a flags word,
+then the opcode, operand, conjugation and (optional) source map columns, each
+padded to 8 bytes, in the layout of `GateColumns`.
+"""
+
+from array import array
+from bisect import bisect_right
+import os
+import struct
+import sys
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+import weakref
+
+from .columns import GateColumns
+from .gates import Gate
+
+BLOCK_MAGIC = b'CVYB'
+BLOCK_HEADER = struct.Struct('<4sII')
+FLAG_LOCATIONS = 1
+ALIGNMENT = 8
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _padding(size: int) -> bytes:
+    return bytes(-size % ALIGNMENT)
+
+
+def _encode(column: array) -> bytes:
+    if not _LITTLE_ENDIAN and column.itemsize > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _decode(typecode: str, data: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if not _LITTLE_ENDIAN and column.itemsize > 1:
+        column.byteswap()
+    return column
+
+
+class SpillingColumns:
+    """An append-only store of gates, with the same interface as `GateColumns`,
+    that keeps at most `chunk_size` gates in memory. The rest are in a log file
+    at `path`; if no path is given, a temporary file is used, and deleted when
+    the columns are.
+
+    Reading a single gate reads its whole block, and the last block read is
+    kept; sequential reads should use `chunks` or iteration."""
+
+    def __init__(self, path: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 locations: bool = False):
+        # A multiple of 8, so that blocks' conjugation bitmasks line up
+        self.chunk_size = max(8, chunk_size - chunk_size % 8)
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.cvylog')
+            self.file = os.fdopen(fd, 'w+b')
+            self._finalizer = weakref.finalize(self, _remove, self.file, path)
+        else:
+            self.file = open(path, 'w+b')
+            self._finalizer = weakref.finalize(self, self.file.close)
+        self.path = path
+        self.tail = GateColumns(locations=locations)
+        # The file offset and first gate index of each block
+        self.offsets: List[int] = []
+        self.starts: List[int] = []
+        self.spilled = 0
+        self._cached: Tuple[int, Optional[GateColumns]] = (-1, None)
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.tail)
+
+    @property
+    def has_locations(self) -> bool:
+        return self.tail.has_locations
+
+    @property
+    def blocks(self) -> int:
+        return len(self.offsets)
+
+    def append(self, gate: Gate, location: int = -1) -> None:
+        self.tail.append(gate, location)
+        if len(self.tail) >= self.chunk_size:
+            self.spill()
+
+    def extend(self, gates: Iterable[Gate], location: int = -1) -> None:
+        for gate in gates:
+            self.append(gate, location)
+
+    def spill(self) -> None:
+        """Write the buffered gates to the log as a block"""
+        tail = self.tail
+        if not len(tail):
+            return
+        n = len(tail)
+        parts = [BLOCK_HEADER.pack(BLOCK_MAGIC, n,
+                                   FLAG_LOCATIONS if tail.has_locations else 0)]
+        columns = [tail.opcodes, tail.operands0, tail.operands1]
+        if tail.has_locations:
+            columns.append(tail.locations)
+        data = [_encode(column) for column in columns]
+        data.insert(3, bytes(tail.conj))
+        for section in data:
+            parts.append(section)
+            parts.append(_padding(len(section)))
+        self.file.seek(0, os.SEEK_END)
+        self.offsets.append(self.file.tell())
+        self.starts.append(self.spilled)
+        self.file.write(b''.join(parts))
+        self.file.flush()
+        self.spilled += n
+        self.tail = GateColumns(locations=tail.has_locations)
+
+    def read_block(self, block: int) -> GateColumns:
+        cached_block, cached = self._cached
+        if cached_block == block:
+            return cached
+        self.file.seek(self.offsets[block])
+        magic, n, flags = BLOCK_HEADER.unpack(self.file.read(BLOCK_HEADER.size))
+        assert magic == BLOCK_MAGIC, "corrupt gate log"
+        columns = GateColumns(locations=bool(flags & FLAG_LOCATIONS))
+
+        def section(typecode: str, size: int) -> array:
+            data = self.file.read(size + (-size % ALIGNMENT))[:size]
+            return _decode(typecode, data)
+
+        columns.opcodes = section('B', n)
+        columns.operands0 = section('i', 4 * n)
+        columns.operands1 = section('i', 4 * n)
+        conj_size = (n + 7) >> 3
+        columns.conj = bytearray(self.file.read(conj_size + (-conj_size % ALIGNMENT))[:conj_size])
+        if flags & FLAG_LOCATIONS:
+            columns.locations = section('i', 4 * n)
+        self._cached = (block, columns)
+        return columns
+
+    def chunks(self) -> Iterator[GateColumns]:
+        for block in range(len(self.offsets)):
+            yield self.read_block(block)
+        if len(self.tail):
+            yield self.tail
+
+    def __iter__(self) -> Iterator[Gate]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def _locate(self, i: int) -> Tuple[GateColumns, int]:
+        if i >= self.spilled:
+            return self.tail, i - self.spilled
+        block = bisect_right(self.starts, i) - 1
+        return self.read_block(block), i - self.starts[block]
+
+    def gate(self, i: int) -> Gate:
+        chunk, j = self._locate(i)
+        return chunk.gate(j)
+
+    def is_conj(self, i: int) -> bool:
+        chunk, j = self._locate(i)
+        return chunk.is_conj(j)
+
+    def copy(self, length: Optional[int] = None) -> GateColumns:
+        """The first `length` gates (by default, all of them), in memory"""
+        if length is None:
+            length = len(self)
+        new = GateColumns(locations=self.has_locations)
+        for chunk in self.chunks():
+            if len(new) + len(chunk) > length:
+                chunk = chunk.copy(length - len(new))
+            new.opcodes.extend(chunk.opcodes)
+            new.operands0.extend(chunk.operands0)
+            new.operands1.extend(chunk.operands1)
+            # Every chunk but the last holds a multiple of 8 gates
+            new.conj.extend(chunk.conj[:(len(chunk) + 7) >> 3])
+            if new.locations is not None:
+                new.locations.extend(chunk.locations)
+            if len(new) >= length:
+                break
+        return new
+
+    def in_memory(self) -> GateColumns:
+        return self.copy()
+
+    @property
+    def nbytes(self) -> int:
+        """The memory used by the buffered gates"""
+        return self.tail.nbytes
+
+    def close(self) -> None:
+        """Close the log, deleting it if it's temporary"""
+        self._finalizer()
+
+
+def _remove(file, path: str) -> None:
+    file.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
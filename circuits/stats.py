@@ -0,0 +1,103 @@
+"""Running statistics of a circuit, kept up to date as gates are appended, so
+that asking for a circuit's width or depth doesn't mean rescanning all of its
+gates.
+"""
+
+import copy
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List
+
+from .columns import GateColumns, NO_QUBIT
+from .gates import Gate, GATE_TYPES
+
+
+@dataclass(frozen=True)
+class CircuitStats:
+    """Aggregate statistics of a circuit at some moment"""
+    gates: int                    # the total number of gates
+    width: int                    # the number of qubits acted on
+    qubits: FrozenSet[int]        # every qubit acted on by some gate
+    depth: int                    # the length of the longest path through the circuit
+    counts: Dict[str, int]        # gate counts, by gate type name
+    qubit_counts: Dict[int, int]  # the number of gates acting on each qubit
+    qubit_depths: Dict[int, int]  # the depth of the circuit on each qubit
+
+
+class RunningStats:
+    """Aggregates updated gate by gate. Per-qubit figures are kept in lists
+    indexed by qubit, as qubits are allocated densely from zero."""
+
+    def __init__(self):
+        self.gates = 0
+        self.width = 0
+        self.depth = 0
+        self.opcode_counts = [0] * len(GATE_TYPES)
+        self.qubit_counts: List[int] = []
+        self.qubit_depths: List[int] = []
+
+    @classmethod
+    def from_columns(cls, columns: GateColumns) -> 'RunningStats':
+        """Compute the statistics of existing gates, in a single pass"""
+        stats = cls()
+        add = stats.add
+        for chunk in columns.chunks():
+            for opcode, q0, q1 in zip(chunk.opcodes, chunk.operands0,
+                                      chunk.operands1):
+                add(opcode, q0, q1)
+        return stats
+
+    def copy(self) -> 'RunningStats':
+        """A copy, in time proportional to the width"""
+        new = copy.copy(self)
+        new.opcode_counts = list(self.opcode_counts)
+        new.qubit_counts = list(self.qubit_counts)
+        new.qubit_depths = list(self.qubit_depths)
+        return new
+
+    def _grow(self, qubit: int) -> None:
+        extra = qubit + 1 - len(self.qubit_counts)
+        self.qubit_counts.extend([0] * extra)
+        self.qubit_depths.extend([0] * extra)
+
+    def add(self, opcode: int, q0: int, q1: int = NO_QUBIT) -> None:
+        if q0 >= len(self.qubit_counts) or q1 >= len(self.qubit_counts):
+            self._grow(max(q0, q1))
+        self.gates += 1
+        self.opcode_counts[opcode] += 1
+        counts, depths = self.qubit_counts, self.qubit_depths
+        if not counts[q0]:
+            self.width += 1
+        counts[q0] += 1
+        if q1 == NO_QUBIT:
+            depth = depths[q0] + 1
+        else:
+            if not counts[q1]:
+                self.width += 1
+            counts[q1] += 1
+            depth = max(depths[q0], depths[q1]) + 1
+            depths[q1] = depth
+        depths[q0] = depth
+        if depth > self.depth:
+            self.depth = depth
+
+    def extend(self, gates: Iterable[Gate]) -> None:
+        add = self.add
+        for gate in gates:
+            add(gate.opcode, *gate.qubits)
+
+    def qubits(self) -> FrozenSet[int]:
+        return frozenset(q for q, count in enumerate(self.qubit_counts) if count)
+
+    def freeze(self) -> CircuitStats:
+        return CircuitStats(
+            gates=self.gates,
+            width=self.width,
+            qubits=self.qubits(),
+            depth=self.depth,
+            counts={GATE_TYPES[opcode].__name__: count
+                    for opcode, count in enumerate(self.opcode_counts) if count},
+            qubit_counts={q: count for q, count in enumerate(self.qubit_counts)
+                          if count},
+            qubit_depths={q: depth for q, depth in enumerate(self.qubit_depths)
+                          if depth},
+        )
@@ -0,0 +1,312 @@
+"""Transpilation to the native gates of a device. A `NativeGateSet` says which
+gates a device runs; the rewrite rules in `RULES` say how to build each gate
+from others. For each gate set, the rules are compiled once into a table giving,
+for each opcode, the cheapest sequence of native gates it expands to, so that
+transpiling a gate is a single lookup.
+
+Expanding gates one at a time leaves long runs of single-qubit gates, like the
+S·√X·S that each Hadamard becomes on a CZ device. The gates of each run are
+multiplied out, and the product looked up in a table of the cheapest native
+sequences, which is built once for each gate set by enumerating the sequences
+of a few pulses, separated by phase gates. Runs are memoized, since the same
+ones recur throughout a circuit.
+
+Everything here holds up to a global phase.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import itertools
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from errors import CavyRuntimeError
+from .columns import GateColumns, NO_QUBIT
+from .gates import (GATE_TYPES, CnotGate, CzGate, HadamardGate, NotGate, SGate,
+                    StrongMeasurementGate, SqrtXGate, SwapGate, TGate, ZGate)
+from .phasefold import phase_gates
+from .simulator import simulate
+
+# A step of a rewrite rule: a gate type, the positions among the rewritten
+# gate's qubits of the qubits it acts on, and whether it's conjugated
+Step = Tuple[type, Tuple[int, ...], bool]
+# A step of a compiled expansion, by opcode
+OpStep = Tuple[int, Tuple[int, ...], bool]
+# The cost of a sequence of gates: pulses, then T gates, then gates of any kind
+Cost = Tuple[int, int, int]
+
+# The most pulses in the sequences a single-qubit run can be replaced with
+MAX_PULSES = 2
+# The most gates of a run that are multiplied out together
+MERGE_WINDOW = 32
+# The most distinct runs remembered, per transpilation
+RUN_CACHE_SIZE = 1 << 16
+
+
+def _step(gate_type: type, *positions: int, conj: bool = False) -> Step:
+    return (gate_type, positions, conj)
+
+
+# Ways of building each gate from others, up to a global phase
+RULES: Dict[type, List[Tuple[Step, ...]]] = {
+    HadamardGate: [(_step(SGate, 0), _step(SqrtXGate, 0), _step(SGate, 0))],
+    NotGate: [
+        (_step(SqrtXGate, 0), _step(SqrtXGate, 0)),
+        (_step(HadamardGate, 0), _step(ZGate, 0), _step(HadamardGate, 0)),
+    ],
+    SqrtXGate: [(_step(HadamardGate, 0), _step(SGate, 0), _step(HadamardGate, 0))],
+    ZGate: [(_step(SGate, 0), _step(SGate, 0))],
+    SGate: [(_step(TGate, 0), _step(TGate, 0))],
+    CnotGate: [(_step(HadamardGate, 1), _step(CzGate, 0, 1), _step(HadamardGate, 1))],
+    CzGate: [(_step(HadamardGate, 1), _step(CnotGate, 0, 1), _step(HadamardGate, 1))],
+    SwapGate: [(_step(CnotGate, 0, 1), _step(CnotGate, 1, 0), _step(CnotGate, 0, 1))],
+}
+
+
+class TranspileError(CavyRuntimeError):
+    """Raised when a circuit has a gate that can't be built from a gate set."""
+    def __str__(self):
+        return f"Transpile error: {self.args[0]}"
+
+
+@dataclass(frozen=True)
+class NativeGateSet:
+    """The gates a device runs natively. Of these, the `virtual` gates are
+    phases, applied by shifting the frame of later pulses, and take no time;
+    the others are pulses. Measurements are always native."""
+    name: str
+    gates: FrozenSet[type]
+    virtual: FrozenSet[type] = frozenset({ZGate, SGate, TGate})
+
+    def __post_init__(self):
+        if not self.virtual <= self.gates:
+            raise ValueError(f"Virtual gates of '{self.name}' must be native")
+
+    def __str__(self) -> str:
+        def names(gate_types) -> str:
+            return ', '.join(sorted(gate_type.__name__ for gate_type in gate_types))
+        return f"{self.name} ({names(self.gates)}; virtual {names(self.virtual)})"
+
+    def cost(self, gate_type: type) -> Cost:
+        return (0 if gate_type in self.virtual else 1, int(gate_type is TGate), 1)
+
+
+CLIFFORD_T = NativeGateSet('clifford-t', frozenset({
+    NotGate, ZGate, SGate, TGate, HadamardGate, CnotGate,
+}))
+CZ_SX = NativeGateSet('cz-sx', frozenset({CzGate, SqrtXGate, ZGate, SGate, TGate}))
+CX_SX = NativeGateSet('cx-sx', frozenset({
+    CnotGate, SqrtXGate, NotGate, ZGate, SGate, TGate,
+}))
+
+GATE_SETS = {gate_set.name: gate_set for gate_set in (CLIFFORD_T, CZ_SX, CX_SX)}
+
+
+def gate_set_named(name: str) -> NativeGateSet:
+    try:
+        return GATE_SETS[name]
+    except KeyError:
+        raise TranspileError(f"no gate set named '{name}'") from None
+
+
+def _add(first: Cost, second: Cost) -> Cost:
+    return (first[0] + second[0], first[1] + second[1], first[2] + second[2])
+
+
+def _inverse(steps: Sequence[OpStep]) -> Tuple[OpStep, ...]:
+    return tuple((opcode, positions, not conj and not GATE_TYPES[opcode].self_inverse)
+                 for opcode, positions, conj in reversed(steps))
+
+
+@lru_cache(maxsize=None)
+def expansions(gate_set: NativeGateSet) -> List[Optional[Tuple[Tuple[OpStep, ...], ...]]]:
+    """For each opcode, the cheapest native expansions of its gate and of its
+    conjugate, or None if it has none. Found by relaxing the rules to a
+    fixpoint, as in a shortest-path search."""
+    best: Dict[type, Tuple[Cost, Tuple[OpStep, ...]]] = {}
+    for gate_type in gate_set.gates | {StrongMeasurementGate}:
+        positions = tuple(range(gate_type.arity))
+        best[gate_type] = (gate_set.cost(gate_type), ((gate_type.opcode, positions, False),))
+    changed = True
+    while changed:
+        changed = False
+        for gate_type, rules in RULES.items():
+            for rule in rules:
+                if any(step_type not in best for step_type, _, _ in rule):
+                    continue
+                cost: Cost = (0, 0, 0)
+                steps: List[OpStep] = []
+                for step_type, positions, conj in rule:
+                    step_cost, expansion = best[step_type]
+                    cost = _add(cost, step_cost)
+                    if conj:
+                        expansion = _inverse(expansion)
+                    steps.extend((opcode, tuple(positions[p] for p in inner), inner_conj)
+                                 for opcode, inner, inner_conj in expansion)
+                if gate_type not in best or cost < best[gate_type][0]:
+                    best[gate_type] = (cost, tuple(steps))
+                    changed = True
+    table: List[Optional[Tuple[Tuple[OpStep, ...], ...]]] = []
+    for gate_type in GATE_TYPES:
+        if gate_type in best:
+            steps = best[gate_type][1]
+            table.append((steps, _inverse(steps)))
+        else:
+            table.append(None)
+    return table
+
+
+# Single-qubit gates, as 2x2 matrices in row-major order
+Matrix = Tuple[complex, complex, complex, complex]
+_IDENTITY: Matrix = (1, 0, 0, 1)
+
+
+@lru_cache(maxsize=None)
+def _matrix(opcode: int, conj: bool) -> Matrix:
+    gate = GATE_TYPES[opcode](0, conj=conj)
+    zero = simulate([gate], {0: 0}, [1, 0])
+    one = simulate([gate], {0: 0}, [0, 1])
+    return (zero[0], one[0], zero[1], one[1])
+
+
+def _times(a: Matrix, b: Matrix) -> Matrix:
+    return (a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+            a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3])
+
+
+def _key(matrix: Matrix) -> tuple:
+    """A matrix, rounded, with its global phase taken out"""
+    for entry in matrix:
+        if abs(entry) > 1e-6:
+            phase = abs(entry) / entry
+            break
+    key = []
+    for entry in matrix:
+        entry *= phase
+        key.append(round(entry.real, 6) + 0.0)
+        key.append(round(entry.imag, 6) + 0.0)
+    return tuple(key)
+
+
+# A single-qubit gate in a run, as its opcode and whether it's conjugated
+RunGate = Tuple[int, bool]
+
+
+@lru_cache(maxsize=None)
+def synthesis_table(gate_set: NativeGateSet) -> Dict[tuple, Tuple[RunGate, ...]]:
+    """The cheapest native sequence for each single-qubit unitary reachable
+    with at most `MAX_PULSES` pulses, each between phases of a multiple of π/4"""
+    phases = []
+    for phase in range(8):
+        gates = phase_gates(phase, 0)
+        if all(type(gate) in gate_set.virtual for gate in gates):
+            phases.append(tuple((gate.opcode, gate.conj) for gate in gates))
+    pulses = []
+    for gate_type in sorted(gate_set.gates - gate_set.virtual, key=lambda t: t.opcode):
+        if gate_type.arity == 1:
+            pulses.append(((gate_type.opcode, False),))
+            if not gate_type.self_inverse:
+                pulses.append(((gate_type.opcode, True),))
+    table: Dict[tuple, Tuple[Cost, Tuple[RunGate, ...]]] = {}
+    for n in range(MAX_PULSES + 1):
+        for parts in itertools.product(phases, *[pulses, phases] * n):
+            sequence = tuple(gate for part in parts for gate in part)
+            matrix = _IDENTITY
+            cost: Cost = (0, 0, 0)
+            for opcode, conj in sequence:
+                matrix = _times(_matrix(opcode, conj), matrix)
+                cost = _add(cost, gate_set.cost(GATE_TYPES[opcode]))
+            key = _key(matrix)
+            if key not in table or cost < table[key][0]:
+                table[key] = (cost, sequence)
+    return {key: sequence for key, (_, sequence) in table.items()}
+
+
+class _Merger:
+    """Replaces runs of single-qubit native gates with cheaper ones"""
+
+    def __init__(self, gate_set: NativeGateSet):
+        self.gate_set = gate_set
+        self.table = synthesis_table(gate_set)
+        self.runs: Dict[Tuple[RunGate, ...], Tuple[RunGate, ...]] = {}
+
+    def cost(self, run: Sequence[RunGate]) -> Cost:
+        cost: Cost = (0, 0, 0)
+        for opcode, _ in run:
+            cost = _add(cost, self.gate_set.cost(GATE_TYPES[opcode]))
+        return cost
+
+    def merge(self, run: Tuple[RunGate, ...]) -> Tuple[RunGate, ...]:
+        merged = self.runs.get(run)
+        if merged is not None:
+            return merged
+        table = self.table
+        out: List[RunGate] = []
+        i, n = 0, len(run)
+        # Greedily replace the longest prefix with a product in the table
+        while i < n:
+            end, best = i + 1, (run[i],)
+            matrix = _IDENTITY
+            for j in range(i, min(n, i + MERGE_WINDOW)):
+                matrix = _times(_matrix(*run[j]), matrix)
+                sequence = table.get(_key(matrix))
+                if sequence is not None:
+                    end, best = j + 1, sequence
+            out.extend(best)
+            i = end
+        merged = tuple(out) if self.cost(out) < self.cost(run) else run
+        if len(self.runs) >= RUN_CACHE_SIZE:
+            self.runs.clear()
+        self.runs[run] = merged
+        return merged
+
+
+def transpile(columns: GateColumns, gate_set: NativeGateSet) -> GateColumns:
+    """The gates of `columns`, built from the gates of `gate_set`, with runs
+    of single-qubit gates merged. Raises a `TranspileError` on a gate that
+    can't be built from them."""
+    table = expansions(gate_set)
+    merger = _Merger(gate_set)
+    out = GateColumns(locations=columns.has_locations)
+    measure, cz = StrongMeasurementGate.opcode, CzGate.opcode
+    # The single-qubit gates waiting on each qubit, and the source location
+    # of the first of them
+    runs: Dict[int, List[RunGate]] = {}
+    run_locations: Dict[int, int] = {}
+
+    def flush(qubit: int) -> None:
+        run = runs.pop(qubit, None)
+        if run:
+            location = run_locations.pop(qubit)
+            for opcode, conj in merger.merge(tuple(run)):
+                out.append(GATE_TYPES[opcode](qubit, conj=conj), location)
+
+    for chunk in columns.chunks():
+        opcodes, operands0, operands1 = chunk.opcodes, chunk.operands0, chunk.operands1
+        locations = chunk.locations
+        for i in range(len(chunk)):
+            opcode, q0, q1 = opcodes[i], operands0[i], operands1[i]
+            expansion = table[opcode]
+            if expansion is None:
+                raise TranspileError(f"{GATE_TYPES[opcode].__name__} can't be built "
+                                     f"from the '{gate_set.name}' gate set")
+            location = -1 if locations is None else locations[i]
+            qubits = (q0,) if q1 == NO_QUBIT else (q0, q1)
+            for step, positions, conj in expansion[chunk.is_conj(i)]:
+                if len(positions) == 1 and step != measure:
+                    qubit = qubits[positions[0]]
+                    run = runs.get(qubit)
+                    if run is None:
+                        run = runs[qubit] = []
+                        run_locations[qubit] = location
+                    run.append((step, conj))
+                    continue
+                operands = [qubits[p] for p in positions]
+                for qubit in operands:
+                    flush(qubit)
+                if step == cz:
+                    # CZ is symmetric; ordering its qubits lets equal ones cancel
+                    operands.sort()
+                out.append(GATE_TYPES[step](*operands, conj=conj), location)
+    for qubit in list(runs):
+        flush(qubit)
+    return out
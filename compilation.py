@@ -2,7 +2,14 @@
 A few small helper functions for compiling Cavy source.
 """
 
+from typing import Optional, Union
+
+from budget import Budget, BudgetExceededError
+from circuits.cache import CircuitCache, cache_key, default_cache
 from circuits.circuit import Circuit
+from circuits.resources import ResourceEstimate
+from circuits.passes import PassManager
+from circuits.transpile import NativeGateSet, gate_set_named
 from interpreter import Interpreter
 from lang_parser import Parser
 from lexer import Lexer
@@ -11,6 +18,7 @@ from errors import CavyRuntimeError
 class Program:
 
     def __init__(self, source: str):
+        self.source = source
         lexer = Lexer(source)
         tokens = lexer.lex()
         if (errors := lexer.errors):
@@ -26,13 +34,61 @@ class Program:
                 # TODO this is temporarily here so I can see what’s in `errors`
                 breakpoint()
 
-    def compile(self) -> Circuit:
+    def compile(self, budget: Optional[Budget] = None, opt_level: int = 0,
+                verify: bool = False, spill: Union[bool, str] = False,
+                cache: Union[bool, CircuitCache] = False,
+                target: Union[None, str, NativeGateSet] = None) -> Circuit:
         """Note that we are somewhat mixing notions of 'compile-time' and 'runtime'.
         This method transforms the AST into Pycavy's Circuit data structure.
+
+        If a `budget` is given, compilation stops with a `BudgetExceededError`
+        as soon as it uses more resources than the budget allows.
+
+        The circuit is then optimized at `opt_level`, from 0 to 3. The passes
+        run, and what each did, are left in `self.passes`. With `verify`, each
+        pass is checked by simulation on small circuits.
+
+        With `spill`, gates are spilled to disk as they're emitted, for circuits
+        too large for memory; see `Circuit`.
+
+        With `cache`, the compiled circuit is looked up in a `CircuitCache`, or
+        in the default one if `cache` is True, and stored there if it's missing.
+        The cache isn't used under a budget, which only interpretation can check.
+
+        With a `target` gate set, or the name of one in `circuits.transpile`,
+        the optimized circuit is transpiled to it.
         """
-        interpreter = Interpreter()
+        if isinstance(target, str):
+            target = gate_set_named(target)
+        self.passes = PassManager.for_level(opt_level, verify=verify, target=target)
+        if cache is True:
+            cache = default_cache()
+        key = None
+        if cache and budget is None:
+            key = cache_key(self.source, opt_level=opt_level, verify=verify,
+                            target=target and str(target))
+            circuit = cache.get(key)
+            if circuit is not None:
+                return circuit
+        interpreter = Interpreter(budget=budget, spill=spill)
         try:
             interpreter.interpret(self.stmts)
+        except BudgetExceededError:
+            # A truncated circuit is worse than no circuit at all.
+            raise
         except CavyRuntimeError as err:
             print(err)
-        return interpreter.circuit
+            # Nor should a truncated circuit be cached
+            key = None
+        circuit = self.passes.run(interpreter.circuit)
+        if key is not None:
+            cache.put(key, circuit)
+        return circuit
+
+    def estimate_resources(self, budget: Optional[Budget] = None) -> ResourceEstimate:
+        """Estimate the resources of the unoptimized circuit, interpreting the
+        program without keeping its gates. This needs memory for the program's
+        qubits, but not for its gates."""
+        interpreter = Interpreter(budget=budget, materialize=False)
+        interpreter.interpret(self.stmts)
+        return interpreter.circuit.estimate_resources()
@@ -1,12 +1,13 @@
+from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Any, List
+from typing import Any, Dict, FrozenSet, List, Tuple
 
 from circuits.circuit import Circuit
 from circuits.gates import Gate
 from errors import CavyRuntimeError
 from lang_token import Token
 from lang_ast import Variable
-from lang_types import Qubit, QubitMeasurement, is_linear
+from lang_types import Array, Qubit, QubitMeasurement, is_linear
 
 
 class UnboundNameError(CavyRuntimeError):
@@ -23,12 +24,28 @@ class MovedValueError(CavyRuntimeError):
         return f"Moved value error: '{self.args[0]}' has been moved."
 
 
+class PartiallyMovedError(MovedValueError):
+    """Raised when an array is used as a whole after some of its elements have
+    been moved out."""
+    def __str__(self):
+        return f"Moved value error: some elements of '{self.args[0]}' have been moved."
+
+
+class OccupiedElementError(CavyRuntimeError):
+    """Raised when assigning to an array element that still holds a linear
+    value, which would be discarded."""
+    def __str__(self):
+        return f"Occupied element error: '{self.args[0]}' has not been moved out."
+
+
 class NoopAllocator:
     """A trivial allocator that I'll use for the time being. Because we assumed
     that qubits can't be reinitialized, freeing is a no-op."""
     def __init__(self):
         self.least_free = 0
         self.freed = set()
+        # An optional `budget.BudgetMeter` counting allocations
+        self.meter = None
 
     def __contains__(self, num: int) -> bool:
         return num < self.least_free and num not in self.freed
@@ -36,6 +53,8 @@ class NoopAllocator:
     def alloc_one(self) -> int:
         new = self.least_free
         self.least_free += 1
+        if self.meter is not None:
+            self.meter.count_qubits(self.least_free)
         return new
 
     def free_one(self, num: int) -> None:
@@ -43,11 +62,36 @@ class NoopAllocator:
         assert num in self
         self.freed.add(num)
 
+    def snapshot(self) -> Tuple[int, FrozenSet[int]]:
+        return (self.least_free, frozenset(self.freed))
+
+    def restore(self, state: Tuple[int, FrozenSet[int]]) -> None:
+        least_free, freed = state
+        self.least_free = least_free
+        self.freed = set(freed)
+
+
+@dataclass(frozen=True)
+class EnvironmentSnapshot:
+    """The state of a chain of scopes at some moment. The `values` dictionaries
+    are shared with the live scopes until those are next written to."""
+    environment: 'Environment'
+    scopes: Tuple[Tuple['Environment', Dict[str, Any]], ...]
+    allocator: Tuple[int, FrozenSet[int]]
+
 
 class Environment:
     def __init__(self, enclosing=None, control=None, defaults=None):
         self.values = {}
-        self.qubits = NoopAllocator()
+        # True if `values` is shared with a snapshot, and must be copied
+        # before it is written to.
+        self.shared = False
+        # Every scope allocates from the same pool: otherwise, qubits
+        # allocated in a nested scope would alias those of its enclosing scopes.
+        if enclosing is not None:
+            self.qubits = enclosing.qubits
+        else:
+            self.qubits = NoopAllocator()
         self.enclosing = enclosing
         self.control = control
         if defaults is not None:
@@ -67,8 +111,35 @@ class Environment:
         self.set_key_value(name, value)
 
     def set_key_value(self, name: str, value: Any):
+        if self.shared:
+            self.unshare()
         self.values[name] = value
 
+    def unshare(self) -> None:
+        self.values = dict(self.values)
+        self.shared = False
+
+    def snapshot(self) -> EnvironmentSnapshot:
+        """Capture the state of this scope and all those enclosing it. This
+        copies nothing: each scope's values are copied on its next write."""
+        scopes = []
+        scope = self
+        while scope is not None:
+            scope.shared = True
+            scopes.append((scope, scope.values))
+            scope = scope.enclosing
+        return EnvironmentSnapshot(self, tuple(scopes), self.qubits.snapshot())
+
+    @staticmethod
+    def restore(snapshot: EnvironmentSnapshot) -> 'Environment':
+        """Return every scope in a snapshot to its captured state, and return
+        the innermost one."""
+        for scope, values in snapshot.scopes:
+            scope.values = values
+            scope.shared = True
+        snapshot.environment.qubits.restore(snapshot.allocator)
+        return snapshot.environment
+
     def alloc_one(self) -> Qubit:
         index = self.qubits.alloc_one()
         return Qubit(index)
@@ -76,7 +147,7 @@ class Environment:
     def embed_gate(self, gate: Gate) -> List[Gate]:
         """Embed a block-local gate as a list of gates in the global scope."""
         if self.control is not None:
-            gates = gate.with_control(self.control)
+            gates = gate.controlled(self.control)
         else:
             gates = [gate]
         if self.enclosing:
@@ -101,6 +172,8 @@ class Environment:
         try:
             value = self.values[name]
             if value is not None:
+                if isinstance(value, Array) and value.moved:
+                    raise PartiallyMovedError(name)
                 if is_linear(value):
                     # The value is a quantum state: remove it from the environment!
                     # Instead of popping the value, we'll replace it with a special
@@ -111,7 +184,7 @@ class Environment:
                     # Note that we're not using the environment's `get` method:
                     # 'None' is a special symbol indicating a moved value, not an
                     # unbound name.
-                    self.values[name] = None
+                    self.set_key_value(name, None)
                 return value
             else:
                 raise MovedValueError(name)
@@ -120,3 +193,45 @@ class Environment:
                 return encl[var]
             else:
                 raise UnboundNameError(name)
+
+    def scope_of(self, name: str) -> 'Environment':
+        """The innermost scope in which a name is bound"""
+        scope = self
+        while scope is not None:
+            if name in scope.values:
+                return scope
+            scope = scope.enclosing
+        raise UnboundNameError(name)
+
+    def _getelement(self, var: Variable, index: Any):
+        """Read one element of an array. If the element is linear, only it is
+        moved, and the rest of the array stays bound. Like `_getitem`, this is
+        monkeypatched during contravariant evaluation."""
+        name = var.name.data
+        scope = self.scope_of(name)
+        value = scope.values[name]
+        if value is None:
+            raise MovedValueError(name)
+        if not isinstance(value, Array) or not is_linear(value):
+            # Unrestricted arrays are simply read; anything else is read as a
+            # whole, and indexed as a whole.
+            return self._getitem(var)[index]
+        if value.is_moved(index):
+            raise MovedValueError(f'{name}[{index}]')
+        element = value[index]
+        if is_linear(element):
+            scope.set_key_value(name, value.without(index))
+        return element
+
+    def set_element(self, var: Variable, index: Any, value: Any) -> None:
+        """Move a value into one element of a bound array."""
+        name = var.name.data
+        scope = self.scope_of(name)
+        arr = scope.values[name]
+        if arr is None:
+            raise MovedValueError(name)
+        if not isinstance(arr, Array):
+            raise CavyRuntimeError(f"'{name}' is not an array")
+        if is_linear(arr[index]) and not arr.is_moved(index):
+            raise OccupiedElementError(f'{name}[{index}]')
+        scope.set_key_value(name, arr.with_element(index, value))
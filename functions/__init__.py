@@ -1,5 +1,6 @@
 from .function import Function
 from .lang_builtins import *
+from .native import NativeFunction, native_function
 
 BUILTINS = {
     'qubit': AllocQubit(),
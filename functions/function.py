@@ -1,22 +1,80 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+from typing import Any, Hashable, Optional
 
 from environment import Environment
 
+# The number of calls remembered by each function's `CallCache`
+DEFAULT_CACHE_SIZE = 1024
+# After this many misses, a cache that has hit on fewer than one in eight
+# lookups stops being consulted: computing keys isn't free.
+CACHE_PROBATION = 256
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
 
 class AbstractFunction(ABC):
     arity = 0
+    # True for builtins that never touch the circuit or the environment, and
+    # so may be called from native code.
+    classical = False
 
     @abstractmethod
     def call(self, args):
         pass
 
 
+class CallCache:
+    """A bounded least-recently-used cache of the outcomes of calls to a pure
+    function, keyed by everything the call depends on."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """Get a cached outcome, or `None` if there isn't one"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    @property
+    def enabled(self) -> bool:
+        if self.maxsize <= 0:
+            return False
+        return self.misses < CACHE_PROBATION or 8 * self.hits >= self.misses
+
+    def store(self, key: Hashable, entry: Any) -> None:
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+
 class Function(AbstractFunction):
 
-    def __init__(self, params, body):
+    def __init__(self, params, body, name=None):
         self.params = params
         self.arity = len(self.params)
         self.body = body
+        self.name = name
+        # Filled in on first call by `functions.native.native_function`
+        self.analyzed = False
+        self.native = None
+        self.cache = CallCache()
 
     def call(self, interp, args):
         env = Environment(interp.environment)
@@ -67,6 +67,7 @@ class Flip(VectorizedGate):
 class Debug(AbstractFunction):
     """A debug function that prints a debug message"""
     arity = 1
+    classical = True
 
     def call(self, interp, args) -> None:
         print(f"Called `debug` with flag {args[0]}")
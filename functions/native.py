@@ -0,0 +1,503 @@
+"""Transpilation of purely classical Cavy functions into native Python code.
+
+Most of the work done by a classical helper function is bookkeeping: integer
+arithmetic, comparisons and loops. Walking the AST for all of this is slow, so
+functions whose bodies cannot have any quantum effects are compiled once, via
+generated Python source and `compile()`, into native functions that the
+interpreter calls directly.
+
+Because Cavy names are dynamically scoped, whether a call is truly classical
+depends on the environment it is made in. A `NativeFunction` is therefore only
+entered after checking that its arguments, and every value it (or anything it
+calls) could read from the enclosing environment, are unrestricted. Inside such
+a call no linear value can ever appear, so the generated code needs no further
+checks.
+
+Native functions that are also pure--that never print, directly or through
+anything they call--are memoized. A call to such a function can only affect
+the rest of the program by assigning to names bound outside it, so its outcome
+is recorded as those assignments, keyed by its arguments and the values of
+every name it could read.
+"""
+
+from typing import Any, List, Optional, Set
+
+from environment import Environment, MovedValueError, UnboundNameError
+from lang_ast import *
+from lang_token import TokenType
+from lang_types import Array, is_linear
+from .function import AbstractFunction, Function
+
+
+class NotClassical(Exception):
+    """Raised during analysis when a node might have quantum effects."""
+    pass
+
+
+# Binary operators that have a native counterpart, as format strings over the
+# transpiled operands.
+BINOP_TEMPLATES = {
+    TokenType.PLUS:       '({} + {})',
+    TokenType.STAR:       '({} * {})',
+    TokenType.EQUALEQUAL: '({} == {})',
+    TokenType.TILDEEQUAL: '({} != {})',
+    TokenType.STOPSTOP:   'range({}, {})',
+}
+
+
+class ClassicalSummary:
+    """The facts about a function body that the classical analysis collects"""
+
+    def __init__(self, params: List[str]):
+        self.params = set(params)
+        self.reads = set()    # every name read as a variable
+        self.writes = set()   # every name assigned to
+        self.binders = set()  # every name bound by a `for` loop
+        self.callees = set()  # every name called as a function
+        self.prints = False   # True if the body contains a `print` statement
+
+    def locals(self) -> Set[str]:
+        """Names that may be bound within a call to this function"""
+        return self.params | self.writes | self.binders
+
+
+class ClassicalAnalysis(ExprVisitor, StmtVisitor):
+    """Decides whether a function body is free of quantum effects, collecting a
+    `ClassicalSummary` along the way. Anything that could allocate a qubit,
+    emit a gate or coevaluate an expression is rejected: linearization and
+    measurement, `let` statements and nested function definitions. Calls and
+    `~` are allowed, as whether they are classical is only known at call time.
+    """
+
+    def __init__(self, params: List[str]):
+        self.summary = ClassicalSummary(params)
+
+    def analyze(self, body: BlockStmt) -> Optional[ClassicalSummary]:
+        try:
+            for stmt in body.stmts:
+                stmt.accept(self)
+        except NotClassical:
+            return None
+        return self.summary
+
+    def visit_binop(self, expr: BinOp) -> None:
+        if expr.op.token_type not in BINOP_TEMPLATES:
+            raise NotClassical
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_unop(self, expr: UnOp) -> None:
+        if expr.op.token_type != TokenType.TILDE:
+            raise NotClassical
+        expr.right.accept(self)
+
+    def visit_literal(self, expr: Literal) -> None:
+        pass
+
+    def visit_group(self, expr: Group) -> None:
+        expr.expr.accept(self)
+
+    def visit_variable(self, expr: Variable) -> None:
+        self.summary.reads.add(expr.name.data)
+
+    def visit_extensionalarray(self, expr: ExtensionalArray) -> None:
+        for item in expr.items:
+            item.accept(self)
+
+    def visit_intensionalarray(self, expr: IntensionalArray) -> None:
+        expr.item.accept(self)
+        expr.reps.accept(self)
+
+    def visit_index(self, expr: Index) -> None:
+        expr.root.accept(self)
+        expr.index.accept(self)
+
+    def visit_call(self, expr: Call) -> None:
+        # Only calls to named functions can be resolved ahead of time.
+        if not isinstance(expr.callee, Variable):
+            raise NotClassical
+        self.summary.callees.add(expr.callee.name.data)
+        expr.callee.accept(self)
+        for arg in expr.args:
+            arg.accept(self)
+
+    def visit_exprstmt(self, stmt: ExprStmt) -> None:
+        stmt.expr.accept(self)
+
+    def visit_printstmt(self, stmt: PrintStmt) -> None:
+        self.summary.prints = True
+        stmt.expr.accept(self)
+
+    def visit_assnstmt(self, stmt: AssnStmt) -> None:
+        self.summary.writes.add(stmt.lhs.data)
+        stmt.rhs.accept(self)
+
+    def visit_indexassnstmt(self, stmt: IndexAssnStmt) -> None:
+        # Element assignment is how linear arrays are rebuilt in place.
+        raise NotClassical
+
+    def visit_blockstmt(self, stmt: BlockStmt) -> None:
+        for inner in stmt.stmts:
+            inner.accept(self)
+
+    def visit_ifstmt(self, stmt: IfStmt) -> None:
+        stmt.cond.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch:
+            stmt.else_branch.accept(self)
+
+    def visit_letstmt(self, stmt: LetStmt) -> None:
+        raise NotClassical
+
+    def visit_forstmt(self, stmt: ForStmt) -> None:
+        self.summary.binders.add(stmt.binder.data)
+        stmt.iterator.accept(self)
+        stmt.body.accept(self)
+
+    def visit_fnstmt(self, stmt: FnStmt) -> None:
+        raise NotClassical
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    """Generates the Python source of a native function from a classical
+    function body. Every Cavy scope is still an `Environment`, so that the
+    dynamic scoping of names behaves exactly as it does in the interpreter; the
+    Python local `e{n}` holds the scope at block depth `n`.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.depth = 0
+        self.indent = 1
+        self.temps = 0
+        self.constants = {}
+
+    @property
+    def env(self) -> str:
+        return f'e{self.depth}'
+
+    def emit(self, line: str) -> None:
+        self.lines.append('    ' * self.indent + line)
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f'_t{self.temps}'
+
+    def constant(self, value: Any) -> str:
+        """Make a value that has no literal form available to the generated code"""
+        name = f'_k{len(self.constants)}'
+        self.constants[name] = value
+        return name
+
+    def transpile(self, params: List[str], body: BlockStmt) -> 'Transpiler':
+        self.lines.append('def native(interp, enclosing, args):')
+        self.emit('e0 = Environment(enclosing)')
+        for i, param in enumerate(params):
+            self.emit(f'e0.set_key_value({param!r}, args[{i}])')
+        self.block(body.stmts)
+        return self
+
+    def block(self, stmts: List[Statement]) -> None:
+        for stmt in stmts:
+            stmt.accept(self)
+        if not stmts:
+            self.emit('pass')
+
+    def nested_block(self, stmts: List[Statement], bindings: str = '',
+                     indented: bool = True) -> None:
+        outer = self.env
+        self.depth += 1
+        self.indent += indented
+        defaults = f', defaults={{{bindings}}}' if bindings else ''
+        self.emit(f'{self.env} = Environment({outer}{defaults})')
+        self.block(stmts)
+        self.indent -= indented
+        self.depth -= 1
+
+    def visit_binop(self, expr: BinOp) -> str:
+        template = BINOP_TEMPLATES[expr.op.token_type]
+        return template.format(expr.left.accept(self), expr.right.accept(self))
+
+    def visit_unop(self, expr: UnOp) -> str:
+        return f'(not {expr.right.accept(self)})'
+
+    def visit_literal(self, expr: Literal) -> str:
+        return repr(expr.literal.data)
+
+    def visit_group(self, expr: Group) -> str:
+        return expr.expr.accept(self)
+
+    def visit_variable(self, expr: Variable) -> str:
+        return f'_lookup({self.env}, {expr.name.data!r})'
+
+    def visit_extensionalarray(self, expr: ExtensionalArray) -> str:
+        items = ', '.join(item.accept(self) for item in expr.items)
+        return f'Array([{items}])'
+
+    def visit_intensionalarray(self, expr: IntensionalArray) -> str:
+        rep = self.temp()
+        return f'Array([{expr.item.accept(self)} for {rep} in range({expr.reps.accept(self)})])'
+
+    def visit_index(self, expr: Index) -> str:
+        return f'{expr.root.accept(self)}[{expr.index.accept(self)}]'
+
+    def visit_call(self, expr: Call) -> str:
+        args = ', '.join(arg.accept(self) for arg in expr.args)
+        paren = self.constant(expr.paren)
+        return f'_invoke(interp, {self.env}, {expr.callee.accept(self)}, [{args}], {paren})'
+
+    def visit_exprstmt(self, stmt: ExprStmt) -> None:
+        self.emit(stmt.expr.accept(self))
+
+    def visit_printstmt(self, stmt: PrintStmt) -> None:
+        self.emit(f'print({stmt.expr.accept(self)})')
+
+    def visit_assnstmt(self, stmt: AssnStmt) -> None:
+        self.emit(f'_assign({self.env}, {stmt.lhs.data!r}, {stmt.rhs.accept(self)})')
+
+    def visit_indexassnstmt(self, stmt: IndexAssnStmt) -> None:
+        raise NotClassical
+
+    def visit_blockstmt(self, stmt: BlockStmt) -> None:
+        self.nested_block(stmt.stmts, indented=False)
+
+    def visit_ifstmt(self, stmt: IfStmt) -> None:
+        cond = self.temp()
+        self.emit(f'{cond} = {stmt.cond.accept(self)}')
+        self.emit(f'if {cond} is True:')
+        self.nested_block(stmt.then_branch.stmts)
+        self.emit(f'elif {cond} is not False:')
+        self.indent += 1
+        self.emit(f'_invalid_condition({cond})')
+        self.indent -= 1
+        if stmt.else_branch:
+            self.emit('else:')
+            self.nested_block(stmt.else_branch.stmts)
+
+    def visit_letstmt(self, stmt: LetStmt) -> None:
+        raise NotClassical
+
+    def visit_forstmt(self, stmt: ForStmt) -> None:
+        binder = self.temp()
+        self.emit(f'for {binder} in {stmt.iterator.accept(self)}:')
+        # Loops are where a runaway computation spends its time, so they
+        # have to answer to the interpreter's budget.
+        self.indent += 1
+        self.emit('if interp.meter is not None: interp.meter.tick()')
+        self.indent -= 1
+        self.nested_block(stmt.body.stmts, f'{stmt.binder.data!r}: {binder}')
+
+    def visit_fnstmt(self, stmt: FnStmt) -> None:
+        raise NotClassical
+
+
+# Runtime support for transpiled code
+
+def _lookup(env: Environment, name: str) -> Any:
+    """Read a name without moving it. This is only valid because native code
+    never sees a linear value."""
+    scope = env
+    while scope is not None:
+        values = scope.values
+        if name in values:
+            value = values[name]
+            if value is None:
+                raise MovedValueError(name)
+            return value
+        scope = scope.enclosing
+    raise UnboundNameError(name)
+
+
+def _assign(env: Environment, name: str, value: Any) -> None:
+    """The same assignment semantics as `Environment.__setitem__`"""
+    scope = env
+    while scope is not None:
+        if name in scope.values:
+            scope.set_key_value(name, value)
+            return
+        scope = scope.enclosing
+    env.set_key_value(name, value)
+
+
+def _invoke(interp, env: Environment, callee: AbstractFunction,
+            args: List[Any], paren) -> Any:
+    if len(args) != callee.arity:
+        # Imported here to avoid a circular import with the interpreter
+        from interpreter import InterpreterError
+        raise InterpreterError(
+            paren,
+            f"Function takes {callee.arity} arguments; got {len(args)}.")
+    if not isinstance(callee, Function):
+        return callee.call(interp, args)
+    meter = interp.meter
+    if meter is None:
+        return callee.native(interp, env, args)
+    meter.enter_call()
+    try:
+        return callee.native(interp, env, args)
+    finally:
+        meter.exit_call()
+
+
+def _invalid_condition(value: Any) -> None:
+    from interpreter import _TypeError
+    raise _TypeError(f"{value} is an invalid type in a condition")
+
+
+NATIVE_GLOBALS = {
+    'Array': Array,
+    'Environment': Environment,
+    '_lookup': _lookup,
+    '_assign': _assign,
+    '_invoke': _invoke,
+    '_invalid_condition': _invalid_condition,
+}
+
+
+def _resolve(env: Environment, name: str):
+    """Look up a name without side effects, returning a (found, value) pair"""
+    scope = env
+    while scope is not None:
+        if name in scope.values:
+            return True, scope.values[name]
+        scope = scope.enclosing
+    return False, None
+
+
+# Stands in for an unbound name in a memoization key
+_UNBOUND = object()
+
+
+def _key_of(value: Any):
+    # `True == 1`, but they aren't interchangeable as Cavy values.
+    return (type(value), value)
+
+
+class NativeFunction:
+    """A classical function compiled to Python. Calling it has exactly the
+    same effect as `Function.call`, provided that `admits` holds."""
+
+    def __init__(self, fn: Function, summary: ClassicalSummary,
+                 transpiler: Transpiler):
+        self.fn = fn
+        self.summary = summary
+        self.source = '\n'.join(transpiler.lines) + '\n'
+        namespace = dict(NATIVE_GLOBALS, **transpiler.constants)
+        exec(compile(self.source, f'<cavy native {fn.name or "fn"}>', 'exec'), namespace)
+        self.code = namespace['native']
+
+    def __call__(self, interp, enclosing: Environment, args: List[Any]) -> Any:
+        cache = self.fn.cache
+        if self.summary.prints or not cache.enabled:
+            return self.code(interp, enclosing, args)
+        dependencies = self.dependencies(enclosing)
+        if dependencies is None:
+            return self.code(interp, enclosing, args)
+        reads, writes = dependencies
+
+        # Only assignments to names that are already bound outside the call
+        # escape it; any other name is bound locally. A name in `writes` may
+        # still only be assigned where it's bound locally, as by a loop, so
+        # the values of the escaping names are part of the key: replaying
+        # such a name's recorded value then leaves it as it was.
+        escaping = tuple(name for name in writes if _resolve(enclosing, name)[0])
+        read_keys = []
+        for name in reads + escaping:
+            found, value = _resolve(enclosing, name)
+            read_keys.append(_key_of(value) if found else _UNBOUND)
+        key = (tuple(map(_key_of, args)), tuple(read_keys), escaping)
+
+        effects = cache.lookup(key)
+        if effects is None:
+            self.code(interp, enclosing, args)
+            effects = tuple((name, _resolve(enclosing, name)[1])
+                            for name in escaping)
+            cache.store(key, effects)
+        else:
+            for name, value in effects:
+                _assign(enclosing, name, value)
+        return None
+
+    def dependencies(self, env: Environment):
+        """The names that a call to this function, and anything it calls, could
+        read and write, as a pair of sorted tuples. Assignments to parameters
+        are left out of the writes: the parameters of this function are bound
+        within the call for all of it, and those of a callee within its own
+        call. Returns `None` if the call could print anything, and so can't be
+        memoized."""
+        reads, writes = set(), set()
+        stack, seen = [self.fn], set()
+        while stack:
+            fn = stack.pop()
+            if fn in seen:
+                continue
+            seen.add(fn)
+            summary = fn.native.summary
+            if summary.prints:
+                return None
+            reads |= summary.reads - summary.params
+            writes |= summary.writes - summary.params
+            for name in summary.callees:
+                callee = _resolve(env, name)[1]
+                if not isinstance(callee, Function) or native_function(callee) is None:
+                    return None
+                stack.append(callee)
+        writes -= self.summary.params
+        return tuple(sorted(reads)), tuple(sorted(writes))
+
+    def admits(self, env: Environment, args: List[Any]) -> bool:
+        """Whether a call with these arguments, made in this environment, is
+        guaranteed to be classical."""
+        if any(is_linear(arg) for arg in args):
+            return False
+        callees, bound = set(), set()
+        if not _closure_admits(self.fn, env, set(), callees, bound):
+            return False
+        # A callee must resolve to the same function everywhere within the
+        # call, so it cannot be shadowed by any function's local names.
+        return callees.isdisjoint(bound)
+
+
+def _closure_admits(fn: Function, env: Environment, seen: Set[Function],
+                    callees: Set[str], bound: Set[str]) -> bool:
+    """Check every value that `fn`, or any function it could call, might read
+    from `env`."""
+    if fn in seen:
+        return True
+    seen.add(fn)
+    native = native_function(fn)
+    if native is None:
+        return False
+    summary = native.summary
+    callees |= summary.callees
+    bound |= summary.locals()
+    for name in summary.reads - summary.params:
+        found, value = _resolve(env, name)
+        if not found:
+            if name in summary.callees:
+                return False
+            continue
+        if value is None or is_linear(value):
+            return False
+        if isinstance(value, Function):
+            if not _closure_admits(value, env, seen, callees, bound):
+                return False
+        elif isinstance(value, AbstractFunction):
+            if not value.classical:
+                return False
+        elif name in summary.callees:
+            return False
+    return True
+
+
+def native_function(fn: Function) -> Optional[NativeFunction]:
+    """Get the native form of a function, transpiling it on first use. Returns
+    `None` if the function may have quantum effects."""
+    if not fn.analyzed:
+        fn.analyzed = True
+        params = [param.data for param in fn.params]
+        summary = ClassicalAnalysis(params).analyze(fn.body)
+        if summary is not None:
+            transpiler = Transpiler().transpile(params, fn.body)
+            fn.native = NativeFunction(fn, summary, transpiler)
+    return fn.native
@@ -1,10 +1,12 @@
 from contextlib import contextmanager
-from typing import Any, List
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
 
-from circuits.circuit import Circuit
+from budget import Budget, BudgetMeter
+from circuits.circuit import Circuit, CircuitSnapshot, CountingCircuit
 import circuits.gates as gates
-from environment import Environment
-from functions import BUILTINS, AbstractFunction, Function
+from environment import Environment, EnvironmentSnapshot
+from functions import BUILTINS, AbstractFunction, Function, native_function
 from lang_ast import *
 from lang_token import TokenType
 from lang_types import Array, Qubit, QubitMeasurement, is_linear
@@ -18,10 +20,28 @@ class _TypeError(InterpreterError):
     pass
 
 
+@dataclass(frozen=True)
+class InterpreterSnapshot:
+    environment: EnvironmentSnapshot
+    circuit: CircuitSnapshot
+
+
 class Interpreter(ExprVisitor, StmtVisitor):
-    def __init__(self):
+    def __init__(self, budget: Optional[Budget] = None, spill: Union[bool, str] = False,
+                 materialize: bool = True, native: bool = True):
         self.environment = Environment(defaults=BUILTINS)
-        self.circuit = Circuit()
+        # See `Circuit` for the meaning of `spill`. Unless `materialize`, gates
+        # are only counted, for a resource estimate.
+        if materialize:
+            self.circuit = Circuit(spill=spill)
+        else:
+            self.circuit = CountingCircuit()
+        # The same meter is shared by everything that consumes resources
+        self.meter = BudgetMeter(budget) if budget is not None else None
+        self.circuit.meter = self.meter
+        self.environment.qubits.meter = self.meter
+        # Unless `native`, classical functions are tree-walked like any other
+        self.native = native
 
     def visit_binop(self, expr: BinOp) -> Any:
         left = self.evaluate(expr.left)
@@ -41,6 +61,7 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_unop(self, expr: UnOp) -> Any:
         right = self.evaluate(expr.right)
         token_type = expr.op.token_type
+        self.circuit.location = expr.op.location.line
 
         if token_type == TokenType.TILDE:
             if isinstance(right, Qubit):
@@ -100,6 +121,10 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return Array([self.evaluate(expr.item) for head in range(reps)])
 
     def visit_index(self, expr: Index) -> Any:
+        if isinstance(expr.root, Variable):
+            # Indexing a named array moves only the element, not the array.
+            index = self.evaluate(expr.index)
+            return self.environment._getelement(expr.root, index)
         root = self.evaluate(expr.root)
         index = self.evaluate(expr.index)
         return root[index]
@@ -113,8 +138,26 @@ class Interpreter(ExprVisitor, StmtVisitor):
             raise InterpreterError(
                 expr.paren,
                 f"Function takes {callee.arity} arguments; got {len(args)}.")
+        self.circuit.location = expr.paren.location.line
+        if isinstance(callee, Function):
+            return self.call_function(callee, args)
         return callee.call(self, args)
 
+    def call_function(self, fn: Function, args: List[Any]) -> Any:
+        meter = self.meter
+        if meter is not None:
+            meter.enter_call()
+        try:
+            # Classical functions skip the tree-walk entirely, if this call
+            # can't see any linear values.
+            native = native_function(fn) if self.native else None
+            if native is not None and native.admits(self.environment, args):
+                return native(self, self.environment, args)
+            return fn.call(self, args)
+        finally:
+            if meter is not None:
+                meter.exit_call()
+
     def visit_exprstmt(self, stmt: ExprStmt) -> None:
         self.evaluate(stmt.expr)
 
@@ -133,7 +176,12 @@ class Interpreter(ExprVisitor, StmtVisitor):
         # time being I’m not sure there’s a substantially cleaner way to
         # accomplish it.
         if isinstance(value, QubitMeasurement):
-            self.circuit.qubit_labels[stmt.lhs.data] = value.index
+            self.circuit.label_qubit(stmt.lhs.data, value.index)
+
+    def visit_indexassnstmt(self, stmt: IndexAssnStmt) -> None:
+        value = self.evaluate(stmt.rhs)
+        index = self.evaluate(stmt.index)
+        self.environment.set_element(Variable(stmt.lhs), index, value)
 
     def visit_blockstmt(self, stmt: BlockStmt) -> None:
         self.execute_blockstmt(stmt.stmts, Environment(self.environment))
@@ -183,7 +231,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
     def visit_fnstmt(self, stmt: FnStmt) -> None:
         """Define a function!
         """
-        self.environment[Variable(stmt.name)] = Function(stmt.params, stmt.body)
+        self.environment[Variable(stmt.name)] = Function(stmt.params, stmt.body,
+                                                         name=stmt.name.data)
 
     def evaluate(self, expr: Expression) -> Any:
         return expr.accept(self)
@@ -209,8 +258,10 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
         basis_transformation = []
         bindings = []
+        element_bindings = []
         add_gates_old = self.circuit.add_gates
         getitem_old = self.environment._getitem
+        getelement_old = self.environment._getelement
 
         def add_gates_new(gates):
             # Just collect the active transformation; don’t apply it yet!
@@ -223,9 +274,17 @@ class Interpreter(ExprVisitor, StmtVisitor):
                 bindings.append((var, value))
             return value
 
+        def getelement_new(var, index):
+            value = getelement_old(var, index)
+            if is_linear(value):
+                element_bindings.append((var, index, value))
+            return value
+
         self.circuit.add_gates = add_gates_new
         self.environment._getitem = getitem_new
+        self.environment._getelement = getelement_new
         val = self.evaluate(expr)
+        self.environment._getelement = getelement_old
         self.environment._getitem = getitem_old
         self.circuit.add_gates = add_gates_old
 
@@ -242,11 +301,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
             # After uncomputing the basis change, re-bind names that were used
             for name, value in bindings:
                 self.environment[name] = value
+            for name, index, value in element_bindings:
+                self.environment.set_element(name, index, value)
 
     def execute(self, stmt: Statement) -> None:
         """Because of Python's dynamic typing, `execute` actually does exactly the same
         thing as `evaluate`. The distinction is preserved as a usage hint.
         """
+        if self.meter is not None:
+            self.meter.tick()
         return stmt.accept(self)
 
     def execute_blockstmt(self, stmts: List[Statement],
@@ -261,6 +324,17 @@ class Interpreter(ExprVisitor, StmtVisitor):
         finally:
             self.environment = prev
 
+    def snapshot(self) -> InterpreterSnapshot:
+        """Capture the interpreter's state in constant time. The environment and
+        circuit share their structure with the snapshot, and are only copied
+        when they are next changed."""
+        return InterpreterSnapshot(self.environment.snapshot(),
+                                   self.circuit.snapshot())
+
+    def restore(self, snapshot: InterpreterSnapshot) -> None:
+        self.environment = Environment.restore(snapshot.environment)
+        self.circuit.restore(snapshot.circuit)
+
     def interpret(self, statements: List[Statement]) -> None:
         for stmt in statements:
             self.execute(stmt)
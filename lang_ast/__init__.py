@@ -1,4 +1,4 @@
 from .ast_impl import Expression, Declaration, Statement
 from .ast_impl import ExprVisitor, StmtVisitor
 from .ast_impl import BinOp, UnOp, Literal, Group, Variable, ExtensionalArray, IntensionalArray, Index, Call
-from .ast_impl import ExprStmt, PrintStmt, AssnStmt, BlockStmt, IfStmt, LetStmt, ForStmt, FnStmt
+from .ast_impl import ExprStmt, PrintStmt, AssnStmt, IndexAssnStmt, BlockStmt, IfStmt, LetStmt, ForStmt, FnStmt
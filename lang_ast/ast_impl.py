@@ -97,6 +97,11 @@ STMT_NODES = {
         'lhs': Token,
         'rhs': Expression,
     },
+    'IndexAssnStmt': {
+        'lhs': Token,
+        'index': Expression,
+        'rhs': Expression,
+    },
     'BlockStmt': {
         'stmts': List[Statement]
     },
@@ -207,11 +207,22 @@ class Parser:
         self.consume(TokenType.RBRACE, "missing '}' at end of block")
         return BlockStmt(statements)
 
-    def expr_statement(self) -> ExprStmt:
+    def expr_statement(self) -> Statement:
         expr = self.expression()
+        if self.match_tokens(TokenType.LESSMINUS):
+            return self.index_assignment(expr)
         self.consume(TokenType.SEMICOLON, "missing ';' after expression")
         return ExprStmt(expr)
 
+    def index_assignment(self, target: Expression) -> IndexAssnStmt:
+        """Production rule for assignment to an array element, where the '<-'
+        has already been consumed."""
+        if not (isinstance(target, Index) and isinstance(target.root, Variable)):
+            self.error(self.prev(), "can only assign to a name or an array element")
+        rhs = self.expression()
+        self.consume(TokenType.SEMICOLON, "missing ';' after expression")
+        return IndexAssnStmt(target.root.name, target.index, rhs)
+
     def expression(self):
         lhs = self.unary()
         return self.parse_precedence_climbing(lhs, 0)
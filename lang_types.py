@@ -62,10 +62,49 @@ class Qubit(CavyType):
 
 
 class Array(CavyType):
+    """An array of values. Arrays of linear values track the ownership of
+    each element, so that one element can be moved out without moving the
+    rest. Arrays are never mutated: moving an element out or back in makes a
+    new array sharing the same `values` list.
+    """
 
-    def __init__(self, values: List):
+    def __init__(self, values: List, moved: int = 0):
         self._discipline = max(map(_get_discipline, values))
         self.values = values
+        # A bitmap of the elements that have been moved out of the array
+        self.moved = moved
+
+    def _derive(self, values: List, moved: int) -> 'Array':
+        """Make an array like this one without recomputing its discipline"""
+        arr = Array.__new__(Array)
+        arr._discipline = self._discipline
+        arr.values = values
+        arr.moved = moved
+        return arr
+
+    def position(self, index: int) -> int:
+        """Normalize an index, raising `IndexError` if it's out of range"""
+        return range(len(self.values))[index]
+
+    def is_moved(self, index: int) -> bool:
+        return bool(self.moved >> self.position(index) & 1)
+
+    def without(self, index: int) -> 'Array':
+        """This array, with one element moved out"""
+        return self._derive(self.values, self.moved | 1 << self.position(index))
+
+    def with_element(self, index: int, value) -> 'Array':
+        """This array, with a value moved into one position"""
+        pos = self.position(index)
+        moved = self.moved & ~(1 << pos)
+        if self.values[pos] is value:
+            # The usual case: an element is returned to where it came from.
+            return self._derive(self.values, moved)
+        values = list(self.values)
+        values[pos] = value
+        arr = self._derive(values, moved)
+        arr._discipline = max(self._discipline, _get_discipline(value))
+        return arr
 
     def __getitem__(self, index: int):
         return self.values[index]
@@ -1,3 +1,4 @@
+from collections import deque
 from contextlib import redirect_stderr
 import datetime
 from io import StringIO
@@ -33,6 +34,9 @@ GOODBYE = """
 Thanks for hacking with us!
 """
 
+# The number of lines that can be undone with ':undo'
+UNDO_DEPTH = 1000
+
 CONTACT_DEVELOPER = f"""Interpreter error: please contact the developer.
 
 It will be helpful to send the crash log at `{config.CRASHLOG}`.
@@ -92,6 +96,10 @@ class Repl:
         self.interpreter = Interpreter()
         self.history = []
         self.debug = debug
+        # Interpreter snapshots taken before each line, for ':undo'
+        self.undo_stack = deque(maxlen=UNDO_DEPTH)
+        # Named snapshots, for ':checkpoint' and ':restore'
+        self.checkpoints = {}
 
     def interact(self):
         print(GREETING)
@@ -123,6 +131,18 @@ class Repl:
                     circuit = self.interpreter.circuit
                     print(circuit.to_qasm())
                     continue
+                elif (line_args := line.split())[0] == ':resources':
+                    print(self.interpreter.circuit.estimate_resources())
+                    continue
+                elif (line_args := line.split())[0] == ':undo':
+                    self.undo()
+                    continue
+                elif (line_args := line.split())[0] == ':checkpoint':
+                    self.checkpoint(*line_args[1:])
+                    continue
+                elif (line_args := line.split())[0] == ':restore':
+                    self.restore(*line_args[1:])
+                    continue
                 elif (line_args := line.split())[0] == ':debug':
                     if len(line_args) == 1:
                         breakpoint()
@@ -146,6 +166,7 @@ class Repl:
                     for err in parser.errors:
                         pprint_parse_error(err)
                     continue
+                self.push_undo()
                 self.interpreter.execute(stmt)
 
             except CavyRuntimeError as err:
@@ -164,6 +185,34 @@ class Repl:
                     print(err)
                 self.crash_report(err)
 
+    def push_undo(self) -> None:
+        self.undo_stack.append(self.interpreter.snapshot())
+
+    def undo(self) -> None:
+        """Return to the state before the last line (or ':restore')"""
+        if not self.undo_stack:
+            print("Nothing to undo.")
+            return
+        self.interpreter.restore(self.undo_stack.pop())
+
+    def checkpoint(self, *args) -> None:
+        """Save the current state under a name"""
+        if len(args) != 1:
+            print("Usage: :checkpoint NAME")
+            return
+        self.checkpoints[args[0]] = self.interpreter.snapshot()
+
+    def restore(self, *args) -> None:
+        """Return to a named checkpoint. This can itself be undone."""
+        if len(args) != 1:
+            print("Usage: :restore NAME")
+            return
+        if (snapshot := self.checkpoints.get(args[0])) is None:
+            print(f"No checkpoint named '{args[0]}'.")
+            return
+        self.push_undo()
+        self.interpreter.restore(snapshot)
+
     def crash_report(self, err: Exception) -> None:
         """Dump error data to a log file."""
 
@@ -1,4 +1,4 @@
-from environment import MovedValueError
+from environment import MovedValueError, OccupiedElementError, PartiallyMovedError
 from .templates import circuit_test_template, stmt_test_template
 
 import circuits.gates as gates
@@ -67,3 +67,72 @@ def test_qubit_array_vectorized_gates():
          (gates.HadamardGate, [1]),
          (gates.HadamardGate, [2])] * 2
     )
+
+def test_qubit_array_element_moves():
+    circuit_test_template("""
+        reg <- [?false; 3];
+        a <- reg[0];
+        b <- reg[2];
+        a <- ~a;
+        b <- split(b);
+        """,
+        [(gates.NotGate, [0]),
+         (gates.HadamardGate, [2])]
+    )
+
+def test_qubit_array_element_no_cloning():
+    circuit_test_template("""
+        reg <- [?false; 2];
+        a <- reg[0];
+        b <- reg[0];
+        """,
+        [],
+        exception=MovedValueError
+    )
+
+def test_qubit_array_partially_moved():
+    circuit_test_template("""
+        reg <- [?false; 2];
+        a <- reg[0];
+        r <- reg;
+        """,
+        [],
+        exception=PartiallyMovedError
+    )
+
+def test_qubit_array_in_place():
+    circuit_test_template("""
+        reg <- [?false; 2];
+        reg[0] <- ~reg[0];
+        reg[1] <- split(reg[1]);
+        for q in reg {
+            q <- flip(q);
+        }
+        """,
+        [(gates.NotGate, [0]),
+         (gates.HadamardGate, [1]),
+         (gates.ZGate, [0]),
+         (gates.ZGate, [1])]
+    )
+
+def test_qubit_array_occupied_element():
+    circuit_test_template("""
+        reg <- [?false; 2];
+        reg[0] <- ?false;
+        """,
+        [],
+        exception=OccupiedElementError
+    )
+
+def test_qubit_array_controls_in_place():
+    circuit_test_template("""
+        reg <- [?false; 3];
+        for i in 0..2 {
+            if reg[i] {
+                reg[i + 1] <- ~reg[i + 1];
+            }
+        }
+        """,
+        [(gates.CnotGate, [0, 1]),
+         (gates.CnotGate, [1, 2])]
+    )
@@ -0,0 +1,60 @@
+import pytest
+
+from circuits.binary import CircuitFormatError, MappedColumns
+from circuits.circuit import Circuit
+import circuits.gates as gates
+
+from .test_columns import gate_tuples, sample_gates
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'circuit.cvyc')
+    circuit = Circuit.from_gates(sample_gates(), {'a': 0, 'bé': 2})
+    circuit.save(path)
+    loaded = Circuit.load(path)
+    assert isinstance(loaded.columns, MappedColumns)
+    assert gate_tuples(loaded.gates) == gate_tuples(sample_gates())
+    assert loaded.qubit_labels == {'a': 0, 'bé': 2}
+    assert loaded.stats() == circuit.stats()
+
+
+def test_source_map_saved(tmp_path):
+    path = str(tmp_path / 'circuit.cvyc')
+    circuit = Circuit(locations=True)
+    circuit.location = 7
+    circuit.add_gates([gates.NotGate(0), gates.ZGate(1)])
+    circuit.save(path)
+    assert list(Circuit.load(path).columns.locations) == [7, 7]
+
+
+def test_append_copies(tmp_path):
+    path = str(tmp_path / 'circuit.cvyc')
+    Circuit.from_gates(sample_gates()).save(path)
+    loaded = Circuit.load(path)
+    snapshot = loaded.snapshot()
+    loaded.add_gates([gates.HadamardGate(5)])
+    assert not loaded.columns.mapped
+    assert len(loaded.gates) == len(sample_gates()) + 1
+    assert len(Circuit.load(path).gates) == len(sample_gates())
+    loaded.restore(snapshot)
+    assert gate_tuples(loaded.gates) == gate_tuples(sample_gates())
+
+
+def test_save_over_own_file(tmp_path):
+    path = str(tmp_path / 'circuit.cvyc')
+    gates_ = [gates.CnotGate(i % 7, (i + 1) % 7) for i in range(10000)]
+    Circuit.from_gates(gates_, {'a': 3}).save(path)
+    loaded = Circuit.load(path)
+    loaded.save(path)
+    assert gate_tuples(loaded.gates) == gate_tuples(gates_)
+    reloaded = Circuit.load(path)
+    assert gate_tuples(reloaded.gates) == gate_tuples(gates_)
+    assert reloaded.qubit_labels == {'a': 3}
+    assert [p.name for p in tmp_path.iterdir()] == ['circuit.cvyc']
+
+
+def test_not_a_circuit(tmp_path):
+    path = tmp_path / 'bogus.cvyc'
+    path.write_bytes(b'OPENQASM 2.0;' * 10)
+    with pytest.raises(CircuitFormatError):
+        Circuit.load(str(path))
@@ -0,0 +1,84 @@
+import pytest
+
+from budget import Budget, BudgetExceededError
+from compilation import Program
+from interpreter import Interpreter
+from lang_parser import Parser
+from lexer import Lexer
+
+
+def run_with_budget(code: str, budget: Budget) -> Interpreter:
+    interpreter = Interpreter(budget=budget)
+    interpreter.interpret(Parser(Lexer(code).lex()).parse())
+    return interpreter
+
+
+def test_within_budget():
+    interpreter = run_with_budget("""
+    q <- ?false;
+    for i in 0..10 {
+        q <- ~q;
+    }
+    """, Budget(max_gates=10, max_qubits=1))
+    assert len(interpreter.circuit.gates) == 10
+
+
+def test_gate_budget():
+    with pytest.raises(BudgetExceededError) as err:
+        run_with_budget("""
+        q <- ?false;
+        for i in 0..1000000 {
+            q <- ~q;
+        }
+        """, Budget(max_gates=100))
+    assert err.value.resource == 'gate'
+    assert err.value.usage.gates == 101
+
+
+def test_qubit_budget():
+    with pytest.raises(BudgetExceededError) as err:
+        run_with_budget("reg <- [?false; 1000000];", Budget(max_qubits=8))
+    assert err.value.usage.qubits == 9
+
+
+def test_nested_scopes_share_qubits():
+    interpreter = run_with_budget("""
+    q <- ?false;
+    {
+        r <- ?false;
+    }
+    """, Budget(max_qubits=2))
+    assert interpreter.environment.qubits.least_free == 2
+
+
+def test_depth_budget():
+    with pytest.raises(BudgetExceededError) as err:
+        run_with_budget("""
+        fn forever(n) {
+            forever(n + 1);
+        }
+        forever(0);
+        """, Budget(max_depth=50))
+    assert err.value.resource == 'call depth'
+
+
+def test_time_budget():
+    with pytest.raises(BudgetExceededError) as err:
+        run_with_budget("""
+        x <- 0;
+        for i in 0..1000000000 {
+            x <- x + 1;
+        }
+        """, Budget(max_seconds=0.05, check_interval=64))
+    assert err.value.resource == 'time'
+
+
+def test_program_compile_raises():
+    program = Program("""
+    q <- ?false;
+    for i in 0..1000 {
+        q <- ~q;
+    }
+    """)
+    with pytest.raises(BudgetExceededError):
+        program.compile(budget=Budget(max_gates=10))
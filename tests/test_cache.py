@@ -0,0 +1,63 @@
+import os
+
+from budget import Budget
+from circuits.cache import CircuitCache, cache_key
+from circuits.circuit import Circuit
+from compilation import Program
+import circuits.gates as gates
+
+from .test_columns import gate_tuples
+
+SOURCE = """
+a <- split(?false); b <- ?false;
+if a { b <- ~b; }
+c <- !b;
+"""
+
+
+def test_compile_hits(tmp_path):
+    cache = CircuitCache(str(tmp_path))
+    first = Program(SOURCE).compile(opt_level=1, cache=cache)
+    second = Program(SOURCE).compile(opt_level=1, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert gate_tuples(second.gates) == gate_tuples(first.gates)
+    assert second.qubit_labels == first.qubit_labels
+
+
+def test_key_includes_settings():
+    assert cache_key(SOURCE, opt_level=0) != cache_key(SOURCE, opt_level=1)
+    assert cache_key(SOURCE, opt_level=0) != cache_key(SOURCE + ' ', opt_level=0)
+    assert cache_key(SOURCE, opt_level=0) == cache_key(SOURCE, opt_level=0)
+
+
+def test_budget_bypasses_cache(tmp_path):
+    cache = CircuitCache(str(tmp_path))
+    Program(SOURCE).compile(budget=Budget(max_gates=100), cache=cache)
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert cache.entries() == []
+
+
+def test_lru_eviction(tmp_path):
+    circuit = Circuit.from_gates([gates.NotGate(i) for i in range(64)])
+    cache = CircuitCache(str(tmp_path), max_bytes=10**6)
+    for key in 'abc':
+        cache.put(key, circuit)
+    size = os.path.getsize(cache.path('a'))
+    # Make 'a' the oldest entry, then use it, leaving 'b' the least recent
+    for age, key in enumerate('cba'):
+        os.utime(cache.path(key), (1000 - age, 1000 - age))
+    assert cache.get('a') is not None
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert not os.path.exists(cache.path('b'))
+    assert os.path.exists(cache.path('a')) and os.path.exists(cache.path('c'))
+    assert cache.evictions == 1
+
+
+def test_damaged_entry_is_a_miss(tmp_path):
+    cache = CircuitCache(str(tmp_path))
+    with open(cache.path('bad'), 'wb') as f:
+        f.write(b'not a circuit')
+    assert cache.get('bad') is None
+    assert cache.misses == 1
+    assert not os.path.exists(cache.path('bad'))
@@ -0,0 +1,146 @@
+from circuits.circuit import Circuit
+from circuits.columns import GateColumns
+import circuits.gates as gates
+
+import numpy as np
+
+
+def sample_gates():
+    return [
+        gates.HadamardGate(0),
+        gates.CnotGate(0, 1),
+        gates.TGate(1, conj=True),
+        gates.TGate(1),
+        gates.NotGate(2),
+        gates.ZGate(0),
+        gates.StrongMeasurementGate(1),
+        gates.TGate(2, conj=True),
+        gates.CnotGate(2, 0),
+    ]
+
+
+def gate_tuples(gates_):
+    return [(type(gate), tuple(gate.qubits), gate.conj) for gate in gates_]
+
+
+def test_round_trip():
+    columns = GateColumns()
+    columns.extend(sample_gates())
+    assert len(columns) == 9
+    assert gate_tuples(columns) == gate_tuples(sample_gates())
+
+
+def test_gate_view_indexing():
+    circuit = Circuit.from_gates(sample_gates())
+    assert gate_tuples([circuit.gates[-1]]) == gate_tuples(sample_gates()[-1:])
+    assert gate_tuples(circuit.gates[2:4]) == gate_tuples(sample_gates()[2:4])
+
+
+def test_copy_prefix():
+    columns = GateColumns()
+    columns.extend(sample_gates())
+    prefix = columns.copy(3)
+    prefix.append(gates.TGate(0))
+    assert gate_tuples(prefix) == gate_tuples(sample_gates()[:3] + [gates.TGate(0)])
+
+
+def test_compact():
+    columns = GateColumns()
+    columns.extend(sample_gates() * 1000)
+    assert columns.nbytes < 16 * len(columns)
+
+
+def test_source_locations():
+    circuit = Circuit(locations=True)
+    circuit.location = 7
+    circuit.add_gates(sample_gates())
+    assert list(circuit.columns.locations) == [7] * 9
+
+
+def test_numpy_columns():
+    columns = GateColumns()
+    columns.extend(sample_gates())
+    arrays = columns.to_numpy()
+    assert list(arrays['opcodes']) == [gate.opcode for gate in sample_gates()]
+    assert list(arrays['operands1'][:2]) == [-1, 1]
+    assert np.array_equal(arrays['conj'], [gate.conj for gate in sample_gates()])
+
+
+def test_running_stats():
+    circuit = Circuit()
+    circuit.add_gates([gates.HadamardGate(0), gates.CnotGate(0, 1)])
+    circuit.add_gates([gates.TGate(2), gates.NotGate(1)])
+    stats = circuit.stats()
+    assert stats.gates == 4
+    assert stats.width == 3 and stats.qubits == {0, 1, 2}
+    assert stats.depth == 3
+    assert stats.counts == {'HadamardGate': 1, 'CnotGate': 1, 'TGate': 1, 'NotGate': 1}
+    assert stats.qubit_counts == {0: 2, 1: 2, 2: 1}
+    assert stats.qubit_depths == {0: 2, 1: 3, 2: 1}
+
+
+def test_stats_after_restore():
+    circuit = Circuit()
+    circuit.add_gates([gates.HadamardGate(0)])
+    snapshot = circuit.snapshot()
+    circuit.add_gates([gates.CnotGate(0, 1), gates.ZGate(1)])
+    assert circuit.depth == 3
+    circuit.restore(snapshot)
+    assert circuit.stats().gates == 1
+    assert circuit.all_qubits() == {0}
+    circuit.add_gates([gates.NotGate(3)])
+    assert circuit.width == 2 and circuit.depth == 1
+
+
+def test_restore_keeps_stats():
+    circuit = Circuit()
+    circuit.add_gates([gates.HadamardGate(0), gates.CnotGate(0, 1)])
+    snapshot = circuit.snapshot()
+    circuit.add_gates([gates.ZGate(2)] * 3)
+    circuit.restore(snapshot)
+    assert circuit.running is not None
+    assert circuit.stats() == Circuit.from_gates(circuit.gates).stats()
+    # The snapshot's statistics aren't changed by the restored circuit's gates
+    circuit.add_gates([gates.TGate(1)])
+    circuit.restore(snapshot)
+    assert circuit.depth == 2 and circuit.stats().gates == 2
+
+
+def test_restore_reads_shared_gates():
+    circuit = Circuit()
+    circuit.add_gates([gates.HadamardGate(0), gates.NotGate(1)])
+    snapshot = circuit.snapshot()
+    other = Circuit()
+    other.restore(snapshot)
+    assert other.columns.mapped
+    # Each circuit's next gates are its own
+    other.add_gates([gates.ZGate(0)])
+    circuit.add_gates([gates.SGate(1)])
+    assert [type(gate) for gate in other.gates][-1] is gates.ZGate
+    assert [type(gate) for gate in circuit.gates][-1] is gates.SGate
+    assert len(other.gates) == len(circuit.gates) == 3
+
+
+def test_schedule_asap_alap():
+    circuit = Circuit.from_gates([
+        gates.HadamardGate(0),
+        gates.NotGate(2),
+        gates.CnotGate(0, 1),
+        gates.TGate(1),
+    ])
+    asap = circuit.schedule('asap')
+    assert list(asap.moments) == [0, 0, 1, 2]
+    assert asap.depth == circuit.depth == 3
+    assert asap.critical_path == [0, 2, 3]
+    alap = circuit.schedule('alap')
+    assert list(alap.moments) == [0, 2, 1, 2]
+    assert alap.critical_path == [0, 2, 3]
+    assert alap.layers() == [[0], [2], [1, 3]]
+
+
+def test_moments_disjoint():
+    moments = Circuit.from_gates(sample_gates()).moments()
+    assert sum(map(len, moments)) == len(sample_gates())
+    for moment in moments:
+        qubits = [q for gate in moment for q in gate.qubits]
+        assert len(qubits) == len(set(qubits))
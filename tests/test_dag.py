@@ -0,0 +1,94 @@
+import random
+
+from circuits.circuit import Circuit
+from circuits.dag import CircuitDag, cancel_commuting, commutes
+import circuits.gates as gates
+
+import numpy as np
+
+
+def test_wires():
+    dag = CircuitDag([gates.HadamardGate(0), gates.CnotGate(0, 1), gates.TGate(1)])
+    h, cnot, t = dag.nodes
+    assert dag.successor(h, 0) is cnot
+    assert dag.predecessor(t, 1) is cnot
+    assert dag.predecessor(cnot, 1) is None
+    assert list(dag.wire(1)) == [cnot, t]
+    dag.remove(cnot)
+    assert dag.successor(h, 0) is None
+    assert list(dag.wire(1)) == [t]
+
+
+def test_commutation_table():
+    assert commutes(gates.ZGate(0), gates.CnotGate(0, 1))
+    assert commutes(gates.NotGate(1), gates.CnotGate(0, 1))
+    assert not commutes(gates.NotGate(0), gates.CnotGate(0, 1))
+    assert commutes(gates.CnotGate(0, 1), gates.CnotGate(0, 2))
+    assert not commutes(gates.CnotGate(0, 1), gates.CnotGate(1, 2))
+    assert not commutes(gates.HadamardGate(0), gates.HadamardGate(0))
+    assert commutes(gates.HadamardGate(0), gates.HadamardGate(1))
+
+
+def test_cancel_through_control():
+    circuit = Circuit.from_gates([
+        gates.TGate(0),
+        gates.CnotGate(0, 1),
+        gates.TGate(0, conj=True),
+    ])
+    assert list(circuit.cancel_commuting().gates) == [gates.CnotGate(0, 1)]
+
+
+def test_cancel_cnots_sharing_control():
+    circuit = Circuit.from_gates([
+        gates.CnotGate(0, 1),
+        gates.CnotGate(0, 2),
+        gates.CnotGate(0, 1),
+    ])
+    assert list(circuit.cancel_commuting().gates) == [gates.CnotGate(0, 2)]
+
+
+def unitary(gates_, n):
+    """The unitary of a circuit of Clifford+T gates on n qubits"""
+    h = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+    single = {
+        gates.HadamardGate: h,
+        gates.NotGate: np.array([[0, 1], [1, 0]]),
+        gates.ZGate: np.diag([1, -1]),
+        gates.SGate: np.diag([1, 1j]),
+        gates.TGate: np.diag([1, np.exp(1j * np.pi / 4)]),
+    }
+    state = np.eye(2 ** n, dtype=complex).reshape([2] * n + [2 ** n])
+    for gate in gates_:
+        if isinstance(gate, gates.CnotGate):
+            c, t = gate.qubits
+            state = state.copy()
+            index = [slice(None)] * (n + 1)
+            index[c] = 1
+            sub = state[tuple(index)]
+            axis = t - (t > c)
+            state[tuple(index)] = np.flip(sub, axis=axis)
+        else:
+            m = single[type(gate)]
+            if gate.conj:
+                m = m.conj().T
+            q = gate.qubits[0]
+            state = np.moveaxis(np.tensordot(m, state, axes=([1], [q])), 0, q)
+    return state.reshape(2 ** n, 2 ** n)
+
+
+def test_cancellation_preserves_unitary():
+    rng = random.Random(0)
+    kinds = [gates.HadamardGate, gates.NotGate, gates.ZGate, gates.SGate, gates.TGate]
+    for _ in range(50):
+        gates_ = []
+        for _ in range(30):
+            a = rng.randrange(3)
+            if rng.random() < 0.3:
+                gates_.append(gates.CnotGate(a, (a + rng.randrange(1, 3)) % 3))
+            else:
+                gates_.append(rng.choice(kinds)(a, conj=rng.random() < 0.5))
+        dag = CircuitDag(gates_)
+        removed = cancel_commuting(dag)
+        optimized = dag.gates()
+        assert len(optimized) == len(gates_) - removed
+        assert np.allclose(unitary(gates_, 3), unitary(optimized, 3))
@@ -0,0 +1,91 @@
+import copy
+import gc
+import pickle
+import weakref
+
+from circuits.circuit import Circuit
+from circuits.simulator import simulate
+import circuits.gates as gates
+
+import pytest
+
+
+def test_gates_interned():
+    assert gates.CnotGate(0, 1) is gates.CnotGate(0, 1)
+    assert gates.TGate(2, conj=True) is gates.TGate(2, conj=True)
+    assert gates.TGate(2) is not gates.TGate(2, conj=True)
+    assert gates.NotGate(0) is not gates.ZGate(0)
+
+
+def test_gates_slotted():
+    gate = gates.HadamardGate(3)
+    assert not hasattr(gate, '__dict__')
+    with pytest.raises(AttributeError):
+        gate.conj = True
+
+
+def test_conjugate():
+    t = gates.TGate(1)
+    assert t.conjugate() is gates.TGate(1, conj=True)
+    assert t.conjugate().conjugate() is t
+    assert gates.CnotGate(0, 1).conjugate() is gates.CnotGate(0, 1)
+
+
+def test_controlled_cached():
+    gate = gates.CnotGate(1, 2)
+    expansion = gate.controlled(0)
+    assert len(expansion) == 15
+    assert gate.controlled(0) is expansion
+    assert list(expansion) == gate.with_control(0)
+
+
+@pytest.mark.parametrize('gate', [
+    gates.NotGate(0), gates.ZGate(0), gates.SGate(0), gates.SGate(0, conj=True),
+    gates.SqrtXGate(0), gates.SqrtXGate(0, conj=True), gates.CzGate(0, 1),
+], ids=repr)
+def test_controlled_unitary(gate):
+    # With the control clear, nothing happens; with it set, the gate is applied
+    control = 2
+    for i in range(8):
+        state = [0j] * 8
+        state[i] = 1
+        expected = list(state)
+        if i & 1 << control:
+            simulate([gate], {0: 0, 1: 1}, expected)
+        simulate(gate.controlled(control), {0: 0, 1: 1, 2: 2}, state)
+        assert all(abs(a - b) < 1e-9 for a, b in zip(state, expected))
+
+
+def test_controlled_cache_bounded():
+    gate = gates.CnotGate(0, 1)
+    for control in range(2, 2 * gates.CONTROLLED_EXPANSIONS):
+        gate.controlled(control)
+    assert len(gate._controlled) <= gates.CONTROLLED_EXPANSIONS
+
+
+def test_discarded_gates_collected():
+    circuit = Circuit.from_gates([gates.CnotGate(1000 + i, 2000 + i) for i in range(100)])
+    circuit.gates[0].conjugate()
+    refs = [weakref.ref(gate) for gate in circuit.gates]
+    del circuit
+    gates.clear_gate_cache()
+    gc.collect()
+    assert not any(ref() for ref in refs)
+    # Gates still in use stay interned
+    h = gates.HadamardGate(1000)
+    gates.clear_gate_cache()
+    assert gates.HadamardGate(1000) is h
+
+
+def test_recent_gates_bounded():
+    for i in range(2 * gates.RECENT_GATES):
+        gates.NotGate(5000 + i)
+    gc.collect()
+    assert len(gates._GATES) <= 2 * gates.RECENT_GATES
+
+
+def test_pickle_and_copy():
+    gate = gates.TGate(4, conj=True)
+    assert pickle.loads(pickle.dumps(gate)) is gate
+    assert copy.copy(gate) is gate
+    assert copy.deepcopy([gate])[0] is gate
@@ -0,0 +1,42 @@
+from circuits.circuit import Circuit
+import circuits.gates as gates
+
+
+def test_scratch_qubit_pruned():
+    circuit = Circuit.from_gates([
+        gates.HadamardGate(0),
+        gates.HadamardGate(1),
+        gates.CnotGate(1, 2),
+        gates.StrongMeasurementGate(0),
+        gates.StrongMeasurementGate(2),
+    ], {'a': 0})
+    pruned = circuit.light_cone()
+    assert list(pruned.gates) == [gates.HadamardGate(0), gates.StrongMeasurementGate(0)]
+    assert pruned.qubit_labels == {'a': 0}
+
+
+def test_cone_follows_entanglement():
+    circuit = Circuit.from_gates([
+        gates.TGate(3),
+        gates.HadamardGate(1),
+        gates.CnotGate(1, 3),
+        gates.NotGate(0),
+        gates.StrongMeasurementGate(3),
+    ], {'b': 3})
+    pruned = circuit.light_cone()
+    assert list(pruned.gates) == [
+        gates.TGate(1),
+        gates.HadamardGate(0),
+        gates.CnotGate(0, 1),
+        gates.StrongMeasurementGate(1),
+    ]
+    assert pruned.qubit_labels == {'b': 1}
+
+
+def test_gates_after_measurement_pruned():
+    circuit = Circuit.from_gates([
+        gates.HadamardGate(0),
+        gates.StrongMeasurementGate(0),
+        gates.HadamardGate(0),
+    ], {'c': 0})
+    assert len(circuit.light_cone().gates) == 2
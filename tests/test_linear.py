@@ -0,0 +1,70 @@
+import random
+
+from circuits.circuit import Circuit
+from circuits.linear import AffineMap, resynthesize, synthesize
+import circuits.gates as gates
+
+import numpy as np
+
+from .test_dag import unitary
+
+
+def affine_map(gates_, width):
+    affine = AffineMap(width)
+    for gate in gates_:
+        if isinstance(gate, gates.CnotGate):
+            affine.cnot(*gate.qubits)
+        else:
+            affine.x(gate.qubits[0])
+    return affine
+
+
+def random_cnots(rng, width, length):
+    return [gates.CnotGate(*rng.sample(range(width), 2)) for _ in range(length)]
+
+
+def test_synthesis_computes_map():
+    rng = random.Random(0)
+    for _ in range(100):
+        width = rng.randrange(2, 9)
+        rows = affine_map(random_cnots(rng, width, 30), width).rows
+        for section in (0, 1, 2, 3):
+            cnots = [gates.CnotGate(c, t) for c, t in synthesize(rows, section)]
+            assert affine_map(cnots, width).rows == rows
+
+
+def test_swap_is_kept():
+    swap = [gates.CnotGate(0, 1), gates.CnotGate(1, 0), gates.CnotGate(0, 1)]
+    assert resynthesize(swap) == swap
+
+
+def test_long_block_shrinks():
+    rng = random.Random(1)
+    block = random_cnots(rng, 4, 40) + [gates.NotGate(2)]
+    resynthesized = resynthesize(block)
+    assert len(resynthesized) < len(block)
+    before, after = affine_map(block, 4), affine_map(resynthesized, 4)
+    assert (before.rows, before.constant) == (after.rows, after.constant)
+
+
+def test_blocks_bounded_by_nonlinear_gates():
+    rng = random.Random(2)
+    for _ in range(30):
+        gates_ = []
+        for _ in range(40):
+            a = rng.randrange(4)
+            if rng.random() < 0.7:
+                gates_.append(gates.CnotGate(a, (a + rng.randrange(1, 4)) % 4))
+            else:
+                gates_.append(rng.choice([gates.HadamardGate, gates.TGate])(a))
+        circuit = Circuit.from_gates(gates_)
+        resynthesized = list(circuit.resynthesize_linear().gates)
+        assert len(resynthesized) <= len(gates_)
+        assert np.allclose(unitary(gates_, 4), unitary(resynthesized, 4))
+
+
+def test_packed_matrix():
+    affine = affine_map([gates.CnotGate(0, 9)], 10)
+    packed = affine.to_numpy()
+    assert packed.shape == (10, 2)
+    assert list(packed[9]) == [0b00000001, 0b00000010]
@@ -0,0 +1,103 @@
+import cirq
+
+from circuits.backends import CirqBackend
+from circuits.circuit import Circuit
+from circuits.lowering import measurement_key
+import circuits.gates as gates
+
+
+def sample_gates():
+    return [
+        gates.HadamardGate(0),
+        gates.CnotGate(0, 1),
+        gates.TGate(1, conj=True),
+        gates.SGate(2),
+        gates.TGate(2),
+        gates.ZGate(0),
+        gates.NotGate(2),
+    ]
+
+
+def test_matches_per_gate_lowering():
+    circuit = Circuit.from_gates(sample_gates())
+    qubits = [cirq.GridQubit(i, 0) for i in range(3)]
+    expected = cirq.Circuit(*[gate.to_cirq(qubits) for gate in sample_gates()])
+    assert cirq.allclose_up_to_global_phase(cirq.unitary(circuit.to_cirq()),
+                                            cirq.unitary(expected))
+
+
+def test_moments_follow_schedule():
+    circuit = Circuit.from_gates(sample_gates())
+    lowered = circuit.to_cirq()
+    assert len(lowered) == circuit.depth
+    assert [len(moment) for moment in lowered] == \
+        [len(layer) for layer in circuit.schedule().layers()]
+
+
+def test_sparse_qubits():
+    circuit = Circuit.from_gates([gates.CnotGate(5, 2)])
+    (operation,) = circuit.to_cirq().all_operations()
+    assert operation.qubits == (cirq.GridQubit(5, 0), cirq.GridQubit(2, 0))
+
+
+def test_measurement_keys():
+    circuit = Circuit.from_gates([gates.StrongMeasurementGate(3)])
+    (operation,) = circuit.to_cirq().all_operations()
+    assert cirq.measurement_key_name(operation) == measurement_key(3)
+
+
+def test_sample_last_measurement():
+    # A qubit measured twice reports its last measurement
+    circuit = Circuit.from_gates([
+        gates.StrongMeasurementGate(0),
+        gates.NotGate(0),
+        gates.StrongMeasurementGate(0),
+    ], {'out': 0})
+    sample = CirqBackend().sample_circuit(circuit, 4)
+    assert list(sample['out']) == [True] * 4
+
+
+def test_incremental_lowering():
+    circuit = Circuit()
+    for gate in sample_gates():
+        circuit.add_gates([gate])
+        assert circuit.to_cirq() == Circuit.from_gates(circuit.gates).to_cirq()
+
+
+def test_lowering_invalidated_on_restore():
+    circuit = Circuit()
+    circuit.add_gates(sample_gates()[:2])
+    snapshot = circuit.snapshot()
+    circuit.add_gates(sample_gates()[2:])
+    circuit.to_cirq()
+    circuit.restore(snapshot)
+    assert circuit.to_cirq() == Circuit.from_gates(sample_gates()[:2]).to_cirq()
+
+
+def test_lowering_kept_across_restore():
+    circuit = Circuit()
+    circuit.add_gates(sample_gates()[:2])
+    circuit.to_qasm()
+    snapshot = circuit.snapshot()
+    circuit.add_gates(sample_gates()[2:4])
+    circuit.restore(snapshot)
+    (_, body), = circuit.lowered.values()
+    assert body.length == 2
+    # Gates added after a restore are lowered after those already lowered
+    circuit.add_gates(sample_gates()[4:])
+    assert circuit.to_qasm() == Circuit.from_gates(
+        sample_gates()[:2] + sample_gates()[4:]).to_qasm()
+    assert circuit.lowered[('qasm', 2)][1] is body
+
+
+def test_lowering_of_other_branch_dropped():
+    circuit = Circuit()
+    circuit.add_gates(sample_gates()[:2])
+    base = circuit.snapshot()
+    circuit.add_gates(sample_gates()[2:4])
+    branch = circuit.snapshot()
+    circuit.restore(base)
+    circuit.add_gates(sample_gates()[4:])
+    circuit.to_cirq()
+    circuit.restore(branch)
+    assert circuit.to_cirq() == Circuit.from_gates(sample_gates()[:4]).to_cirq()
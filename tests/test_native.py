@@ -0,0 +1,204 @@
+from contextlib import redirect_stdout
+from io import StringIO
+
+from functions import Function, native_function
+from interpreter import Interpreter
+from lang_parser import Parser
+from lexer import Lexer
+import circuits.gates as gates
+
+import pytest
+
+from .templates import circuit_test_template, stmt_test_template
+
+
+def defined_function(code: str, name: str) -> Function:
+    interpreter = Interpreter()
+    interpreter.interpret(Parser(Lexer(code).lex()).parse())
+    return interpreter.environment.values[name]
+
+
+def test_classical_function_is_native():
+    fn = defined_function("""
+    fn count(n) {
+        for i in 0..n {
+            print i;
+        }
+    }
+    """, 'count')
+    assert native_function(fn) is not None
+
+
+def test_quantum_function_is_not_native():
+    fn = defined_function("""
+    fn make() {
+        q <- ?false;
+    }
+    """, 'make')
+    assert native_function(fn) is None
+
+
+def test_native_recursion():
+    stmt_test_template("""
+    total <- 0;
+    fn up(n, k) {
+        if n == k {
+        } else {
+            total <- total + n;
+            up(n + 1, k);
+        }
+    }
+    up(0, 5);
+    print total;
+    """,
+    ['10'])
+
+
+def test_native_block_scope():
+    stmt_test_template("""
+    x <- 1;
+    fn f(y) {
+        {
+            x <- x + y;
+            z <- 2;
+        }
+        print x;
+    }
+    f(3);
+    print x;
+    """,
+    ['4', '4'])
+
+
+def test_native_arrays():
+    stmt_test_template("""
+    fn f(x) {
+        a <- [x; 3];
+        b <- [x, x * 2];
+        print a[2];
+        print b[1];
+    }
+    f(7);
+    """,
+    ['7', '14'])
+
+
+def test_closure_over_qubit_falls_back():
+    circuit_test_template("""
+    q <- ?false;
+    fn f() {
+        q <- ~q;
+    }
+    f();
+    f();
+    """,
+    [(gates.NotGate, [0])] * 2)
+
+
+def test_qubit_argument_falls_back():
+    circuit_test_template("""
+    fn f(r) {
+        s <- ~r;
+    }
+    f(?false);
+    """,
+    [(gates.NotGate, [0])])
+
+
+def test_pure_function_memoized():
+    fn = defined_function("""
+    r <- 0;
+    fn tri(n) {
+        acc <- 0;
+        for i in 0..n {
+            acc <- acc + i;
+        }
+        r <- acc;
+    }
+    tri(10);
+    r <- 0;
+    tri(10);
+    """, 'tri')
+    info = fn.cache.info()
+    assert info.hits == 1 and info.misses == 1
+
+
+def test_memoized_effects_replayed():
+    stmt_test_template("""
+    r <- 0;
+    fn tri(n) {
+        acc <- 0;
+        for i in 0..n {
+            acc <- acc + i;
+        }
+        r <- acc;
+    }
+    tri(4);
+    r <- 0;
+    tri(4);
+    print r;
+    """,
+    ['6'])
+
+
+@pytest.mark.parametrize('code', [
+    """
+    n <- 0;
+    fn f(n) {
+        n <- n + 1;
+    }
+    f(1);
+    n <- 7;
+    f(1);
+    print n;
+    """,
+    """
+    i <- 0;
+    fn g() {
+        for i in 0..2 {
+            i <- 5;
+        }
+    }
+    g();
+    i <- 7;
+    g();
+    print i;
+    """,
+])
+def test_memoized_local_assignment_not_replayed(code):
+    # Assigning to a name bound within the call doesn't touch a caller's
+    # variable of that name, however often the call is answered from the cache.
+    statements = Parser(Lexer(code).lex()).parse()
+    traces = []
+    for native in (True, False):
+        output = StringIO()
+        with redirect_stdout(output):
+            Interpreter(native=native).interpret(statements)
+        traces.append(output.getvalue().split())
+    assert traces == [['7'], ['7']]
+
+
+def test_printing_function_not_memoized():
+    fn = defined_function("""
+    fn show(n) {
+        print n;
+    }
+    show(1);
+    show(1);
+    """, 'show')
+    assert fn.cache.info().currsize == 0
+
+
+def test_cache_size_bound():
+    fn = defined_function("""
+    r <- 0;
+    fn f(n) {
+        r <- n;
+    }
+    """, 'f')
+    fn.cache.maxsize = 4
+    interpreter = Interpreter()
+    interpreter.environment.set_key_value('f', fn)
+    interpreter.environment.set_key_value('r', 0)
+    interpreter.interpret(Parser(Lexer("for i in 0..10 { f(i); }").lex()).parse())
+    assert fn.cache.info().currsize == 4
@@ -0,0 +1,50 @@
+from circuits.circuit import Circuit
+from circuits.passes import Pass, PassManager, PassVerificationError
+from circuits.simulator import equivalent
+from compilation import Program
+import circuits.gates as gates
+
+import pytest
+
+PROGRAM = """
+a <- split(?false); b <- split(?false); r <- ?false; s <- ?false;
+for i in 0..4 {
+    if a { if b { r <- ~r; } }
+    let x <- flip(~r) in { if x { s <- ~s; } }
+}
+"""
+
+
+def test_levels_reduce_gates():
+    program = Program(PROGRAM)
+    sizes = [len(program.compile(opt_level=level, verify=True).gates)
+             for level in range(4)]
+    assert sizes[0] > sizes[2] > sizes[3]
+    assert all(metrics.gates >= 0 for metrics in program.passes.metrics)
+
+
+def test_metrics_recorded():
+    circuit = Circuit.from_gates([gates.HadamardGate(0), gates.HadamardGate(0),
+                                  gates.TGate(1)])
+    manager = PassManager.for_level(1)
+    optimized = manager.run(circuit)
+    [metrics] = manager.metrics
+    assert metrics.name == 'peephole'
+    assert metrics.gates == len(optimized.gates) == 1
+    assert (metrics.gate_delta, metrics.depth_delta, metrics.width_delta) == (-2, -1, -1)
+
+
+def test_verification_catches_bad_pass():
+    def drop_first(circuit):
+        return Circuit.from_gates(circuit.gates[1:])
+    circuit = Circuit.from_gates([gates.TGate(0), gates.HadamardGate(0)])
+    manager = PassManager([Pass('drop_first', drop_first)], verify=True)
+    with pytest.raises(PassVerificationError):
+        manager.run(circuit)
+
+
+def test_equivalence_up_to_global_phase():
+    # X Z X = -Z
+    assert equivalent([gates.NotGate(0), gates.ZGate(0), gates.NotGate(0)],
+                      [gates.ZGate(0)])
+    assert not equivalent([gates.SGate(0)], [gates.SGate(0, conj=True)])
@@ -0,0 +1,50 @@
+from circuits.circuit import Circuit
+from circuits.peephole import peephole
+import circuits.gates as gates
+
+
+def test_cancel_self_inverse():
+    assert peephole([gates.HadamardGate(0), gates.HadamardGate(0)]) == []
+    assert peephole([gates.NotGate(1), gates.NotGate(1), gates.ZGate(1)]) == \
+        [gates.ZGate(1)]
+
+
+def test_cancel_cascade():
+    assert peephole([
+        gates.HadamardGate(1),
+        gates.CnotGate(0, 1),
+        gates.TGate(2),
+        gates.CnotGate(0, 1),
+        gates.HadamardGate(1),
+    ]) == [gates.TGate(2)]
+
+
+def test_cnot_orientation_matters():
+    gates_ = [gates.CnotGate(0, 1), gates.CnotGate(1, 0)]
+    assert peephole(gates_) == gates_
+
+
+def test_blocked_by_intervening_gate():
+    gates_ = [gates.CnotGate(0, 1), gates.TGate(1), gates.CnotGate(0, 1)]
+    assert peephole(gates_) == gates_
+
+
+def test_merge_phases():
+    assert peephole([gates.TGate(0), gates.TGate(0, conj=True)]) == []
+    assert peephole([gates.TGate(0), gates.TGate(0)]) == [gates.SGate(0)]
+    assert peephole([gates.TGate(0, conj=True)] * 2) == [gates.SGate(0, conj=True)]
+    assert peephole([gates.TGate(0)] * 4) == [gates.ZGate(0)]
+    assert peephole([gates.TGate(0)] * 8) == []
+
+
+def test_measurements_not_merged():
+    gates_ = [gates.StrongMeasurementGate(0)] * 2
+    assert peephole(gates_) == gates_
+
+
+def test_circuit_peephole_keeps_labels():
+    circuit = Circuit.from_gates([gates.NotGate(0), gates.NotGate(0),
+                                  gates.StrongMeasurementGate(0)], {'q': 0})
+    optimized = circuit.peephole()
+    assert list(optimized.gates) == [gates.StrongMeasurementGate(0)]
+    assert optimized.qubit_labels == {'q': 0}
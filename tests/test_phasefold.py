@@ -0,0 +1,57 @@
+import random
+
+from circuits.circuit import Circuit
+from circuits.phasefold import phase_fold
+import circuits.gates as gates
+
+import numpy as np
+
+from .test_dag import unitary
+
+
+def t_count(gates_):
+    return sum(isinstance(gate, gates.TGate) for gate in gates_)
+
+
+def test_fold_through_cnot():
+    folded = phase_fold([
+        gates.TGate(1),
+        gates.CnotGate(0, 1),
+        gates.CnotGate(0, 1),
+        gates.TGate(1),
+    ])
+    assert folded == [gates.SGate(1), gates.CnotGate(0, 1), gates.CnotGate(0, 1)]
+
+
+def test_fold_on_complement():
+    folded = phase_fold([gates.TGate(0), gates.NotGate(0), gates.TGate(0)])
+    assert t_count(folded) == 0
+
+
+def test_hadamard_separates_parities():
+    gates_ = [gates.TGate(0), gates.HadamardGate(0), gates.TGate(0)]
+    assert phase_fold(gates_) == gates_
+
+
+def test_toffoli_t_count():
+    toffoli = list(gates.CnotGate(1, 2).controlled(0))
+    circuit = Circuit.from_gates(toffoli + [gates.NotGate(2)] + toffoli)
+    assert t_count(circuit.gates) == 14
+    assert t_count(circuit.phase_fold().gates) < 14
+
+
+def test_folding_preserves_unitary():
+    rng = random.Random(1)
+    kinds = [gates.HadamardGate, gates.NotGate, gates.ZGate, gates.SGate, gates.TGate]
+    for _ in range(50):
+        gates_ = []
+        for _ in range(30):
+            a = rng.randrange(3)
+            if rng.random() < 0.4:
+                gates_.append(gates.CnotGate(a, (a + rng.randrange(1, 3)) % 3))
+            else:
+                gates_.append(rng.choice(kinds)(a, conj=rng.random() < 0.5))
+        before, after = unitary(gates_, 3), unitary(phase_fold(gates_), 3)
+        # Equal up to a global phase
+        i = np.argmax(abs(before.ravel()))
+        assert np.allclose(before * (after.ravel()[i] / before.ravel()[i]), after)
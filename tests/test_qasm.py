@@ -0,0 +1,82 @@
+import io
+
+from circuits.circuit import Circuit
+import circuits.qasm as qasm
+import circuits.gates as gates
+
+
+def sample_circuit():
+    return Circuit.from_gates([
+        gates.HadamardGate(0),
+        gates.CnotGate(0, 1),
+        gates.TGate(1, conj=True),
+        gates.SGate(2),
+        gates.StrongMeasurementGate(0),
+        gates.StrongMeasurementGate(2),
+    ], {'out': 0})
+
+
+def test_qasm2():
+    assert sample_circuit().to_qasm() == '\n'.join([
+        'OPENQASM 2.0;',
+        'include "qelib1.inc";',
+        'qreg q[3];',
+        'creg c_out[1];',
+        'creg m[3];',
+        'h q[0];',
+        'cx q[0], q[1];',
+        'tdg q[1];',
+        's q[2];',
+        'measure q[0] -> c_out[0];',
+        'measure q[2] -> m[2];',
+        '',
+    ])
+
+
+def test_qasm3():
+    lines = sample_circuit().to_qasm(version=3).splitlines()
+    assert lines[:5] == ['OPENQASM 3.0;', 'include "stdgates.inc";',
+                         'qubit[3] q;', 'bit[1] c_out;', 'bit[3] m;']
+    assert lines[-2:] == ['c_out[0] = measure q[0];', 'm[2] = measure q[2];']
+
+
+def test_no_unlabelled_register():
+    circuit = Circuit.from_gates([gates.NotGate(0), gates.StrongMeasurementGate(0)],
+                                 {'x': 0})
+    assert 'creg m' not in circuit.to_qasm()
+
+
+def test_streamed_in_batches():
+    class CountingWriter(io.StringIO):
+        writes = 0
+
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+
+    circuit = Circuit.from_gates([gates.NotGate(i % 5) for i in range(3 * qasm.BATCH_SIZE)])
+    out = CountingWriter()
+    circuit.to_qasm(out)
+    assert out.writes == 4
+    assert len(out.getvalue().splitlines()) == 3 * qasm.BATCH_SIZE + 3
+
+
+def test_incremental_qasm():
+    expected = sample_circuit()
+    circuit = Circuit()
+    for gate in expected.gates:
+        circuit.add_gates([gate])
+        circuit.to_qasm()
+    # Labelling a qubit changes the registers of its earlier measurements
+    circuit.label_qubit('out', 0)
+    assert circuit.to_qasm() == expected.to_qasm()
+    buffer = io.StringIO()
+    circuit.to_qasm(buffer)
+    assert buffer.getvalue() == expected.to_qasm()
+
+
+def test_qasm_invalidated_on_rewrite():
+    circuit = sample_circuit()
+    circuit.to_qasm()
+    circuit.gates = [gates.NotGate(0)]
+    assert circuit.to_qasm().splitlines()[-1] == 'x q[0];'
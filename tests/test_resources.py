@@ -0,0 +1,35 @@
+from circuits.circuit import Circuit
+from compilation import Program
+import circuits.gates as gates
+
+from .test_passes import PROGRAM
+
+
+def test_estimate():
+    estimate = Circuit.from_gates([
+        gates.HadamardGate(0),
+        gates.TGate(0),
+        gates.CnotGate(0, 1),
+        gates.TGate(1, conj=True),
+        gates.TGate(2),
+        gates.SGate(2),
+        gates.StrongMeasurementGate(1),
+    ]).estimate_resources()
+    assert (estimate.gates, estimate.width, estimate.depth) == (7, 3, 5)
+    assert (estimate.t_count, estimate.t_depth) == (3, 2)
+    assert (estimate.cnot_count, estimate.clifford_count) == (1, 3)
+    assert estimate.measurements == 1
+    assert estimate.counts['TGate'] == 3
+
+
+def test_t_depth_of_parallel_gates():
+    estimate = Circuit.from_gates([gates.TGate(q) for q in range(4)]
+                                  + [gates.TGate(0)]).estimate_resources()
+    assert (estimate.t_count, estimate.t_depth) == (5, 2)
+
+
+def test_counting_matches_compiled():
+    program = Program(PROGRAM)
+    estimate = program.estimate_resources()
+    assert estimate == program.compile().estimate_resources()
+    assert estimate.gates > 0
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from circuits.circuit import Circuit
+from circuits.routing import CouplingGraph, RoutingError, route
+from circuits.simulator import equivalent, simulate
+import circuits.gates as gates
+
+
+def random_gates(width, n, seed=0):
+    rng = random.Random(seed)
+    gates_ = []
+    for _ in range(n):
+        a = rng.randrange(width)
+        b = (a + 1 + rng.randrange(width - 1)) % width
+        gates_.append(rng.choice([gates.CnotGate(a, b), gates.TGate(a),
+                                  gates.HadamardGate(b), gates.SGate(a, conj=True)]))
+    return gates_
+
+
+def unpermute(final, initial):
+    """SWAPs moving each logical qubit from its final place to its initial one"""
+    where = dict(final)
+    occupant = {p: q for q, p in where.items()}
+    swaps = []
+    for q, target in sorted(initial.items()):
+        p = where[q]
+        if p != target:
+            swaps.append(gates.SwapGate(p, target))
+            other = occupant.get(target)
+            occupant[p], occupant[target] = other, q
+            where[q] = target
+            if other is not None:
+                where[other] = p
+    return swaps
+
+
+def test_distances():
+    graph = CouplingGraph.grid(3, 3)
+    assert graph.distances[0][8] == 4
+    path = graph.path(0, 8)
+    assert len(path) == 5 and path[0] == 0 and path[-1] == 8
+    with pytest.raises(RoutingError):
+        CouplingGraph(4, [(0, 1), (2, 3)])
+
+
+@pytest.mark.parametrize('graph', [CouplingGraph.line(5), CouplingGraph.ring(5),
+                                   CouplingGraph.grid(2, 3)])
+def test_routing_preserves_meaning(graph):
+    gates_ = random_gates(5, 80)
+    routing = route(Circuit.from_gates(gates_).columns, graph)
+    routed = list(routing.columns)
+    for gate in routed:
+        if len(gate.qubits) == 2:
+            assert graph.distances[gate.qubits[0]][gate.qubits[1]] == 1
+    placed = [type(gate)(*(routing.initial_layout[q] for q in gate.qubits), conj=gate.conj)
+              for gate in gates_]
+    fix = unpermute(routing.final_layout, routing.initial_layout)
+    assert equivalent(placed, routed + fix)
+    assert routing.swaps == sum(isinstance(gate, gates.SwapGate) for gate in routed)
+    assert routing.added_depth == routing.depth_after - routing.depth_before
+
+
+def test_chain_needs_no_swaps():
+    # A chain of interactions on scrambled qubits fits a line exactly
+    order = [3, 0, 4, 1, 2]
+    chain = [gates.CnotGate(a, b) for a, b in zip(order, order[1:])] * 3
+    routing = route(Circuit.from_gates(chain).columns, CouplingGraph.line(5))
+    assert routing.swaps == 0
+    assert routing.added_depth == 0
+
+
+def test_labels_follow_measurements():
+    circuit = Circuit.from_gates([gates.CnotGate(0, 2), gates.StrongMeasurementGate(2)],
+                                 {'out': 2})
+    routed, routing = circuit.route(CouplingGraph.line(3), layout={0: 0, 1: 1, 2: 2})
+    assert routing.swaps == 1
+    (measurement,) = [gate for gate in routed.gates
+                      if isinstance(gate, gates.StrongMeasurementGate)]
+    assert routed.qubit_labels == {'out': measurement.qubits[0]}
+
+
+def test_too_many_qubits():
+    with pytest.raises(RoutingError):
+        route(Circuit.from_gates(random_gates(5, 10)).columns, CouplingGraph.line(3))
+
+
+def test_controlled_swap():
+    controlled = gates.SwapGate(0, 1).controlled(2)
+    for i in range(8):
+        state = [0j] * 8
+        state[i] = 1
+        simulate(controlled, {0: 0, 1: 1, 2: 2}, state)
+        # With the control set, bits 0 and 1 are exchanged
+        j = i ^ 3 if i & 4 and (i & 1) != (i >> 1 & 1) else i
+        assert abs(abs(state[j]) - 1) < 1e-9
+
+
+def test_swap_exports():
+    circuit = Circuit.from_gates([gates.SwapGate(0, 1)])
+    assert circuit.to_qasm().splitlines()[-1] == 'swap q[0], q[1];'
+    assert circuit.estimate_resources().clifford_count == 1
@@ -0,0 +1,80 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from circuits.circuit import Circuit
+from circuits.shared import (SharedMemoryError, publish_array, publish_circuit,
+                             references, shared_array)
+from circuits.simulator import simulate
+import circuits.gates as gates
+
+from .test_columns import gate_tuples, sample_gates
+
+
+def simulate_job(circuit_handle, state_handle):
+    circuit = circuit_handle.attach()
+    state = state_handle.attach()
+    qubits = {q: q for q in circuit.all_qubits()}
+    simulate(circuit.gates, qubits, state)
+    del circuit, state
+    circuit_handle.release()
+    state_handle.release()
+    return references()
+
+
+def transfer_job():
+    return publish_array(np.arange(4.0), transfer=True)
+
+
+def test_circuit_round_trip():
+    handle = publish_circuit(Circuit.from_gates(sample_gates(), {'a': 0, 'bé': 2}))
+    circuit = handle.attach()
+    assert gate_tuples(circuit.gates) == gate_tuples(sample_gates())
+    assert circuit.qubit_labels == {'a': 0, 'bé': 2}
+    assert references()[handle.name] == 2
+    del circuit
+    handle.release()
+    handle.release()
+    assert handle.name not in references()
+    with pytest.raises(SharedMemoryError):
+        handle.attach()
+
+
+def test_worker_simulates_in_place():
+    gates_ = [gates.HadamardGate(0), gates.CnotGate(0, 1), gates.TGate(1),
+              gates.SqrtXGate(2), gates.CzGate(1, 2)]
+    circuit_handle = publish_circuit(Circuit.from_gates(gates_))
+    state_handle, state = shared_array((8,))
+    state[0] = 1
+    with multiprocessing.Pool(1) as pool:
+        left = pool.apply(simulate_job, (circuit_handle, state_handle))
+    # The worker's own references are gone
+    assert left.get(state_handle.name, 0) == references()[state_handle.name]
+    expected = simulate(gates_, {0: 0, 1: 1, 2: 2}, [1] + [0] * 7)
+    assert np.allclose(state, expected)
+    del state
+    circuit_handle.release()
+    state_handle.release()
+    assert references() == {}
+
+
+def test_transferred_array_is_adopted():
+    with multiprocessing.Pool(1) as pool:
+        handle = pool.apply(transfer_job)
+    array = handle.adopt()
+    assert list(array) == [0.0, 1.0, 2.0, 3.0]
+    del array
+    handle.release()
+    with pytest.raises(SharedMemoryError):
+        handle.attach()
+
+
+def test_release_with_live_views():
+    handle, view = shared_array((2, 2), dtype='float64')
+    view[1, 1] = 5
+    handle.release()
+    # The block is unlinked, but the view stays usable until it's dropped
+    assert view[1, 1] == 5
+    with pytest.raises(SharedMemoryError):
+        handle.release()
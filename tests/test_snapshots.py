@@ -0,0 +1,95 @@
+from contextlib import redirect_stdout
+from io import StringIO
+
+from environment import MovedValueError
+from interpreter import Interpreter
+from lang_parser import Parser
+from lexer import Lexer
+from repl import Repl
+
+import pytest
+
+
+def run(interpreter: Interpreter, code: str) -> None:
+    interpreter.interpret(Parser(Lexer(code).lex()).parse())
+
+
+def test_restore_values():
+    interpreter = Interpreter()
+    run(interpreter, "x <- 1;")
+    snapshot = interpreter.snapshot()
+    run(interpreter, "x <- 2; y <- 3;")
+    interpreter.restore(snapshot)
+    assert interpreter.environment.values['x'] == 1
+    assert 'y' not in interpreter.environment.values
+
+
+def test_restore_circuit():
+    interpreter = Interpreter()
+    run(interpreter, "q <- ?true;")
+    snapshot = interpreter.snapshot()
+    run(interpreter, "q <- ~q; r <- ?true; c <- !r;")
+    assert len(interpreter.circuit.gates) == 4
+    interpreter.restore(snapshot)
+    assert len(interpreter.circuit.gates) == 1
+    assert interpreter.circuit.qubit_labels == {}
+    # The allocator is restored too, so the next qubit reuses index 1.
+    run(interpreter, "s <- ?true;")
+    assert list(interpreter.circuit.gates[-1].qubits) == [1]
+
+
+def test_restore_moved_value():
+    interpreter = Interpreter()
+    run(interpreter, "q <- ?false;")
+    snapshot = interpreter.snapshot()
+    run(interpreter, "r <- q;")
+    with pytest.raises(MovedValueError):
+        run(interpreter, "s <- q;")
+    interpreter.restore(snapshot)
+    run(interpreter, "s <- q;")
+
+
+def test_branching_snapshots():
+    interpreter = Interpreter()
+    run(interpreter, "q <- ?false;")
+    base = interpreter.snapshot()
+    run(interpreter, "q <- ~q; q <- ~q;")
+    branch = interpreter.snapshot()
+    interpreter.restore(base)
+    run(interpreter, "q <- split(q);")
+    assert len(interpreter.circuit.gates) == 1
+    interpreter.restore(branch)
+    assert len(interpreter.circuit.gates) == 2
+    interpreter.restore(base)
+    assert len(interpreter.circuit.gates) == 0
+
+
+def repl_session(*lines: str) -> Repl:
+    repl = Repl()
+    for line in lines:
+        if line.startswith(':'):
+            command, *args = line.split()
+            getattr(repl, command[1:])(*args)
+        else:
+            repl.push_undo()
+            run(repl.interpreter, line)
+    return repl
+
+
+def test_repl_undo():
+    repl = repl_session("x <- 1;", "x <- 2;", ":undo")
+    assert repl.interpreter.environment.values['x'] == 1
+
+
+def test_repl_checkpoint_restore():
+    repl = repl_session("x <- 1;", ":checkpoint one", "x <- 2;", ":restore one")
+    assert repl.interpreter.environment.values['x'] == 1
+    repl.undo()
+    assert repl.interpreter.environment.values['x'] == 2
+
+
+def test_repl_restore_missing():
+    output = StringIO()
+    with redirect_stdout(output):
+        repl_session(":restore nowhere")
+    assert 'nowhere' in output.getvalue()
@@ -0,0 +1,53 @@
+import os
+
+from circuits.circuit import Circuit
+from circuits.spill import SpillingColumns
+from compilation import Program
+import circuits.gates as gates
+
+from .test_columns import gate_tuples, sample_gates
+
+
+def many_gates(n):
+    gates_ = sample_gates()
+    return [gates_[i % len(gates_)] for i in range(n)]
+
+
+def test_spilled_round_trip():
+    columns = SpillingColumns(chunk_size=16)
+    columns.extend(many_gates(100))
+    assert columns.blocks == 6 and len(columns.tail) == 4
+    assert len(columns) == 100
+    assert gate_tuples(columns) == gate_tuples(many_gates(100))
+    assert gate_tuples([columns.gate(37)]) == gate_tuples([many_gates(100)[37]])
+    assert gate_tuples(columns.copy(50)) == gate_tuples(many_gates(50))
+
+
+def test_temporary_log_removed():
+    columns = SpillingColumns(chunk_size=8)
+    columns.extend(many_gates(20))
+    path = columns.path
+    assert os.path.exists(path)
+    columns.close()
+    assert not os.path.exists(path)
+
+
+def test_spilled_circuit_exports(tmp_path):
+    log = str(tmp_path / 'gates.cvylog')
+    spilled = Circuit(spill=log, chunk_size=8)
+    spilled.add_gates(many_gates(50))
+    spilled.qubit_labels = {'a': 0}
+    in_memory = Circuit.from_gates(many_gates(50), {'a': 0})
+    assert spilled.stats() == in_memory.stats()
+    assert spilled.to_qasm() == in_memory.to_qasm()
+    assert list(spilled.schedule().moments) == list(in_memory.schedule().moments)
+    path = str(tmp_path / 'circuit.cvyc')
+    spilled.save(path)
+    assert gate_tuples(Circuit.load(path).gates) == gate_tuples(in_memory.gates)
+
+
+def test_compile_spilling():
+    source = "q <- ?false; for i in 0..100 { q <- ~q; }"
+    circuit = Program(source).compile(spill=True)
+    assert isinstance(circuit.columns, SpillingColumns)
+    assert len(circuit.gates) == 100
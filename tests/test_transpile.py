@@ -0,0 +1,87 @@
+import pytest
+
+from circuits.circuit import Circuit
+from circuits.passes import PassManager
+from circuits.simulator import equivalent
+from circuits.transpile import (CLIFFORD_T, CZ_SX, GATE_SETS, RULES, NativeGateSet,
+                                TranspileError, expansions, synthesis_table)
+from compilation import Program
+import circuits.gates as gates
+
+from .test_passes import PROGRAM
+from .test_routing import random_gates
+
+
+def test_rules_hold():
+    for gate_type, rules in RULES.items():
+        qubits = tuple(range(gate_type.arity))
+        for rule in rules:
+            for conj in (False, True):
+                gate = gate_type(*qubits, conj=conj)
+                steps = [step(*(qubits[p] for p in positions), conj=step_conj)
+                         for step, positions, step_conj in rule]
+                if gate.conj:
+                    steps = [step.conjugate() for step in reversed(steps)]
+                assert equivalent([gate], steps), (gate, rule)
+
+
+@pytest.mark.parametrize('gate_set', GATE_SETS.values(), ids=GATE_SETS.keys())
+def test_transpiled_is_native(gate_set):
+    original = random_gates(4, 120, seed=3) + [
+        gates.SwapGate(0, 3), gates.NotGate(2), gates.ZGate(1), gates.SqrtXGate(0),
+        gates.CzGate(1, 2), gates.SqrtXGate(3, conj=True), gates.StrongMeasurementGate(1),
+    ]
+    circuit = Circuit.from_gates(original, {'out': 1})
+    transpiled = circuit.transpile(gate_set)
+    assert all(type(gate) in gate_set.gates or type(gate) is gates.StrongMeasurementGate
+               for gate in transpiled.gates)
+    assert equivalent(original, transpiled.gates)
+    assert transpiled.qubit_labels == {'out': 1}
+
+
+def test_runs_are_merged():
+    # Each H is S·√X·S on its own, but H·H vanishes, and H·Z·H is √X·√X
+    circuit = Circuit.from_gates([
+        gates.HadamardGate(0), gates.HadamardGate(0),
+        gates.HadamardGate(1), gates.ZGate(1), gates.HadamardGate(1),
+    ])
+    transpiled = circuit.transpile(CZ_SX)
+    assert [type(gate) for gate in transpiled.gates] == [gates.SqrtXGate] * 2
+    assert all(gate.qubits == (1,) for gate in transpiled.gates)
+
+
+def test_cnots_become_cz():
+    transpiled = Circuit.from_gates([gates.CnotGate(1, 0)]).transpile(CZ_SX)
+    assert sum(isinstance(gate, gates.CzGate) for gate in transpiled.gates) == 1
+    (cz,) = [gate for gate in transpiled.gates if isinstance(gate, gates.CzGate)]
+    assert cz.qubits == (0, 1)
+
+
+def test_tables_are_compiled_once():
+    assert expansions(CZ_SX) is expansions(CZ_SX)
+    assert synthesis_table(CZ_SX) is synthesis_table(CZ_SX)
+    # Every single-qubit Clifford is at most two √X pulses
+    assert len(synthesis_table(CZ_SX)) >= 24
+
+
+def test_missing_gate():
+    no_cnots = NativeGateSet('no-cnot', frozenset({gates.HadamardGate, gates.ZGate,
+                                                   gates.SGate, gates.TGate}))
+    circuit = Circuit.from_gates([gates.CnotGate(0, 1)])
+    with pytest.raises(TranspileError):
+        circuit.transpile(no_cnots)
+    assert circuit.transpile(CLIFFORD_T).gates[0] is gates.CnotGate(0, 1)
+
+
+def test_compile_to_target():
+    manager = PassManager.for_level(1, verify=True, target=CZ_SX)
+    assert manager.pipeline[-1].name == 'transpile:cz-sx'
+    circuit = Program(PROGRAM).compile(opt_level=1, verify=True, target='cz-sx')
+    assert {type(gate) for gate in circuit.gates} <= CZ_SX.gates | {gates.StrongMeasurementGate}
+
+
+def test_native_gate_exports():
+    circuit = Circuit.from_gates([gates.CzGate(0, 1), gates.SqrtXGate(1, conj=True)])
+    assert circuit.to_qasm().splitlines()[-2:] == ['cz q[0], q[1];', 'sxdg q[1];']
+    assert circuit.to_qasm(version=3).splitlines()[-1] == 'inv @ sx q[1];'
+    assert circuit.estimate_resources().clifford_count == 2